@@ -0,0 +1,213 @@
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from src.utils.tokens import estimate_tokens
+
+
+@dataclass
+class FakeOpenAiServerStats:
+    requests: int = 0
+    failed_requests: int = 0
+    rate_limited_requests: int = 0
+    malformed_responses: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class _ThreadingHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Clients abort streams on purpose, e.g. when the streamed json is already invalid
+        pass
+
+
+class FakeOpenAiServer:
+    """
+    A local OpenAI compatible server that streams chat completions, used to test and benchmark the llm
+    clients without network access. The reply of every request is computed by `responder` from the request
+    body. The latency, the generation speed and the rates of failed requests and malformed replies
+    are configurable to simulate a real provider. Rate limits are simulated with a requests per minute
+    limit and a rate of requests answered with HTTP 429, both with a Retry-After header.
+    """
+
+    def __init__(
+        self,
+        responder: Optional[Callable[[Dict], str]] = None,
+        chunk_size: int = 8,
+        latency_seconds: float = 0.0,
+        tokens_per_second: Optional[float] = None,
+        failure_rate: float = 0.0,
+        malformed_json_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        requests_per_minute: Optional[int] = None,
+        retry_after_seconds: float = 1.0,
+        seed: Optional[int] = None,
+    ):
+        self.responder = responder or (lambda request: "Response to the message")
+        self.chunk_size = chunk_size
+        self.latency_seconds = latency_seconds
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.malformed_json_rate = malformed_json_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests_per_minute = requests_per_minute
+        self.retry_after_seconds = retry_after_seconds
+        self._request_times: List[float] = []
+        self.requests: List[Dict] = []
+        self.stats = FakeOpenAiServerStats()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.01,), daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def __enter__(self) -> "FakeOpenAiServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _write_event(self, event: Dict):
+                self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+
+            def _send_error(self):
+                body = json.dumps({"error": {"message": "Simulated failure", "type": "server_error"}}).encode()
+                self.send_response(500)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_rate_limited(self, retry_after_seconds: float):
+                body = json.dumps({"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}).encode()
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                # Like OpenAI, whole seconds in Retry-After and the precise delay in retry-after-ms
+                self.send_header("Retry-After", str(math.ceil(retry_after_seconds)))
+                self.send_header("retry-after-ms", str(int(retry_after_seconds * 1000)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _rate_limit_retry_after(self) -> Optional[float]:
+                # Called with the lock held, returns the Retry-After of a rate limited request
+                now = time.monotonic()
+
+                if server.requests_per_minute:
+                    server._request_times = [t for t in server._request_times if now - t < 60]
+                    if len(server._request_times) >= server.requests_per_minute:
+                        return 60 - (now - server._request_times[0])
+                    server._request_times.append(now)
+
+                if server._random.random() < server.rate_limit_rate:
+                    return server.retry_after_seconds
+
+                return None
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                prompt_tokens = sum(estimate_tokens(message.get("content") or "") for message in body["messages"])
+
+                with server._lock:
+                    retry_after_seconds = self._rate_limit_retry_after()
+                    if retry_after_seconds is not None:
+                        server.stats.rate_limited_requests += 1
+
+                if retry_after_seconds is not None:
+                    self._send_rate_limited(retry_after_seconds)
+                    return
+
+                with server._lock:
+                    server.requests.append(body)
+                    server.stats.requests += 1
+                    failed = server._random.random() < server.failure_rate
+                    malformed = server._random.random() < server.malformed_json_rate
+
+                if failed:
+                    with server._lock:
+                        server.stats.failed_requests += 1
+                    self._send_error()
+                    return
+
+                reply = server.responder(body)
+
+                if malformed:
+                    # A typical chatty answer that no json parser accepts
+                    reply = f"Sure! Here is the answer you asked for:\n{reply}"
+                    with server._lock:
+                        server.stats.malformed_responses += 1
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                time.sleep(server.latency_seconds)
+                completion_tokens = 0
+
+                for start in range(0, len(reply), server.chunk_size):
+                    content = reply[start:start + server.chunk_size]
+                    self._write_event(
+                        {
+                            "id": "chatcmpl-fake",
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": body["model"],
+                            "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+                        }
+                    )
+                    completion_tokens += estimate_tokens(content)
+
+                    if server.tokens_per_second:
+                        time.sleep(estimate_tokens(content) / server.tokens_per_second)
+
+                with server._lock:
+                    server.stats.prompt_tokens += prompt_tokens
+                    server.stats.completion_tokens += completion_tokens
+
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    self._write_event(
+                        {
+                            "id": "chatcmpl-fake",
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": body["model"],
+                            "choices": [],
+                            "usage": {
+                                "prompt_tokens": prompt_tokens,
+                                "completion_tokens": completion_tokens,
+                                "total_tokens": prompt_tokens + completion_tokens,
+                            },
+                        }
+                    )
+
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+        return Handler
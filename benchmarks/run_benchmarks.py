@@ -0,0 +1,202 @@
+"""
+Offline benchmarks of the main flows against a local fake OpenAI compatible server.
+
+    python -m benchmarks.run_benchmarks --sizes 50,500 --latency 0.05 --tokens-per-second 300
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, List
+
+from benchmarks.fake_openai_server import FakeOpenAiServer
+from benchmarks.synthetic_repo import create_synthetic_repo
+
+
+@dataclass
+class BenchmarkResult:
+    scenario: str
+    repo_files: int
+    wall_seconds: float
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+    peak_rss_mb: float
+
+
+def benchmark_responder(request: dict) -> str:
+    prompt = request["messages"][-1]["content"]
+
+    if "implement the following feature" in prompt:
+        return json.dumps(
+            [
+                {"file_path": "EXPLANATION.md", "content": "# Explanation\n" * 20, "action": "CREATE"},
+                {
+                    "file_path": "bench_feature/feature.py",
+                    "content": "def feature(value: int) -> int:\n    return value * 2\n" * 20,
+                    "action": "CREATE",
+                },
+            ]
+        )
+
+    if "Code Review" in prompt:
+        return json.dumps(
+            [
+                {
+                    "explanation": "The result of the modulo is not validated.",
+                    "suggestion": "Validate the input before shifting it.",
+                }
+            ]
+        )
+
+    if "find all the dependencies" in prompt:
+        return "[]"
+
+    return "OK"
+
+
+def _peak_rss_mb() -> float:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak_rss / 1024 / 1024 if sys.platform == "darwin" else peak_rss / 1024
+
+
+def run_scenario(
+    scenario: str, repo_files: int, server: FakeOpenAiServer, func: Callable[[], None]
+) -> BenchmarkResult:
+    stats_before = (server.stats.requests, server.stats.prompt_tokens, server.stats.completion_tokens)
+    started_at = time.perf_counter()
+
+    func()
+
+    return BenchmarkResult(
+        scenario=scenario,
+        repo_files=repo_files,
+        wall_seconds=round(time.perf_counter() - started_at, 3),
+        requests=server.stats.requests - stats_before[0],
+        prompt_tokens=server.stats.prompt_tokens - stats_before[1],
+        completion_tokens=server.stats.completion_tokens - stats_before[2],
+        peak_rss_mb=round(_peak_rss_mb(), 1),
+    )
+
+
+def run_benchmarks(args: argparse.Namespace, server: FakeOpenAiServer, work_dir: str) -> List[BenchmarkResult]:
+    # Imported after the environment points at the fake server, the settings are cached on first use
+    from src.services.code_review_service import CodeReviewService
+    from src.services.coding_service import CodingService
+    from src.services.repository_reader_service import RepositoryReaderService
+
+    # Context budget warnings are expected with the synthetic repositories
+    logging.disable(logging.WARNING)
+    results = []
+
+    for size in args.sizes:
+        repo_path = os.path.join(work_dir, f"ohad-benchmark-repo-{size}")
+        create_synthetic_repo(repo_path, num_files=size)
+
+        def read_all_files():
+            contents = RepositoryReaderService().read_files(directory=repo_path)
+            sum(len(content) for content in contents.values())
+
+        results.append(run_scenario("read_files (cold)", size, server, read_all_files))
+        results.append(run_scenario("read_files (warm)", size, server, read_all_files))
+
+        contents = RepositoryReaderService().read_files(directory=repo_path)
+
+        def learn_code():
+            CodingService().learn_code(file_abs_path_to_content=contents, relevance_query="service function")
+
+        def code_feature():
+            coding_service = CodingService()
+            coding_service.learn_code(file_abs_path_to_content=contents, relevance_query="service function")
+            coding_service.write_code(
+                coded_files=coding_service.code_feature_stream(task="Add a feature", local_repo_path=repo_path),
+                local_repo_path=repo_path,
+            )
+
+        def review_session():
+            reviewed_paths = sorted(path for path in contents if path.endswith(".py"))[: args.review_files]
+            review_contents = {path: contents[path] for path in reviewed_paths}
+            for _ in CodeReviewService(local_repo_path=repo_path, max_workers=args.workers).review_files(
+                review_contents
+            ):
+                pass
+
+        results.append(run_scenario("learn_code", size, server, learn_code))
+        results.append(run_scenario("code_feature + write_code", size, server, code_feature))
+        results.append(run_scenario(f"review session ({args.review_files} files)", size, server, review_session))
+
+    return results
+
+
+def format_results(results: List[BenchmarkResult]) -> str:
+    header = f"{'scenario':<32} {'files':>6} {'wall s':>8} {'requests':>9} {'sent tok':>10} {'recv tok':>9} {'rss MB':>8}"
+    lines = [header, "-" * len(header)]
+
+    for result in results:
+        lines.append(
+            f"{result.scenario:<32} {result.repo_files:>6} {result.wall_seconds:>8.3f} {result.requests:>9} "
+            f"{result.prompt_tokens:>10} {result.completion_tokens:>9} {result.peak_rss_mb:>8.1f}"
+        )
+
+    return "\n".join(lines)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")], default=[50, 500])
+    parser.add_argument("--review-files", type=int, default=20, help="Number of files reviewed per repository")
+    parser.add_argument("--workers", type=int, default=4, help="Review workers")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Generation speed, unlimited if unset")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Rate of requests answered with HTTP 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Rate of replies that are not valid json")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_output.txt", help="Text report")
+    parser.add_argument("--json-output", default=None, help="Optional machine readable report")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir, FakeOpenAiServer(
+        responder=benchmark_responder,
+        chunk_size=32,
+        latency_seconds=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        failure_rate=args.failure_rate,
+        malformed_json_rate=args.malformed_rate,
+        seed=args.seed,
+    ) as server:
+        os.environ.update(
+            {
+                "OPENAI_BASE_URL": server.base_url,
+                "OPENAI_API_KEY": "benchmark",
+                "GPT_MODEL": "fake-model",
+                "REPO_PATH": work_dir,
+                "CACHE_DIR": os.path.join(work_dir, "cache"),
+                "LLM_CACHE_ENABLED": "false",
+            }
+        )
+
+        results = run_benchmarks(args, server, work_dir)
+
+    report = format_results(results)
+    print(report)
+
+    with open(args.output, "w") as f:
+        f.write(report + "\n")
+
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump([asdict(result) for result in results], f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import random
+
+
+def _module_source(module_idx: int, imports: list, num_functions: int) -> str:
+    lines = ['"""', f"Synthetic module {module_idx}.", '"""', "import os", ""]
+
+    for package_idx, imported_idx in imports:
+        lines.append(f"from pkg_{package_idx}.module_{imported_idx} import function_{imported_idx}_0")
+
+    lines.extend(["", "", f"CONSTANT_{module_idx} = {module_idx}", "", ""])
+
+    for function_idx in range(num_functions):
+        lines.extend(
+            [
+                f"def function_{module_idx}_{function_idx}(value: int) -> int:",
+                f'    """Returns the value shifted by {function_idx}."""',
+                f"    result = value + {function_idx}",
+                "    if result > 100:",
+                "        result = result % 100",
+                "    return result",
+                "",
+                "",
+            ]
+        )
+
+    lines.extend(
+        [
+            f"class Service{module_idx}:",
+            "    def __init__(self, path: str):",
+            "        self._path = os.path.abspath(path)",
+            "",
+            "    def run(self) -> int:",
+            f"        return function_{module_idx}_0(len(self._path))",
+            "",
+        ]
+    )
+
+    return "\n".join(lines)
+
+
+def create_synthetic_repo(
+    repo_path: str, num_files: int, modules_per_package: int = 50, functions_per_module: int = 10, seed: int = 0
+):
+    """
+    Creates a python repository with `num_files` modules spread over packages, every module imports
+    a few of the previous ones. Ignored, vendored and binary files are added so the walker has work to skip.
+    """
+    rng = random.Random(seed)
+    os.makedirs(repo_path, exist_ok=True)
+
+    with open(os.path.join(repo_path, ".gitignore"), "w") as f:
+        f.write("build/\n*.log\n")
+
+    for module_idx in range(num_files):
+        package_idx = module_idx // modules_per_package
+        package_dir = os.path.join(repo_path, f"pkg_{package_idx}")
+        os.makedirs(package_dir, exist_ok=True)
+
+        init_path = os.path.join(package_dir, "__init__.py")
+        if not os.path.exists(init_path):
+            open(init_path, "w").close()
+
+        imported = rng.sample(range(module_idx), k=min(3, module_idx))
+        imports = [(imported_idx // modules_per_package, imported_idx) for imported_idx in imported]
+
+        with open(os.path.join(package_dir, f"module_{module_idx}.py"), "w") as f:
+            f.write(_module_source(module_idx, imports, functions_per_module))
+
+    for ignored_dir in ("build", "node_modules/lib", ".git/objects"):
+        os.makedirs(os.path.join(repo_path, ignored_dir), exist_ok=True)
+        with open(os.path.join(repo_path, ignored_dir, "ignored.js"), "w") as f:
+            f.write("var a = 1;\n" * 1000)
+
+    with open(os.path.join(repo_path, "debug.log"), "w") as f:
+        f.write("log line\n" * 1000)
+
+    with open(os.path.join(repo_path, "logo.png"), "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n\0" + os.urandom(4096))
@@ -1,25 +1,23 @@
-import glob
+import argparse
 import json
 import logging
-
-from dotenv import load_dotenv
-
-load_dotenv()
+import sys
 
 import os
+from contextlib import ExitStack, closing
 from dataclasses import dataclass
 
-from typing import Dict, List
+from typing import List, Mapping, Optional
 
-from src import get_settings
-
-from src.services.coding_service import CodingService
-from src.services.repository_reader_service import RepositoryReaderService
+# The services, the llm clients and the settings are imported by the runtime when an action needs them,
+# so the CLI starts (and answers --help) without importing openai or pydantic
+from src.runtime import configure_logging, get_runtime
+from src.types.enums import BatchMode, CodeEditFormat, QueueJobStatus
 
 logger = logging.getLogger(__name__)
 
 
-def read_included_files(local_repo_path: str) -> Dict[str, str]:
+def read_included_files(local_repo_path: str, task: Optional[str] = None) -> Mapping[str, str]:
     # Ask the user if he would like to provide glob pattern or specific files
     response = input(
         # "Do you want to include only specific files? "
@@ -31,19 +29,30 @@ def read_included_files(local_repo_path: str) -> Dict[str, str]:
         0. Glob pattern
         1. Specific files
         2. Read all files
-        """
+        """ + ("        3. Select the files relevant to the task automatically\n" if task else "")
     )
 
+    runtime = get_runtime()
+
+    if task and response == "3":
+        contents = runtime.repository_reader_service.select_relevant_files(
+            directory=local_repo_path,
+            query=task,
+            # Excerpts can only be edited with patches, whole file updates need whole files
+            excerpts=runtime.settings.code_edit_format != CodeEditFormat.WHOLE,
+        )
+        print(f"Selected {len(contents)} relevant files from {local_repo_path}")
+        return contents
+
     if response == "0":
         include_files_glob = input(
             "Please provide a glob pattern to include files: "
         )
 
-        glob_pattern = os.path.join(local_repo_path, include_files_glob)
-        print(f"Using glob pattern: {glob_pattern}")
-        include_files = glob.glob(glob_pattern, recursive=True)
-        include_files = list(set([os.path.basename(file) for file in include_files]))
+        print(f"Using glob pattern: {include_files_glob}")
+        include_files = None
     elif response == "1":
+        include_files_glob = None
         include_files = input(
             "Do you want to include only specific files? "
             "If yes, write the file names separated by commas. If no, press enter.\n"
@@ -51,11 +60,13 @@ def read_included_files(local_repo_path: str) -> Dict[str, str]:
         )
         include_files = include_files.split(",")
     else:
+        include_files_glob = None
         include_files = None
 
-    contents = RepositoryReaderService().read_files(
+    contents = runtime.repository_reader_service.read_files(
         directory=local_repo_path,
-        include_files=include_files
+        include_files=include_files,
+        include_glob=include_files_glob,
     )
 
     print(f"Read {len(contents)} files from {local_repo_path}")
@@ -63,12 +74,34 @@ def read_included_files(local_repo_path: str) -> Dict[str, str]:
     return contents
 
 
+def report_llm_telemetry():
+    runtime = get_runtime()
+    telemetry = runtime.telemetry
+    print(telemetry.format_summary())
+
+    telemetry_dir = runtime.settings.llm_telemetry_dir
+    if telemetry_dir:
+        telemetry.export_jsonl(os.path.join(telemetry_dir, "llm_calls.jsonl"))
+        telemetry.export_prometheus(os.path.join(telemetry_dir, "ohad_llm.prom"))
+        print(f"LLM telemetry written to {telemetry_dir}")
+
+    # Every session is exported once
+    telemetry.reset()
+
+
 def run_code_writing_session(local_repo_path: str):
-    contents = read_included_files(local_repo_path=local_repo_path)
+    from src.lib.llm_client.stream_sinks import MultiplexedProgressView, TtyRenderer
+
+    runtime = get_runtime()
     task = input("Please give me a task: ")
-    coding_service = CodingService()
-    coding_service.learn_code(file_abs_path_to_content=contents)
-    code_feature_files = coding_service.code_feature(
+    contents = read_included_files(local_repo_path=local_repo_path, task=task)
+    # Parallel candidates get a line each
+    runtime.stream_sink = TtyRenderer() if runtime.settings.code_candidates <= 1 else MultiplexedProgressView()
+    coding_service = runtime.coding_service()
+    coding_service.learn_code(file_abs_path_to_content=contents, relevance_query=task)
+    # The files are written as soon as the llm finished generating each of them,
+    # or once a candidate passed the validation when several candidates are generated
+    code_feature_files = coding_service.code_feature_from_settings(
         task=task, local_repo_path=local_repo_path
     )
     coding_service.write_code(
@@ -76,6 +109,7 @@ def run_code_writing_session(local_repo_path: str):
     )
 
     print(f"Code written to {local_repo_path} successfully.")
+    report_llm_telemetry()
 
 
 def code_review_file(
@@ -89,53 +123,67 @@ def code_review_file(
     :param content: The content of the file to be reviewed.
     :param local_repo_path: The path to the local repository.
     """
-    coding_service = CodingService()
-    file_path_to_content = {file_path: content}
-
-    file_dependencies = coding_service.repo_reader_service.find_dependencies_by_file(
-        file_path=file_path,
-        local_repo_path=local_repo_path
+    return get_runtime().code_review_service(local_repo_path=local_repo_path).review_file(
+        file_path=file_path, content=content
     )
 
-    for dep_idx, file_dependency_path in enumerate(file_dependencies):
-        if not os.path.isfile(file_dependency_path):
-            logger.warning(f"Dependency file {file_dependency_path} does not exist, skipping.")
-            continue
-
-        logger.info(
-            f"Reading dependency {dep_idx + 1}/{len(file_dependencies)} for the file {file_path}: {file_dependency_path}")
-
-        with open(file_dependency_path, "r") as file:
-            file_dependency_content = file.read()
-
-        file_path_to_content[file_dependency_path] = file_dependency_content
-
-    coding_service.learn_code(file_abs_path_to_content=file_path_to_content)
-    issues = coding_service.perform_code_review()
-    return issues
-
 
 def run_code_review_session(local_repo_path: str):
+    from src.lib.issue_store import IssueStore
+    from src.lib.llm_client.base_llm_client import get_json_response_stats
+    from src.lib.llm_client.stream_sinks import MultiplexedProgressView
+    from src.lib.review_manifest import ReviewManifest
+
+    runtime = get_runtime()
     contents = read_included_files(local_repo_path=local_repo_path)
+    # The reviews run in parallel, every worker gets a line
+    progress_view = runtime.stream_sink = MultiplexedProgressView()
     bugs_output_dir = os.path.join(local_repo_path, "ohad_bugs")
-
-    for idx, (file_path, content) in enumerate(contents.items()):
-        print(f"Searching for issues in file {idx + 1}/{len(contents)}: {file_path}")
-        issues = code_review_file(
-            file_path=file_path,
-            content=content,
-            local_repo_path=local_repo_path,
+    code_review_service = runtime.code_review_service(local_repo_path=local_repo_path)
+    issues_found = new_issues = 0
+
+    with ExitStack() as stack:
+        issue_store = stack.enter_context(closing(IssueStore(os.path.join(bugs_output_dir, "issues.sqlite"))))
+        manifest = (
+            stack.enter_context(closing(ReviewManifest(os.path.join(bugs_output_dir, "review_manifest.sqlite"))))
+            if runtime.settings.review_incremental else None
         )
-
-        if not issues:
-            print(f"No issues found in {file_path}, skipping.")
-            continue
-
-        os.makedirs(bugs_output_dir, exist_ok=True)
-        output_file_path = os.path.join(bugs_output_dir, f"{os.path.basename(file_path)}.issues.json")
-        with open(output_file_path, "w") as f:
-            print(f"Writing issues to {output_file_path}")
-            f.write(json.dumps(issues, indent=4))
+        # A run that raises is left unfinished, the next run compares itself to the last finished one
+        run_id = issue_store.start_run()
+
+        for file_path, issues in code_review_service.review_files(
+            file_path_to_content=contents,
+            on_progress=lambda done, total, path: progress_view.write_line(f"Reviewed file {done}/{total}: {path}"),
+            manifest=manifest,
+        ):
+            if not issues:
+                progress_view.write_line(f"No issues found in {file_path}, skipping.")
+                continue
+
+            file_new_issues = issue_store.add_issues(run_id=run_id, file_path=file_path, issues=issues)
+            issues_found += len(issues)
+            new_issues += file_new_issues
+            progress_view.write_line(f"Found {len(issues)} issues in {file_path}, {file_new_issues} new")
+
+        issue_store.finish_run(run_id)
+        export_path = os.path.join(bugs_output_dir, "issues.jsonl")
+        issue_store.export_jsonl(export_path)
+
+    print(f"Found {issues_found} issues, {new_issues} new since the last run, all issues exported to {export_path}")
+
+    if manifest is not None:
+        print(f"Reused the reviews of {code_review_service.reused_reviews} unchanged files")
+
+    if code_review_service.dependency_reuse_report:
+        print(f"Dependencies: {code_review_service.dependency_reuse_report.summary()}")
+
+    json_response_stats = get_json_response_stats()
+    print(
+        f"JSON responses: {json_response_stats.attempts} attempts, {json_response_stats.repaired} repaired locally, "
+        f"{json_response_stats.retries} retries ({json_response_stats.retry_rate:.1%}), "
+        f"{json_response_stats.failures} failures"
+    )
+    report_llm_telemetry()
 
 
 @dataclass
@@ -145,8 +193,7 @@ class MenuOption:
 
 
 def main():
-    settings = get_settings()
-    local_repo_path = settings.repo_path
+    local_repo_path = get_runtime().settings.repo_path
     menu_options: List[MenuOption] = [
         MenuOption(
             option="Code Writing",
@@ -182,5 +229,141 @@ def main():
             return
 
 
+def run_batch(args: argparse.Namespace) -> int:
+    from src.lib.llm_client.stream_sinks import MultiplexedProgressView
+    from src.services.batch_service import BatchService, load_jobs
+
+    runtime = get_runtime()
+    runtime.stream_sink = MultiplexedProgressView()
+    jobs = load_jobs(args.jobs)
+    batch_service = BatchService(
+        local_repo_path=args.repo_path or runtime.settings.repo_path,
+        mode=BatchMode(args.mode.upper()),
+        include_files=args.include_files.split(",") if args.include_files else None,
+        include_glob=args.include_glob,
+        concurrency=args.concurrency,
+        auto_select=args.auto_select,
+        runtime=runtime,
+    )
+    print(f"Running {len(jobs)} jobs with a concurrency of {args.concurrency}")
+
+    summary = batch_service.run_to_files(jobs=jobs, results_path=args.results, summary_path=args.summary)
+    print(json.dumps({key: summary[key] for key in ["jobs", "succeeded", "failed", "duration_seconds"]}))
+
+    return 1 if summary["failed"] else 0
+
+
+def _job_queue_service(args: argparse.Namespace):
+    from src.services.job_queue_service import JobQueueService
+
+    runtime = get_runtime()
+    return JobQueueService(
+        job_queue=runtime.job_queue, local_repo_path=args.repo_path or runtime.settings.repo_path, runtime=runtime
+    )
+
+
+def enqueue_jobs(args: argparse.Namespace) -> int:
+    """
+    Enqueues the jobs of --jobs, or without it a review job per file of the repository, for the workers.
+    """
+    from src.services.batch_service import load_jobs
+
+    runtime = get_runtime()
+    job_queue_service = _job_queue_service(args)
+
+    if args.jobs:
+        batch_id = job_queue_service.enqueue_batch_jobs(load_jobs(args.jobs), mode=BatchMode(args.mode.upper()))
+    else:
+        file_paths = runtime.repository_reader_service.read_files(
+            directory=args.repo_path or runtime.settings.repo_path,
+            include_files=args.include_files.split(",") if args.include_files else None,
+            include_glob=args.include_glob,
+        )
+        batch_id = job_queue_service.enqueue_reviews(file_paths)
+
+    print(f"Enqueued batch {batch_id}, collect its reviews with --collect {batch_id}")
+    return 0
+
+
+def run_queue_worker(args: argparse.Namespace) -> int:
+    jobs_run = _job_queue_service(args).run_worker(max_jobs=args.max_jobs, exit_when_empty=args.exit_when_empty)
+    print(f"Ran {jobs_run} jobs")
+    return 0
+
+
+def collect_batch(args: argparse.Namespace) -> int:
+    """
+    Waits for the jobs of a batch and adds the issues of its reviews to the issue store of the Bug Finder.
+    """
+    from src.lib.issue_store import IssueStore
+
+    local_repo_path = args.repo_path or get_runtime().settings.repo_path
+    job_queue_service = _job_queue_service(args)
+    counts = job_queue_service.wait_for_batch(args.collect)
+
+    bugs_output_dir = os.path.join(local_repo_path, "ohad_bugs")
+    export_path = os.path.join(bugs_output_dir, "issues.jsonl")
+
+    with closing(IssueStore(os.path.join(bugs_output_dir, "issues.sqlite"))) as issue_store:
+        issues_found, new_issues = job_queue_service.collect_reviews(args.collect, issue_store)
+        issue_store.export_jsonl(export_path)
+
+    print(
+        f"{counts[QueueJobStatus.SUCCEEDED]} jobs succeeded, {counts[QueueJobStatus.FAILED]} failed. "
+        f"Found {issues_found} issues, {new_issues} new since the last run, all issues exported to {export_path}"
+    )
+    return 1 if counts[QueueJobStatus.FAILED] else 0
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Without --jobs the interactive menu is started.")
+    parser.add_argument("--repo-path", help="The repository to work on, defaults to REPO_PATH")
+    parser.add_argument("--jobs", help="A JSONL job file, every line is a job with a job_id (or request_id) and a task")
+    parser.add_argument("--mode", choices=[mode.value.lower() for mode in BatchMode], default="code")
+    parser.add_argument("--include-glob", action="append", help="Only read files matching this glob, repeatable")
+    parser.add_argument("--include-files", help="Only read files with these comma separated names")
+    parser.add_argument(
+        "--auto-select", action="store_true", help="Select the files relevant to the task of code jobs automatically"
+    )
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of jobs running at the same time")
+    parser.add_argument("--results", default="batch_results.jsonl", help="Per job results, appended as JSONL")
+    parser.add_argument("--summary", default="batch_summary.json", help="Summary of the whole batch")
+    queue_group = parser.add_argument_group("job queue", "Spread the work over workers through DATABASE_URL")
+    queue_group.add_argument(
+        "--enqueue", action="store_true", help="Enqueue the --jobs, or a review job per file, instead of running them"
+    )
+    queue_group.add_argument("--worker", action="store_true", help="Run the queued jobs")
+    queue_group.add_argument("--max-jobs", type=int, help="Stop the worker after this number of jobs")
+    queue_group.add_argument("--exit-when-empty", action="store_true", help="Stop the worker when no job is queued")
+    queue_group.add_argument("--collect", metavar="BATCH_ID", help="Wait for a batch and store the issues it found")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main()
+    cli_args = parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    configure_logging()
+
+    if cli_args.repo_path:
+        # The settings are read from the environment the first time they are used
+        os.environ["REPO_PATH"] = cli_args.repo_path
+
+    try:
+        if cli_args.enqueue:
+            sys.exit(enqueue_jobs(cli_args))
+
+        if cli_args.worker:
+            sys.exit(run_queue_worker(cli_args))
+
+        if cli_args.collect:
+            sys.exit(collect_batch(cli_args))
+
+        if cli_args.jobs:
+            sys.exit(run_batch(cli_args))
+
+        main()
+    finally:
+        get_runtime().close()
@@ -1,7 +1,9 @@
-from .settings import get_settings
-import logging.config
-import os
+def __getattr__(name: str):
+    # The settings import pydantic, so they are only imported when used.
+    # The logging is configured by the entry points, see src.runtime.configure_logging
+    if name == "get_settings":
+        from .settings import get_settings
 
-logging.config.fileConfig(
-    os.path.join(os.path.dirname(__file__), "..", "logging_config.ini")
-)
+        return get_settings
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,172 @@
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.lib.import_graph import DEFAULT_EXCLUDED_FOLDERS
+from src.lib.patch_applier import apply_patch
+from src.types.enums import CodedFileAction
+from src.types.schema import CodedFileResponse
+
+# The end of the output of a failed test command that is kept in the errors
+TEST_OUTPUT_TAIL_CHARS = 2000
+
+# The test command this process runs and its temporary copy of the repository, see init_validation_worker
+_running_test: Optional[Tuple[subprocess.Popen, str]] = None
+
+
+@dataclass
+class CandidateValidation:
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        return not self.errors
+
+
+def _candidate_contents(repo_path: str, coded_files: List[Dict], errors: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Returns the content every file of the candidate would have once written, keyed by the path relative to
+    the repository, None for deleted files. The problems of the files are added to `errors`.
+    """
+    contents: Dict[str, Optional[str]] = {}
+
+    for payload in coded_files:
+        coded_file = CodedFileResponse.model_validate(payload)
+        file_path = os.path.realpath(os.path.join(repo_path, coded_file.file_path))
+
+        if os.path.commonpath([repo_path, file_path]) != repo_path or file_path == repo_path:
+            errors.append(f"{coded_file.file_path} is outside of the repository")
+            continue
+
+        relative_path = os.path.relpath(file_path, repo_path)
+
+        if coded_file.action in (CodedFileAction.UPDATE, CodedFileAction.DELETE) and not os.path.isfile(file_path):
+            errors.append(f"{relative_path} does not exist, it can not be the target of {coded_file.action.value}")
+            continue
+
+        if coded_file.action == CodedFileAction.DELETE:
+            contents[relative_path] = None
+            continue
+
+        content = coded_file.content
+
+        if coded_file.action == CodedFileAction.UPDATE and coded_file.patch:
+            with open(file_path, "r") as f:
+                patch_result = apply_patch(f.read(), coded_file.patch)
+
+            if patch_result.failed:
+                errors.append(f"The patch of {relative_path} does not apply:\n{patch_result.describe_failures()}")
+                continue
+
+            content = patch_result.content
+
+        if relative_path.endswith(".py"):
+            try:
+                # What py_compile checks, without writing a .pyc next to the file
+                compile(content, relative_path, "exec", dont_inherit=True)
+            except (SyntaxError, ValueError) as e:
+                errors.append(f"{relative_path} is not valid python: {e}")
+                continue
+
+        contents[relative_path] = content
+
+    return contents
+
+
+def _kill_process_group(process: subprocess.Popen):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _terminate_validation_worker(signum, frame):
+    if _running_test:
+        process, temp_dir = _running_test
+        _kill_process_group(process)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    os._exit(1)
+
+
+def init_validation_worker():
+    """
+    Initializer of the processes that validate candidates: terminating one also kills the test command it runs
+    instead of leaving it behind.
+    """
+    signal.signal(signal.SIGTERM, _terminate_validation_worker)
+
+
+def _run_test_command(
+    repo_path: str, contents: Dict[str, Optional[str]], test_command: str, timeout_seconds: float
+) -> List[str]:
+    global _running_test
+
+    with tempfile.TemporaryDirectory(prefix="ohad-candidate-") as temp_dir:
+        candidate_repo_path = os.path.join(temp_dir, os.path.basename(repo_path))
+        shutil.copytree(
+            repo_path, candidate_repo_path, symlinks=True, ignore=shutil.ignore_patterns(*DEFAULT_EXCLUDED_FOLDERS)
+        )
+
+        for relative_path, content in contents.items():
+            file_path = os.path.join(candidate_repo_path, relative_path)
+
+            if content is None:
+                os.remove(file_path)
+                continue
+
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "w") as f:
+                f.write(content)
+
+        # In its own process group, so the commands it spawns are killed with it
+        process = subprocess.Popen(
+            test_command,
+            shell=True,
+            cwd=candidate_repo_path,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            start_new_session=True,
+        )
+        _running_test = (process, temp_dir)
+
+        try:
+            output, _ = process.communicate(timeout=timeout_seconds)
+        except subprocess.TimeoutExpired:
+            _kill_process_group(process)
+            process.communicate()
+            return [f"The test command did not finish within {timeout_seconds} seconds"]
+        finally:
+            _running_test = None
+
+    if process.returncode != 0:
+        return [f"The test command failed with exit code {process.returncode}:\n{output[-TEST_OUTPUT_TAIL_CHARS:]}"]
+
+    return []
+
+
+def validate_candidate(
+    local_repo_path: str,
+    coded_files: List[Dict],
+    test_command: Optional[str] = None,
+    test_timeout_seconds: float = 600,
+) -> CandidateValidation:
+    """
+    Checks the files of a code_feature candidate without touching the repository: every path is inside the
+    repository, the targets of UPDATE and DELETE exist, the patches apply and the python files compile.
+    When a test command is given it then runs in a temporary copy of the repository with the candidate written.
+    Takes and returns plain data so it can run in a process pool.
+    """
+    repo_path = os.path.realpath(local_repo_path)
+    validation = CandidateValidation()
+    contents = _candidate_contents(repo_path, coded_files, validation.errors)
+
+    if validation.passed and test_command:
+        validation.errors.extend(_run_test_command(repo_path, contents, test_command, test_timeout_seconds))
+
+    return validation
@@ -0,0 +1,209 @@
+import ast
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from src.utils.tokens import estimate_tokens
+
+# Headers bigger than this share of a chunk keep only the first signatures
+HEADER_BUDGET_RATIO = 0.25
+
+
+@dataclass
+class CodeChunk:
+    # 1-based and inclusive, like the line numbers of the ast
+    start_line: int
+    end_line: int
+    names: List[str]
+    content: str
+
+    @property
+    def name(self) -> str:
+        return ", ".join(self.names) if self.names else f"lines {self.start_line}-{self.end_line}"
+
+
+def number_lines(lines: List[str], start_line: int) -> str:
+    """
+    Prefixes every line with its line number in the file, so reviewers can point at exact lines.
+    """
+    width = len(str(start_line + len(lines)))
+    return "\n".join(f"{str(start_line + idx).rjust(width)} | {line}" for idx, line in enumerate(lines))
+
+
+def _node_start(node: ast.AST) -> int:
+    # Decorators are part of the definition
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno, *(decorator.lineno for decorator in decorators)])
+
+
+def _signature(node: ast.AST, lines: List[str], indent: str = "") -> str:
+    # The lines from the def/class keyword up to the first statement of the body
+    body_start = node.body[0].lineno if node.body else node.end_lineno + 1
+    signature_lines = lines[node.lineno - 1:max(node.lineno, body_start - 1)]
+    signature = "\n".join(indent + line.strip() for line in signature_lines)
+    return f"{signature} ..."
+
+
+def build_header(source: str, max_tokens: Optional[int] = None) -> str:
+    """
+    Builds the context that every chunk of a module shares: the imports, the module globals and the
+    signatures of the top level functions and classes, with the signatures of the class methods.
+    """
+    tree = ast.parse(source)
+    lines = source.splitlines()
+    imports_and_globals = []
+    signatures = []
+
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.Assign, ast.AnnAssign)):
+            segment = lines[node.lineno - 1:node.end_lineno]
+            # Long literals are cut after their first line
+            imports_and_globals.append(segment[0] if len(segment) > 3 else "\n".join(segment))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            signatures.append(_signature(node, lines))
+        elif isinstance(node, ast.ClassDef):
+            class_signatures = [_signature(node, lines)]
+            class_signatures.extend(
+                _signature(child, lines, indent="    ")
+                for child in node.body
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+            )
+            signatures.append("\n".join(class_signatures))
+
+    header = "\n".join(imports_and_globals)
+
+    for idx, signature in enumerate(signatures):
+        if max_tokens and estimate_tokens(header) + estimate_tokens(signature) > max_tokens:
+            header += f"\n# ... {len(signatures) - idx} more definitions"
+            break
+
+        header += f"\n{signature}"
+
+    return header.strip()
+
+
+def _split_node(node: ast.AST, max_tokens: int, lines: List[str]) -> List[Tuple[int, int, Optional[str]]]:
+    """
+    Returns the (start_line, end_line, name) units of a top level statement. Classes that do not fit
+    a chunk are split into their methods.
+    """
+    start, end = _node_start(node), node.end_lineno
+    name = getattr(node, "name", None)
+
+    if not isinstance(node, ast.ClassDef) or estimate_tokens("\n".join(lines[start - 1:end])) <= max_tokens:
+        return [(start, end, name)]
+
+    units = []
+    unit_start = start
+
+    for child in node.body:
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            child_start = _node_start(child)
+            if child_start > unit_start:
+                units.append((unit_start, child_start - 1, name))
+            units.append((child_start, child.end_lineno, f"{name}.{child.name}"))
+            unit_start = child.end_lineno + 1
+
+    if unit_start <= end:
+        units.append((unit_start, end, name))
+
+    return units
+
+
+def _split_lines(start: int, end: int, max_tokens: int, lines: List[str]) -> List[Tuple[int, int]]:
+    # The last resort for units that do not fit a chunk, windows of whole lines
+    windows = []
+    window_start, window_tokens = start, 0
+
+    for line_number in range(start, end + 1):
+        line_tokens = estimate_tokens(lines[line_number - 1]) + 1
+
+        if window_tokens + line_tokens > max_tokens and line_number > window_start:
+            windows.append((window_start, line_number - 1))
+            window_start, window_tokens = line_number, 0
+
+        window_tokens += line_tokens
+
+    windows.append((window_start, end))
+    return windows
+
+
+def chunk_lines(source: str, max_tokens: int) -> List[CodeChunk]:
+    """
+    Splits any text into chunks of whole lines of up to `max_tokens` tokens.
+    """
+    lines = source.splitlines()
+
+    if not lines:
+        return []
+
+    return [
+        CodeChunk(start_line=start, end_line=end, names=[], content="\n".join(lines[start - 1:end]))
+        for start, end in _split_lines(1, len(lines), max_tokens, lines)
+    ]
+
+
+def chunk_source(source: str, max_tokens: int) -> List[CodeChunk]:
+    """
+    Splits a module into chunks of whole functions and classes of up to `max_tokens` tokens.
+    Small neighbouring definitions are packed into the same chunk, code that is not valid python
+    is split into windows of lines.
+    """
+    lines = source.splitlines()
+
+    if not lines:
+        return []
+
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return chunk_lines(source, max_tokens)
+
+    units: List[Tuple[int, int, Optional[str]]] = []
+    for node in tree.body:
+        units.extend(_split_node(node, max_tokens, lines))
+
+    # Comments and blank lines between the statements belong to the next unit, the tail to the last one
+    covered_units = []
+    next_start = 1
+    for idx, (start, end, name) in enumerate(units):
+        end = len(lines) if idx == len(units) - 1 else end
+        covered_units.append((next_start, end, name))
+        next_start = end + 1
+
+    chunks: List[CodeChunk] = []
+    current: Optional[CodeChunk] = None
+
+    for start, end, name in covered_units or [(1, len(lines), None)]:
+        unit_text = "\n".join(lines[start - 1:end])
+        unit_tokens = estimate_tokens(unit_text)
+
+        if unit_tokens > max_tokens:
+            if current:
+                chunks.append(current)
+                current = None
+            chunks.extend(
+                CodeChunk(
+                    start_line=window_start,
+                    end_line=window_end,
+                    names=[name] if name else [],
+                    content="\n".join(lines[window_start - 1:window_end]),
+                )
+                for window_start, window_end in _split_lines(start, end, max_tokens, lines)
+            )
+            continue
+
+        if current and estimate_tokens(current.content) + unit_tokens <= max_tokens:
+            current.end_line = end
+            current.content += "\n" + unit_text
+            if name and name not in current.names:
+                current.names.append(name)
+            continue
+
+        if current:
+            chunks.append(current)
+        current = CodeChunk(start_line=start, end_line=end, names=[name] if name else [], content=unit_text)
+
+    if current:
+        chunks.append(current)
+
+    return chunks
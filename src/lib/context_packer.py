@@ -0,0 +1,151 @@
+import math
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, List, Mapping, Optional, Tuple
+
+from src.utils.tokens import CHARS_PER_TOKEN, estimate_tokens, split_identifiers
+
+TRUNCATION_MARKER = "# ... truncated to fit the context budget ..."
+
+
+@dataclass
+class ContextPackingReport:
+    token_budget: int
+    total_tokens: int = 0
+    num_messages: int = 0
+    included: List[str] = field(default_factory=list)
+    truncated: List[str] = field(default_factory=list)
+    dropped: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.included)} files included ({len(self.truncated)} truncated), "
+            f"{len(self.dropped)} dropped, {self.total_tokens}/{self.token_budget} tokens "
+            f"in {self.num_messages} messages"
+        )
+
+
+class ContextPacker:
+    """
+    Packs files into as few context messages as possible without going over a token budget.
+    Files are ranked by their relevance to a query (the task or the reviewed file), the pinned files
+    always come first. Files that do not fit are truncated if enough budget is left, otherwise dropped.
+    With a stable order the budget is spent in the same way, but the files are sent in the given order
+    with the pinned files last, so conversations sharing their first files share a prompt prefix.
+    """
+
+    def __init__(self, token_budget: int, max_message_tokens: int = 4000, min_truncated_tokens: int = 200):
+        self._token_budget = token_budget
+        self._max_message_tokens = max_message_tokens
+        self._min_truncated_tokens = min_truncated_tokens
+
+    @staticmethod
+    def format_file(file_abs_path: str, content: str) -> str:
+        return f"#########################\n# {file_abs_path}\n{content}\n#########################\n"
+
+    @staticmethod
+    def _relevance_score(query_terms: Counter, file_abs_path: str, content: str) -> float:
+        if not query_terms:
+            return 0.0
+
+        content_terms = set(split_identifiers(content))
+        path_terms = set(split_identifiers(os.path.basename(file_abs_path)))
+        matched = sum(1 for term in query_terms if term in content_terms)
+        matched_in_path = sum(1 for term in query_terms if term in path_terms)
+
+        # Normalize by the vocabulary size so big files do not win only because they are big
+        return (matched + 2 * matched_in_path) / math.sqrt(len(content_terms) + 1)
+
+    def rank(
+        self,
+        file_abs_path_to_content: Mapping[str, str],
+        relevance_query: Optional[str] = None,
+        pinned_paths: Iterable[str] = (),
+    ) -> List[str]:
+        pinned_paths = [path for path in pinned_paths if path in file_abs_path_to_content]
+        query_terms = Counter(split_identifiers(relevance_query or ""))
+        order = {path: idx for idx, path in enumerate(file_abs_path_to_content)}
+
+        rest = sorted(
+            (path for path in file_abs_path_to_content if path not in pinned_paths),
+            key=lambda path: (
+                -self._relevance_score(query_terms, path, file_abs_path_to_content[path]),
+                order[path],
+            ),
+        )
+
+        return [*pinned_paths, *rest]
+
+    def _truncate(self, content: str, max_tokens: int) -> str:
+        max_chars = max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER) - 1
+        truncated = content[:max(max_chars, 0)]
+
+        # Cut at a line boundary so the model does not see half a statement
+        if "\n" in truncated:
+            truncated = truncated[: truncated.rindex("\n")]
+
+        return f"{truncated}\n{TRUNCATION_MARKER}"
+
+    def pack(
+        self,
+        file_abs_path_to_content: Mapping[str, str],
+        relevance_query: Optional[str] = None,
+        pinned_paths: Iterable[str] = (),
+        stable_order: bool = False,
+    ) -> Tuple[List[str], ContextPackingReport]:
+        report = ContextPackingReport(token_budget=self._token_budget)
+        pinned_paths = list(pinned_paths)
+        blocks = {}
+
+        for file_abs_path in self.rank(file_abs_path_to_content, relevance_query, pinned_paths):
+            content = file_abs_path_to_content[file_abs_path]
+            block = self.format_file(file_abs_path, content)
+            block_tokens = estimate_tokens(block)
+            remaining_tokens = self._token_budget - report.total_tokens
+
+            if block_tokens > remaining_tokens:
+                content_budget = remaining_tokens - estimate_tokens(self.format_file(file_abs_path, ""))
+
+                if content_budget < self._min_truncated_tokens:
+                    report.dropped.append(file_abs_path)
+                    continue
+
+                block = self.format_file(file_abs_path, self._truncate(content, content_budget))
+                block_tokens = estimate_tokens(block)
+                report.truncated.append(file_abs_path)
+
+            report.included.append(file_abs_path)
+            report.total_tokens += block_tokens
+            blocks[file_abs_path] = block
+
+        if stable_order:
+            order = [
+                *(path for path in file_abs_path_to_content if path in blocks and path not in pinned_paths),
+                *(path for path in pinned_paths if path in blocks),
+            ]
+        else:
+            order = list(blocks)
+
+        messages: List[str] = []
+        current_message: List[str] = []
+        current_message_tokens = 0
+
+        for file_abs_path in order:
+            block = blocks[file_abs_path]
+            block_tokens = estimate_tokens(block)
+
+            # Small files are merged into shared messages, big files get a message of their own
+            if current_message and current_message_tokens + block_tokens > self._max_message_tokens:
+                messages.append("".join(current_message))
+                current_message, current_message_tokens = [], 0
+
+            current_message.append(block)
+            current_message_tokens += block_tokens
+
+        if current_message:
+            messages.append("".join(current_message))
+
+        report.num_messages = len(messages)
+
+        return messages, report
@@ -0,0 +1,73 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
+
+from src.settings import get_settings
+
+
+@dataclass
+class FileContentCacheStats:
+    hits: int = 0
+    misses: int = 0
+    bytes_read: int = 0
+    bytes_served: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_served - self.bytes_read
+
+
+class FileContentCache:
+    """
+    An in-process LRU cache of file contents, bounded by the total size of the cached contents and
+    shared by threads. An entry is only served while the size and mtime of the file are unchanged.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self._max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], str]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = FileContentCacheStats()
+
+    def read(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        version = (stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            entry = self._entries.get(file_path)
+
+            if entry and entry[0] == version:
+                self._entries.move_to_end(file_path)
+                self.stats.hits += 1
+                self.stats.bytes_served += stat.st_size
+                return entry[1]
+
+        with open(file_path, "r") as file:
+            content = file.read()
+
+        with self._lock:
+            self.stats.misses += 1
+            self.stats.bytes_read += stat.st_size
+            self.stats.bytes_served += stat.st_size
+
+            if file_path in self._entries:
+                self._total_bytes -= len(self._entries.pop(file_path)[1])
+
+            if len(content) <= self._max_bytes:
+                self._entries[file_path] = (version, content)
+                self._total_bytes += len(content)
+
+            while self._total_bytes > self._max_bytes:
+                _, (_, evicted_content) = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted_content)
+
+        return content
+
+
+@lru_cache()
+def get_file_content_cache() -> FileContentCache:
+    return FileContentCache(max_bytes=get_settings().file_content_cache_max_bytes)
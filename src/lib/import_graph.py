@@ -0,0 +1,171 @@
+import ast
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from src.lib.repository_walker import RepositoryWalker
+
+DEFAULT_EXCLUDED_FOLDERS = (".git", ".idea", "venv", ".venv", "__pycache__", "node_modules", ".ohad_cache")
+
+
+class ImportGraph:
+    """
+    A static import graph of the python files of a repository.
+    Imports are parsed with `ast` and mapped to files under the repository root, third party and
+    standard library modules are ignored since they can not be resolved to a local file.
+    """
+
+    def __init__(self, local_repo_path: str, excluded_folders: Iterable[str] = DEFAULT_EXCLUDED_FOLDERS):
+        self._logger = logging.getLogger(__name__)
+        self._root = os.path.abspath(local_repo_path)
+        self._excluded_folders = set(excluded_folders)
+        self._source_roots = self._find_source_roots()
+        self._dependencies: Optional[Dict[str, List[str]]] = None
+        self._dependents: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def _find_source_roots(self) -> List[str]:
+        source_roots = [self._root]
+
+        # Support the "src" layout, where the packages live under src/ and src itself is not a package
+        src_dir = os.path.join(self._root, "src")
+        if os.path.isdir(src_dir) and not os.path.isfile(os.path.join(src_dir, "__init__.py")):
+            source_roots.append(src_dir)
+
+        return source_roots
+
+    def _iter_python_files(self) -> Iterable[str]:
+        walker = RepositoryWalker(directory=self._root, excluded_folders=self._excluded_folders)
+
+        for walked_file in walker.walk():
+            if walked_file.name.endswith(".py"):
+                yield walked_file.path
+
+    @staticmethod
+    def _resolve_path(base_path: str) -> Optional[str]:
+        if os.path.isfile(f"{base_path}.py"):
+            return f"{base_path}.py"
+
+        package_init = os.path.join(base_path, "__init__.py")
+        if os.path.isfile(package_init):
+            return package_init
+
+        return None
+
+    def resolve_module(self, module: str) -> Optional[str]:
+        for source_root in self._source_roots:
+            resolved = self._resolve_path(os.path.join(source_root, *module.split(".")))
+            if resolved:
+                return resolved
+
+        return None
+
+    def _resolve_import_from(self, file_path: str, node: ast.ImportFrom) -> List[str]:
+        module_parts = node.module.split(".") if node.module else []
+        resolved = []
+
+        if node.level:
+            package_dir = os.path.dirname(file_path)
+            for _ in range(node.level - 1):
+                package_dir = os.path.dirname(package_dir)
+
+            base_paths = [os.path.join(package_dir, *module_parts)]
+        else:
+            base_paths = [
+                os.path.join(source_root, *module_parts) for source_root in self._source_roots
+            ]
+
+        for base_path in base_paths:
+            for alias in node.names:
+                # `from package import module` imports a module, `from module import name` imports a name
+                submodule = self._resolve_path(os.path.join(base_path, alias.name)) if alias.name != "*" else None
+                resolved.append(submodule or self._resolve_path(base_path))
+
+            if any(resolved):
+                break
+
+            resolved = []
+
+        return [path for path in resolved if path]
+
+    def parse_dependencies(self, file_path: str, source: Optional[str] = None) -> List[str]:
+        file_path = os.path.abspath(file_path)
+
+        if source is None:
+            with open(file_path, "r", encoding="utf-8") as file:
+                source = file.read()
+
+        try:
+            tree = ast.parse(source, filename=file_path)
+        except (SyntaxError, ValueError) as e:
+            self._logger.warning(f"Could not parse {file_path}, no dependencies resolved: {e}")
+            return []
+
+        dependencies = []
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                dependencies.extend(filter(None, (self.resolve_module(alias.name) for alias in node.names)))
+            elif isinstance(node, ast.ImportFrom):
+                dependencies.extend(self._resolve_import_from(file_path=file_path, node=node))
+
+        # Keep the import order, drop duplicates and self references
+        return [path for path in dict.fromkeys(dependencies) if path != file_path]
+
+    def build(self) -> Dict[str, List[str]]:
+        with self._lock:
+            if self._dependencies is not None:
+                return self._dependencies
+
+            self._logger.info(f"Building the import graph of {self._root}")
+            dependencies = {}
+
+            for file_path in self._iter_python_files():
+                try:
+                    dependencies[file_path] = self.parse_dependencies(file_path)
+                except (OSError, UnicodeDecodeError) as e:
+                    self._logger.warning(f"Failed to read {file_path}: {e}")
+
+            dependents = {}
+            for file_path, file_dependencies in dependencies.items():
+                for dependency in file_dependencies:
+                    dependents.setdefault(dependency, []).append(file_path)
+
+            self._dependencies = dependencies
+            self._dependents = dependents
+            self._logger.info(f"Import graph built with {len(dependencies)} files")
+
+            return self._dependencies
+
+    def dependencies_of(self, file_path: str) -> List[str]:
+        file_path = os.path.abspath(file_path)
+        dependencies = self.build()
+
+        if file_path not in dependencies:
+            return self.parse_dependencies(file_path)
+
+        return list(dependencies[file_path])
+
+    def dependents_of(self, file_path: str) -> List[str]:
+        self.build()
+        return list(self._dependents.get(os.path.abspath(file_path), []))
+
+
+@lru_cache()
+def _get_import_graph(local_repo_abs_path: str) -> ImportGraph:
+    return ImportGraph(local_repo_path=local_repo_abs_path)
+
+
+def get_import_graph(local_repo_path: str) -> ImportGraph:
+    # One graph per repository for the whole run, it is built lazily on the first lookup
+    return _get_import_graph(os.path.abspath(local_repo_path))
+
+
+def invalidate_import_graphs():
+    """
+    Drops the graphs built so far, the next lookups rebuild them from the current files. For long-lived
+    processes whose repository changes between units of work.
+    """
+    _get_import_graph.cache_clear()
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from src.lib.sqlite_store import open_sqlite_store
+
+# The statements that upgrade the schema of the store from every version to the next one, the store of record
+# keeps the history of every run so it is migrated instead of rebuilt. Append a migration to change the schema.
+ISSUE_STORE_MIGRATIONS: List[List[str]] = [
+    [
+        """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at REAL NOT NULL,
+            finished_at REAL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS issues (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_path TEXT NOT NULL,
+            -- 0 when the issue is about the whole file, NULLs would never conflict
+            line_start INTEGER NOT NULL,
+            line_end INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            severity TEXT,
+            issue TEXT NOT NULL,
+            first_seen_run INTEGER NOT NULL REFERENCES runs (id),
+            last_seen_run INTEGER NOT NULL REFERENCES runs (id),
+            -- Its index also serves the queries of a file
+            UNIQUE (file_path, line_start, line_end, fingerprint)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS issues_severity ON issues (severity)",
+        "CREATE INDEX IF NOT EXISTS issues_first_seen_run ON issues (first_seen_run)",
+        """
+        CREATE TABLE IF NOT EXISTS run_issues (
+            run_id INTEGER NOT NULL REFERENCES runs (id),
+            issue_id INTEGER NOT NULL REFERENCES issues (id),
+            PRIMARY KEY (run_id, issue_id)
+        )
+        """,
+    ],
+]
+ISSUE_STORE_SCHEMA_VERSION = len(ISSUE_STORE_MIGRATIONS)
+
+def normalize_issue_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def issue_fingerprint(issue: Dict) -> str:
+    """
+    Identifies an issue across runs, the same explanation worded with other whitespace or case is the same issue.
+    """
+    return hashlib.sha256(normalize_issue_text(issue["explanation"]).encode("utf-8")).hexdigest()
+
+
+class IssueStore:
+    """
+    Keeps the issues found by every review run in a single SQLite database. An issue is identified by the
+    full path of its file, its lines and its fingerprint, an issue found again by a later run is not stored
+    twice, the run is recorded as having seen it. Issues are never deleted, every run only appends.
+    """
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+
+        self._connection = open_sqlite_store(
+            db_path,
+            schema_version=ISSUE_STORE_SCHEMA_VERSION,
+            migrations=ISSUE_STORE_MIGRATIONS,
+            isolation_level=None,
+        )
+        self._connection.row_factory = sqlite3.Row
+
+    def start_run(self) -> int:
+        with self._lock:
+            return self._connection.execute("INSERT INTO runs (started_at) VALUES (?)", (time.time(),)).lastrowid
+
+    def finish_run(self, run_id: int):
+        with self._lock:
+            self._connection.execute("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), run_id))
+
+    def last_finished_run(self, before_run_id: Optional[int] = None) -> Optional[int]:
+        """
+        Returns the id of the last finished run, or of the last one started before `before_run_id`.
+        """
+        query = "SELECT MAX(id) FROM runs WHERE finished_at IS NOT NULL"
+        parameters = ()
+
+        if before_run_id is not None:
+            query += " AND id < ?"
+            parameters = (before_run_id,)
+
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchone()[0]
+
+    def add_issues(self, run_id: int, file_path: str, issues: List[Dict]) -> int:
+        """
+        Records the issues the run found in a file, in a single transaction. Returns how many of them
+        no previous run had found.
+        """
+        new_issues = 0
+
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+
+            for issue in issues:
+                line_start = issue.get("line_start") or 0
+                line_end = issue.get("line_end") or line_start
+                fingerprint = issue_fingerprint(issue)
+                row = self._connection.execute(
+                    "SELECT id FROM issues WHERE file_path = ? AND line_start = ? AND line_end = ? AND fingerprint = ?",
+                    (file_path, line_start, line_end, fingerprint),
+                ).fetchone()
+
+                if row:
+                    issue_id = row["id"]
+                    self._connection.execute(
+                        "UPDATE issues SET last_seen_run = MAX(last_seen_run, ?) WHERE id = ?", (run_id, issue_id)
+                    )
+                else:
+                    severity = issue.get("severity")
+                    issue_id = self._connection.execute(
+                        "INSERT INTO issues (file_path, line_start, line_end, fingerprint, severity, issue, "
+                        "first_seen_run, last_seen_run) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            file_path,
+                            line_start,
+                            line_end,
+                            fingerprint,
+                            severity.lower() if severity else None,
+                            json.dumps(issue),
+                            run_id,
+                            run_id,
+                        ),
+                    ).lastrowid
+                    new_issues += 1
+
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO run_issues (run_id, issue_id) VALUES (?, ?)", (run_id, issue_id)
+                )
+
+        return new_issues
+
+    def issues(
+        self,
+        file_path: Optional[str] = None,
+        severity: Optional[str] = None,
+        seen_in_run: Optional[int] = None,
+        new_since_run: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Returns the stored issues sorted by file and line, each with its file path. The filters are combined:
+        the issues of a file, of a severity, found by a run, or first found by a run after `new_since_run`.
+        """
+        conditions, parameters = [], []
+
+        if file_path is not None:
+            conditions.append("issues.file_path = ?")
+            parameters.append(file_path)
+
+        if severity is not None:
+            conditions.append("issues.severity = ?")
+            parameters.append(severity.lower())
+
+        if seen_in_run is not None:
+            conditions.append("issues.id IN (SELECT issue_id FROM run_issues WHERE run_id = ?)")
+            parameters.append(seen_in_run)
+
+        if new_since_run is not None:
+            conditions.append("issues.first_seen_run > ?")
+            parameters.append(new_since_run)
+
+        query = "SELECT * FROM issues"
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        with self._lock:
+            rows = self._connection.execute(query + " ORDER BY file_path, line_start, line_end, id", parameters)
+            return [self._row_to_issue(row) for row in rows.fetchall()]
+
+    @staticmethod
+    def _row_to_issue(row: sqlite3.Row) -> Dict:
+        return {
+            "file_path": row["file_path"],
+            **json.loads(row["issue"]),
+            "first_seen_run": row["first_seen_run"],
+            "last_seen_run": row["last_seen_run"],
+        }
+
+    def export_jsonl(self, output_path: str, **filters) -> int:
+        """
+        Writes the issues, filtered as in `issues`, to a JSONL file, one issue per line. The file is replaced
+        at once so readers never see a partial export. Returns the number of issues written.
+        """
+        issues = self.issues(**filters)
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+
+        # A temporary file per export, exports of parallel jobs do not write to the same file
+        with tempfile.NamedTemporaryFile("w", dir=output_dir, suffix=".tmp", delete=False) as f:
+            for issue in issues:
+                f.write(json.dumps(issue) + "\n")
+
+        os.replace(f.name, output_path)
+        return len(issues)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM issues").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,304 @@
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    and_,
+    create_engine,
+    event,
+    func,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+
+from src.types.enums import BatchMode, QueueJobStatus
+
+metadata = MetaData()
+PAYLOAD_TYPE = JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+jobs_table = Table(
+    "jobs",
+    metadata,
+    # SQLite only autoincrements INTEGER primary keys
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    # Groups the jobs of a run, e.g. the files of a distributed Bug Finder run
+    Column("batch_id", String(64), nullable=True, index=True),
+    Column("mode", String(16), nullable=False),
+    Column("payload", PAYLOAD_TYPE, nullable=False),
+    Column("status", String(16), nullable=False),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("max_attempts", Integer, nullable=False),
+    # Queued jobs are not leased before this time, retries are delayed with it
+    Column("run_after", DateTime(timezone=True), nullable=False),
+    Column("leased_by", String(128), nullable=True),
+    Column("lease_expires_at", DateTime(timezone=True), nullable=True),
+    Column("heartbeat_at", DateTime(timezone=True), nullable=True),
+    Column("result", PAYLOAD_TYPE, nullable=True),
+    Column("error", Text, nullable=True),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("finished_at", DateTime(timezone=True), nullable=True),
+    # Serves the lease query, the oldest queued job that is due
+    Index("ix_jobs_status_run_after", "status", "run_after"),
+)
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def create_queue_engine(database_url: str) -> Engine:
+    """
+    Creates the engine of the queue. With a sqlite:// url every transaction takes the write lock when it
+    begins, which gives the leases the guarantee FOR UPDATE SKIP LOCKED gives them on Postgres.
+    """
+    if not database_url.startswith("sqlite"):
+        return create_engine(database_url, pool_pre_ping=True)
+
+    engine = create_engine(database_url, connect_args={"timeout": 30})
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, _):
+        # The transactions are started by the "begin" listener below
+        dbapi_connection.isolation_level = None
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+@dataclass
+class QueuedJob:
+    id: int
+    mode: BatchMode
+    payload: Dict
+    attempts: int
+    max_attempts: int
+    batch_id: Optional[str] = None
+
+
+class JobQueue:
+    """
+    A job queue in a database table, shared by any number of worker processes and hosts. A worker leases
+    a job for `lease_seconds` and keeps the lease with heartbeats. The job of a worker that stopped sending
+    heartbeats is queued again once its lease expires, and failed jobs are retried with a backoff until
+    they ran `max_attempts` times. The result of every job is stored in its row.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        lease_seconds: float = 300,
+        max_attempts: int = 3,
+        retry_backoff_seconds: float = 10,
+        clock: Callable[[], datetime] = utc_now,
+        rng: Optional[random.Random] = None,
+    ):
+        self.engine = engine
+        self._lease_seconds = lease_seconds
+        self._max_attempts = max_attempts
+        self._retry_backoff_seconds = retry_backoff_seconds
+        self._clock = clock
+        self._rng = rng or random.Random()
+
+    def create_tables(self):
+        """
+        Creates the tables when they do not exist, for SQLite files used locally. The Postgres schema is
+        created by the alembic migrations.
+        """
+        metadata.create_all(self.engine)
+
+    def enqueue(
+        self,
+        mode: BatchMode,
+        payloads: Iterable[Dict],
+        batch_id: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+    ) -> List[int]:
+        now = self._clock()
+        rows = [
+            {
+                "batch_id": batch_id,
+                "mode": mode.value,
+                "payload": payload,
+                "status": QueueJobStatus.QUEUED.value,
+                "attempts": 0,
+                "max_attempts": max_attempts or self._max_attempts,
+                "run_after": now,
+                "created_at": now,
+            }
+            for payload in payloads
+        ]
+
+        if not rows:
+            return []
+
+        with self.engine.begin() as connection:
+            # Batched into multi row INSERT ... RETURNING statements, the ids come back in the order of the payloads
+            return list(
+                connection.execute(
+                    insert(jobs_table).returning(jobs_table.c.id, sort_by_parameter_order=True), rows
+                ).scalars()
+            )
+
+    def _requeue_expired_leases(self, connection, now: datetime):
+        expired = and_(jobs_table.c.status == QueueJobStatus.RUNNING.value, jobs_table.c.lease_expires_at < now)
+        connection.execute(
+            update(jobs_table)
+            .where(expired, jobs_table.c.attempts >= jobs_table.c.max_attempts)
+            .values(status=QueueJobStatus.FAILED.value, error="The lease expired", leased_by=None, finished_at=now)
+        )
+        connection.execute(
+            update(jobs_table)
+            .where(expired)
+            .values(status=QueueJobStatus.QUEUED.value, error="The lease expired", leased_by=None, run_after=now)
+        )
+
+    def lease(self, worker_id: str, modes: Optional[Iterable[BatchMode]] = None) -> Optional[QueuedJob]:
+        """
+        Leases the oldest due job, or returns None when there is none. Concurrent workers never lease the
+        same job: the row is locked by SELECT ... FOR UPDATE SKIP LOCKED, and the rows locked by other
+        workers are skipped instead of waited for.
+        """
+        now = self._clock()
+        conditions = [jobs_table.c.status == QueueJobStatus.QUEUED.value, jobs_table.c.run_after <= now]
+
+        if modes is not None:
+            conditions.append(jobs_table.c.mode.in_([mode.value for mode in modes]))
+
+        with self.engine.begin() as connection:
+            self._requeue_expired_leases(connection, now)
+            row = connection.execute(
+                select(jobs_table)
+                .where(*conditions)
+                .order_by(jobs_table.c.run_after, jobs_table.c.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).mappings().first()
+
+            if row is None:
+                return None
+
+            connection.execute(
+                update(jobs_table)
+                .where(jobs_table.c.id == row["id"])
+                .values(
+                    status=QueueJobStatus.RUNNING.value,
+                    attempts=jobs_table.c.attempts + 1,
+                    leased_by=worker_id,
+                    lease_expires_at=now + timedelta(seconds=self._lease_seconds),
+                    heartbeat_at=now,
+                )
+            )
+
+        return QueuedJob(
+            id=row["id"],
+            mode=BatchMode(row["mode"]),
+            payload=row["payload"],
+            attempts=row["attempts"] + 1,
+            max_attempts=row["max_attempts"],
+            batch_id=row["batch_id"],
+        )
+
+    def _update_leased_job(self, job_id: int, worker_id: str, **values) -> bool:
+        """
+        Updates a job only while the worker holds its lease, returns False when the lease was lost.
+        """
+        with self.engine.begin() as connection:
+            result = connection.execute(
+                update(jobs_table)
+                .where(
+                    jobs_table.c.id == job_id,
+                    jobs_table.c.leased_by == worker_id,
+                    jobs_table.c.status == QueueJobStatus.RUNNING.value,
+                )
+                .values(**values)
+            )
+
+        return result.rowcount == 1
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        now = self._clock()
+        return self._update_leased_job(
+            job_id, worker_id, heartbeat_at=now, lease_expires_at=now + timedelta(seconds=self._lease_seconds)
+        )
+
+    def complete(self, job_id: int, worker_id: str, result: Dict) -> bool:
+        return self._update_leased_job(
+            job_id,
+            worker_id,
+            status=QueueJobStatus.SUCCEEDED.value,
+            result=result,
+            error=None,
+            leased_by=None,
+            lease_expires_at=None,
+            finished_at=self._clock(),
+        )
+
+    def fail(self, job: QueuedJob, worker_id: str, error: str) -> bool:
+        """
+        Queues the job again with an exponential backoff and jitter, or fails it for good once it ran
+        `max_attempts` times.
+        """
+        now = self._clock()
+
+        if job.attempts >= job.max_attempts:
+            return self._update_leased_job(
+                job.id,
+                worker_id,
+                status=QueueJobStatus.FAILED.value,
+                error=error,
+                leased_by=None,
+                lease_expires_at=None,
+                finished_at=now,
+            )
+
+        delay_seconds = self._retry_backoff_seconds * 2 ** (job.attempts - 1)
+        return self._update_leased_job(
+            job.id,
+            worker_id,
+            status=QueueJobStatus.QUEUED.value,
+            error=error,
+            leased_by=None,
+            lease_expires_at=None,
+            run_after=now + timedelta(seconds=delay_seconds * self._rng.uniform(0.5, 1.0)),
+        )
+
+    def jobs(self, batch_id: Optional[str] = None, status: Optional[QueueJobStatus] = None) -> List[Dict]:
+        query = select(jobs_table).order_by(jobs_table.c.id)
+
+        if batch_id is not None:
+            query = query.where(jobs_table.c.batch_id == batch_id)
+
+        if status is not None:
+            query = query.where(jobs_table.c.status == status.value)
+
+        with self.engine.connect() as connection:
+            return [dict(row) for row in connection.execute(query).mappings()]
+
+    def counts(self, batch_id: Optional[str] = None) -> Dict[QueueJobStatus, int]:
+        query = select(jobs_table.c.status, func.count()).group_by(jobs_table.c.status)
+
+        if batch_id is not None:
+            query = query.where(jobs_table.c.batch_id == batch_id)
+
+        with self.engine.connect() as connection:
+            counts = {QueueJobStatus(status): count for status, count in connection.execute(query)}
+
+        return {status: counts.get(status, 0) for status in QueueJobStatus}
@@ -0,0 +1,39 @@
+import logging
+import os
+from typing import Iterable, Iterator, Mapping
+
+
+class LazyFileContents(Mapping[str, str]):
+    """
+    A read only mapping of file path to file content, the content is read from disk on access
+    and is not kept in memory, so the memory usage does not grow with the size of the repository.
+    Files that were deleted since the mapping was built are skipped.
+    """
+
+    def __init__(self, file_paths: Iterable[str]):
+        self._logger = logging.getLogger(__name__)
+        self._file_paths = list(dict.fromkeys(file_paths))
+        self._file_paths_set = set(self._file_paths)
+
+    def __getitem__(self, file_path: str) -> str:
+        if file_path not in self._file_paths_set:
+            raise KeyError(file_path)
+
+        try:
+            with open(file_path, "rb") as file:
+                return file.read().decode("utf-8", errors="replace")
+        except OSError as e:
+            self._logger.warning(f"Failed to read {file_path}: {e}")
+            raise KeyError(file_path) from e
+
+    def __iter__(self) -> Iterator[str]:
+        return (file_path for file_path in self._file_paths if os.path.isfile(file_path))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, file_path: object) -> bool:
+        return file_path in self._file_paths_set and os.path.isfile(file_path)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self)} files)"
@@ -1,8 +1,51 @@
+import os
+from functools import lru_cache
+from typing import Optional
+
+from src.lib.llm_client.async_llm_client import AsyncLlMClient
 from src.lib.llm_client.llm_client import LlMClient
+from src.lib.llm_client.response_cache import ResponseCache
+from src.settings import get_cache_dir, get_settings
+
+
+@lru_cache()
+def get_response_cache() -> Optional[ResponseCache]:
+    settings = get_settings()
+
+    if not settings.llm_cache_enabled:
+        return None
+
+    return ResponseCache(
+        db_path=os.path.join(get_cache_dir(), "llm_responses.sqlite"),
+        max_bytes=settings.llm_cache_max_bytes,
+        max_age_seconds=settings.llm_cache_max_age_seconds,
+    )
+
+
+def llm_model_name() -> str:
+    # The model_name of the clients built by llm_client_factory, without building one
+    settings = get_settings()
+
+    if settings.llm_endpoints:
+        return "+".join(dict.fromkeys(endpoint.model for endpoint in settings.llm_endpoints))
+
+    return settings.gpt_model
 
 
 def llm_client_factory() -> LlMClient:
     # Importing here to avoid circular imports
     from src.lib.llm_client.openai_llm_client import OpenAiLlMClient
+    from src.lib.llm_client.pooled_openai_llm_client import PooledOpenAiLlMClient
+
+    if get_settings().llm_endpoints:
+        return PooledOpenAiLlMClient.from_env(response_cache=get_response_cache())
+
+    return OpenAiLlMClient.from_env(response_cache=get_response_cache())
+
+
+def async_llm_client_factory() -> AsyncLlMClient:
+    # Must be called from a running event loop, the clients of a loop share a connection pool that
+    # close_shared_async_openai_client closes before the loop ends
+    from src.lib.llm_client.async_openai_llm_client import AsyncOpenAiLlMClient
 
-    return OpenAiLlMClient.from_env()
+    return AsyncOpenAiLlMClient.from_env(response_cache=get_response_cache())
@@ -0,0 +1,107 @@
+import abc
+import json
+import logging
+from typing import Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel, ValidationError
+
+from src.lib.llm_client.base_llm_client import BaseLlmClient
+from src.lib.llm_client.conversation_memory import ConversationMemory
+from src.lib.llm_client.response_cache import ResponseCache
+from src.lib.llm_client.structured_output import response_format_for
+from src.lib.llm_client.telemetry import LlmTelemetry
+from src.types.enums import MemoryPolicy
+from src.types.schema import LlmMessage
+
+
+class AsyncLlMClient(BaseLlmClient):
+    """
+    The asyncio counterpart of LlMClient, with the same memory, cache, telemetry and json retry semantics.
+    Every instance holds one conversation, many instances can run concurrently on one event loop.
+    """
+
+    def __init__(
+        self,
+        response_cache: Optional[ResponseCache] = None,
+        structured_output: bool = False,
+        memory_max_tokens: Optional[int] = None,
+        telemetry: Optional[LlmTelemetry] = None,
+    ):
+        super().__init__(
+            response_cache=response_cache,
+            structured_output=structured_output,
+            memory_max_tokens=memory_max_tokens,
+            telemetry=telemetry,
+        )
+        self._logger = logging.getLogger(__name__)
+
+    def _create_memory(self) -> ConversationMemory:
+        # Summarizing needs a blocking request, async conversations use a sliding window
+        return ConversationMemory(max_tokens=self._memory_max_tokens, policy=MemoryPolicy.SLIDING_WINDOW)
+
+    async def send_message_expecting_json_response(
+        self,
+        message: str,
+        num_attempts: int = 10,
+        response_model: Optional[Type[BaseModel]] = None,
+        **kwargs,
+    ) -> Union[Dict, List, BaseModel]:
+        """
+        See LlMClient.send_message_expecting_json_response.
+        """
+        if response_model and self._structured_output:
+            kwargs["response_format"] = response_format_for(response_model)
+
+        while True:
+            self._record_json_response_stat("attempts")
+            response = await self.send_message(message, **kwargs)
+
+            try:
+                return self._parse_json_response(response, response_model=response_model)
+            except (json.JSONDecodeError, ValidationError):
+                if not self._discard_invalid_json_response(response, num_attempts):
+                    raise
+
+                num_attempts -= 1
+
+    async def send_message(
+        self,
+        message: str,
+        role: str = "user",
+        add_to_memory_without_response: bool = False,
+        **kwargs,
+    ) -> str:
+        user_message = LlmMessage(role=role, content=message)
+
+        if add_to_memory_without_response:
+            # Context messages are pinned to the stable prefix of the conversation
+            self._memory.append(user_message, pinned=True)
+            return ""
+
+        self._start_call_record(streamed=False)
+        response = self._get_cached_response(message=user_message, **kwargs)
+
+        if response is None:
+            self._mark_request_dispatched()
+
+            try:
+                response = await self._send_message_implementation_specific_logic(
+                    message=user_message, **kwargs
+                )
+            except Exception as e:
+                self._finish_call_record(message=user_message, response_content="", error=type(e).__name__)
+                raise
+
+            if self._response_cache and self._last_response_cache_key:
+                self._response_cache.set(self._last_response_cache_key, response.content)
+
+        self._finish_call_record(message=user_message, response_content=response.content)
+        self._memory.extend([user_message, response])
+
+        return response.content
+
+    @abc.abstractmethod
+    async def _send_message_implementation_specific_logic(
+        self, message: LlmMessage, **kwargs
+    ) -> LlmMessage:
+        pass
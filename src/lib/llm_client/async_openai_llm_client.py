@@ -0,0 +1,112 @@
+import asyncio
+import weakref
+from typing import Optional
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from src.lib.llm_client.async_llm_client import AsyncLlMClient
+from src.lib.llm_client.http_client_options import http_client_options
+from src.lib.llm_client.response_cache import ResponseCache
+from src.lib.llm_client.telemetry import LlmTelemetry
+from src.settings import get_settings
+from src.types.schema import LlmMessage
+
+# Async http clients are bound to the event loop that created their connections
+_shared_async_openai_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def build_async_openai_client(base_url: str, api_key: Optional[str] = None) -> AsyncOpenAI:
+    settings = get_settings()
+
+    return AsyncOpenAI(
+        base_url=base_url,
+        api_key=api_key or settings.openai_api_key,
+        http_client=DefaultAsyncHttpxClient(**http_client_options()),
+    )
+
+
+def get_shared_async_openai_client() -> AsyncOpenAI:
+    # All the conversations running on the same event loop share one connection pool
+    loop = asyncio.get_running_loop()
+
+    if loop not in _shared_async_openai_clients:
+        _shared_async_openai_clients[loop] = build_async_openai_client(base_url=get_settings().openai_base_url)
+
+    return _shared_async_openai_clients[loop]
+
+
+async def close_shared_async_openai_client():
+    """
+    Closes the connections of the client shared by the running event loop, to call before the loop ends.
+    """
+    openai_client = _shared_async_openai_clients.pop(asyncio.get_running_loop(), None)
+
+    if openai_client:
+        await openai_client.close()
+
+
+class AsyncOpenAiLlMClient(AsyncLlMClient):
+
+    def __init__(
+        self,
+        openai_client: AsyncOpenAI,
+        model: str,
+        response_cache: Optional[ResponseCache] = None,
+        structured_output: bool = False,
+        memory_max_tokens: Optional[int] = None,
+        stream_usage: bool = True,
+        telemetry: Optional[LlmTelemetry] = None,
+    ):
+        super().__init__(
+            response_cache=response_cache,
+            structured_output=structured_output,
+            memory_max_tokens=memory_max_tokens,
+            telemetry=telemetry,
+        )
+        self._openai_client = openai_client
+        self._model = model
+        self._stream_usage = stream_usage
+
+    @property
+    def model_name(self) -> str:
+        return self._model
+
+    @classmethod
+    def from_env(cls, response_cache: Optional[ResponseCache] = None):
+        settings = get_settings()
+        return cls(
+            openai_client=get_shared_async_openai_client(),
+            model=settings.gpt_model,
+            response_cache=response_cache,
+            structured_output=settings.llm_structured_output,
+            memory_max_tokens=settings.llm_memory_max_tokens,
+            stream_usage=settings.llm_stream_usage,
+        )
+
+    async def _send_message_implementation_specific_logic(
+        self, message: LlmMessage, **kwargs
+    ) -> LlmMessage:
+        if self._stream_usage:
+            # The last chunk of the stream reports the token usage of the request
+            kwargs.setdefault("stream_options", {"include_usage": True})
+
+        response = await self._openai_client.chat.completions.create(
+            model=self._model,
+            messages=[*self._memory.as_messages(), message.model_dump(mode="json")],
+            stream=True,
+            **kwargs
+        )
+
+        response_parts = []
+
+        async for chunk in response:
+            if chunk.usage:
+                self._record_usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+
+            if chunk.choices and chunk.choices[0].delta.content:
+                self._record_first_token()
+                response_parts.append(chunk.choices[0].delta.content)
+
+        return LlmMessage(role="assistant", content="".join(response_parts))
@@ -0,0 +1,204 @@
+import abc
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel
+
+from src.lib.llm_client.conversation_memory import ConversationMemory
+from src.lib.llm_client.response_cache import ResponseCache
+from src.lib.llm_client.structured_output import validate_response
+from src.lib.llm_client.telemetry import CacheStatus, LlmCallRecord, LlmTelemetry, get_llm_telemetry
+from src.types.schema import LlmMessage
+from src.utils.json_repair import repair_json
+from src.utils.tokens import estimate_tokens
+
+
+@dataclass
+class JsonResponseStats:
+    attempts: int = 0
+    repaired: int = 0
+    retries: int = 0
+    failures: int = 0
+
+    @property
+    def retry_rate(self) -> float:
+        return self.retries / self.attempts if self.attempts else 0.0
+
+
+# Aggregated over all the clients of the process, every conversation has its own client
+_global_json_response_stats = JsonResponseStats()
+_global_json_response_stats_lock = threading.Lock()
+
+
+def get_json_response_stats() -> JsonResponseStats:
+    return _global_json_response_stats
+
+
+def clean_json_response(response: str) -> str:
+    # Clean the response from any non-json characters
+    return response.removeprefix('```json').removesuffix('```').removeprefix('```').strip()
+
+
+class BaseLlmClient(abc.ABC):
+    """
+    What the sync and the async clients share: the response cache, the telemetry of the calls and the
+    parsing of json responses, so both retry invalid responses the same way.
+    """
+
+    def __init__(
+        self,
+        response_cache: Optional[ResponseCache] = None,
+        structured_output: bool = False,
+        memory_max_tokens: Optional[int] = None,
+        telemetry: Optional[LlmTelemetry] = None,
+    ):
+        self._logger = logging.getLogger(__name__)
+        self._memory_max_tokens = memory_max_tokens
+        self._memory = self._create_memory()
+        self._response_cache = response_cache
+        self._last_response_cache_key: Optional[str] = None
+        self._structured_output = structured_output
+        self.json_response_stats = JsonResponseStats()
+        self._telemetry = telemetry or get_llm_telemetry()
+        self._current_call_record: Optional[LlmCallRecord] = None
+        self._call_started_at = 0.0
+        self._call_dispatched_at: Optional[float] = None
+        self._next_call_retries = 0
+        self.last_call_record: Optional[LlmCallRecord] = None
+
+    @abc.abstractmethod
+    def _create_memory(self) -> ConversationMemory:
+        pass
+
+    @property
+    def model_name(self) -> str:
+        return self.__class__.__name__
+
+    def reset_memory(self):
+        self._memory = self._create_memory()
+        self._logger.info("Memory reset successfully")
+
+    def _record_json_response_stat(self, stat: str):
+        setattr(self.json_response_stats, stat, getattr(self.json_response_stats, stat) + 1)
+
+        with _global_json_response_stats_lock:
+            setattr(_global_json_response_stats, stat, getattr(_global_json_response_stats, stat) + 1)
+
+    def _parse_json_response(
+        self, response: str, response_model: Optional[Type[BaseModel]] = None
+    ) -> Union[Dict, List, BaseModel]:
+        """
+        Parses a response as json, invalid json goes through a local repair pass first. When a response
+        model is given the response is validated and returned as an instance of it.
+        :raises json.JSONDecodeError, ValidationError: When the response is invalid even after the repair.
+        """
+        response = clean_json_response(response)
+
+        try:
+            parsed_response: Any = json.loads(response)
+        except json.JSONDecodeError:
+            parsed_response = json.loads(repair_json(response), strict=False)
+            self._record_json_response_stat("repaired")
+            self._logger.warning("Repaired an invalid json response locally")
+
+        if response_model:
+            return validate_response(response_model, parsed_response)
+
+        return parsed_response
+
+    def _discard_invalid_json_response(self, response: str, num_attempts: int) -> bool:
+        """
+        Forgets an invalid json response so it can be requested again, returns whether to retry it.
+        """
+        self._logger.error(f"Could not parse response as json: {response}")
+        # Make sure the retry does not get the same invalid response from the cache
+        if self._response_cache and self._last_response_cache_key:
+            self._response_cache.delete(self._last_response_cache_key)
+        # Remove the last two messages from memory since they are invalid
+        self._memory.discard_last(2)
+
+        if num_attempts <= 0:
+            self._record_json_response_stat("failures")
+            return False
+
+        self._logger.info(f"Retrying {num_attempts} more times")
+        self._record_json_response_stat("retries")
+        self._next_call_retries = self.last_call_record.retries + 1 if self.last_call_record else 1
+        return True
+
+    def _start_call_record(self, streamed: bool) -> LlmCallRecord:
+        call_record = LlmCallRecord(model=self.model_name, streamed=streamed, retries=self._next_call_retries)
+        self._next_call_retries = 0
+        self._current_call_record = call_record
+        self._call_started_at = time.perf_counter()
+        self._call_dispatched_at = None
+        return call_record
+
+    def _mark_request_dispatched(self):
+        # Implementations that wait for a connection or a rate limit before sending call it again
+        if self._current_call_record:
+            self._call_dispatched_at = time.perf_counter()
+            self._current_call_record.queue_seconds = self._call_dispatched_at - self._call_started_at
+
+    def _record_first_token(self):
+        call_record = self._current_call_record
+
+        if call_record and call_record.time_to_first_token_seconds is None and self._call_dispatched_at:
+            call_record.time_to_first_token_seconds = time.perf_counter() - self._call_dispatched_at
+
+    def _record_usage(self, prompt_tokens: int, completion_tokens: int):
+        if self._current_call_record:
+            self._current_call_record.prompt_tokens = prompt_tokens
+            self._current_call_record.completion_tokens = completion_tokens
+            self._current_call_record.tokens_estimated = False
+
+    def _finish_call_record(self, message: LlmMessage, response_content: str, error: Optional[str] = None):
+        call_record, self._current_call_record = self._current_call_record, None
+
+        if call_record is None:
+            return
+
+        if self._call_dispatched_at:
+            call_record.latency_seconds = time.perf_counter() - self._call_dispatched_at
+
+        if call_record.cache_status == CacheStatus.HIT:
+            call_record.prompt_tokens = call_record.completion_tokens = 0
+            call_record.tokens_estimated = False
+        elif call_record.tokens_estimated:
+            # The memory does not hold the message and the response yet
+            call_record.prompt_tokens = self._memory.total_tokens + estimate_tokens(message.content)
+            call_record.completion_tokens = estimate_tokens(response_content)
+
+        call_record.error = error
+        self.last_call_record = call_record
+        self._telemetry.record(call_record)
+
+    def _get_cached_response(self, message: LlmMessage, **kwargs) -> Optional[LlmMessage]:
+        self._last_response_cache_key = None
+
+        if not self._response_cache:
+            return None
+
+        if self._current_call_record:
+            self._current_call_record.cache_status = CacheStatus.MISS
+
+        self._last_response_cache_key = self._response_cache.make_key(
+            model=self.model_name,
+            memory=self._memory.as_messages(),
+            message=message.model_dump(mode="json"),
+            **kwargs,
+        )
+        cached_content = self._response_cache.get(self._last_response_cache_key)
+
+        if cached_content is None:
+            return None
+
+        if self._current_call_record:
+            self._current_call_record.cache_status = CacheStatus.HIT
+
+        self._logger.info(f"Using cached response for {self._last_response_cache_key}")
+        return LlmMessage(role="assistant", content=cached_content)
@@ -0,0 +1,143 @@
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from src.types.enums import MemoryPolicy
+from src.types.schema import LlmMessage
+from src.utils.tokens import estimate_tokens
+
+# The per message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@dataclass
+class MemoryEntry:
+    message: Dict[str, str]
+    tokens: int
+    pinned: bool = False
+
+
+class ConversationMemory:
+    """
+    The memory of a conversation, messages are kept pre-serialized along with their token count.
+    Pinned messages (the system prompt and the code context) always form the prefix of the conversation,
+    followed by the summary of the dropped turns, if any, and the recent turns. This keeps the prefix
+    stable between requests, so provider side prompt caching can hit.
+    When the memory goes over `max_tokens` the oldest turns are dropped, or summarized with the
+    summarizer when the policy is SUMMARIZE.
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        policy: MemoryPolicy = MemoryPolicy.SLIDING_WINDOW,
+        summarizer: Optional[Callable[[List[Dict[str, str]]], str]] = None,
+    ):
+        self._logger = logging.getLogger(__name__)
+        self._max_tokens = max_tokens
+        self._policy = policy
+        self._summarizer = summarizer
+        self._pinned: List[MemoryEntry] = []
+        self._summary: Optional[MemoryEntry] = None
+        self._turns: List[MemoryEntry] = []
+        self._messages: Optional[List[Dict[str, str]]] = None
+        self._total_tokens = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self._total_tokens
+
+    @staticmethod
+    def _make_entry(message: LlmMessage, pinned: bool) -> MemoryEntry:
+        serialized = message.model_dump(mode="json")
+        return MemoryEntry(
+            message=serialized,
+            tokens=estimate_tokens(serialized["content"]) + MESSAGE_OVERHEAD_TOKENS,
+            pinned=pinned,
+        )
+
+    def _entries(self) -> List[MemoryEntry]:
+        return [*self._pinned, *([self._summary] if self._summary else []), *self._turns]
+
+    def _changed(self):
+        self._messages = None
+        self._total_tokens = sum(entry.tokens for entry in self._entries())
+
+    def append(self, message: LlmMessage, pinned: bool = False):
+        entry = self._make_entry(message, pinned=pinned)
+        (self._pinned if pinned else self._turns).append(entry)
+        self._changed()
+        self._enforce_budget()
+
+    def extend(self, messages: Iterable[LlmMessage], pinned: bool = False):
+        for message in messages:
+            (self._pinned if pinned else self._turns).append(self._make_entry(message, pinned=pinned))
+
+        self._changed()
+        self._enforce_budget()
+
+    def discard_last(self, count: int):
+        # Used to forget an invalid response along with the message that asked for it
+        for _ in range(count):
+            if self._turns:
+                self._turns.pop()
+            elif self._pinned:
+                self._pinned.pop()
+
+        self._changed()
+
+    def _drop_oldest_turns(self, target_tokens: int) -> List[MemoryEntry]:
+        dropped: List[MemoryEntry] = []
+        excess_tokens = self._total_tokens - target_tokens
+
+        # Always keep the latest turn, it is the one the next request builds on.
+        # A user message is never kept without the answer that follows it.
+        while self._turns[:-2] and (excess_tokens > 0 or self._turns[0].message["role"] != "user"):
+            entry = self._turns.pop(0)
+            dropped.append(entry)
+            excess_tokens -= entry.tokens
+
+        return dropped
+
+    def _enforce_budget(self):
+        while self._max_tokens is not None and self._total_tokens > self._max_tokens:
+            # Drop a bit more than needed, so the budget is not enforced again on the next message
+            dropped = self._drop_oldest_turns(target_tokens=int(self._max_tokens * 0.75))
+
+            if not dropped:
+                self._logger.warning(f"Memory is over its budget of {self._max_tokens} tokens but has no turn to drop")
+                return
+
+            if self._policy == MemoryPolicy.SUMMARIZE and self._summarizer:
+                previous_summary = [self._summary.message] if self._summary else []
+                summary = self._summarizer([*previous_summary, *(entry.message for entry in dropped)])
+                self._summary = self._make_entry(
+                    LlmMessage(role="user", content=f"Summary of the earlier conversation:\n{summary}"),
+                    pinned=False,
+                )
+
+            self._logger.info(f"Dropped {len(dropped)} messages from memory to stay within {self._max_tokens} tokens")
+            self._changed()
+
+    def copy(self, summarizer: Optional[Callable[[List[Dict[str, str]]], str]] = None) -> "ConversationMemory":
+        """
+        Returns an independent memory with the same messages. The entries are never modified, so they are shared.
+        """
+        memory = ConversationMemory(max_tokens=self._max_tokens, policy=self._policy, summarizer=summarizer)
+        memory._pinned = list(self._pinned)
+        memory._summary = self._summary
+        memory._turns = list(self._turns)
+        memory._changed()
+        return memory
+
+    def as_messages(self) -> List[Dict[str, str]]:
+        if self._messages is None:
+            self._messages = [entry.message for entry in self._entries()]
+
+        return self._messages
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        return iter(self.as_messages())
+
+    def __len__(self) -> int:
+        return len(self._pinned) + len(self._turns) + (1 if self._summary else 0)
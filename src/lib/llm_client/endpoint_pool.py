@@ -0,0 +1,224 @@
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from src.lib.llm_client.rate_limiter import TokenBucket
+from src.types.schema import LlmEndpoint
+
+# The weight of the last request in the moving average of the latency of an endpoint
+LATENCY_EWMA_ALPHA = 0.3
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """
+    Returns the delay in seconds requested by the headers of a response, the precise `retry-after-ms`
+    header of OpenAI first, then the standard `Retry-After` header in seconds or as an http date.
+    """
+    if headers is None:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(eq=False)
+class PooledEndpoint:
+    endpoint: LlmEndpoint
+    client: Any
+    request_bucket: Optional[TokenBucket] = None
+    token_bucket: Optional[TokenBucket] = None
+    # The endpoint gets no request before this time of the clock of the pool
+    available_at: float = 0.0
+    consecutive_failures: int = 0
+    in_flight: int = 0
+    latency_ewma: Optional[float] = None
+    stats: Dict[str, int] = field(default_factory=lambda: {"requests": 0, "failures": 0, "rate_limited": 0})
+
+    @property
+    def name(self) -> str:
+        return f"{self.endpoint.model}@{self.endpoint.base_url}"
+
+    def wait_time(self, estimated_tokens: int, now: float) -> float:
+        waits = [self.available_at - now]
+
+        if self.request_bucket:
+            waits.append(self.request_bucket.time_until_available(1))
+        if self.token_bucket:
+            waits.append(self.token_bucket.time_until_available(estimated_tokens))
+
+        return max(0.0, *waits)
+
+    def headroom(self) -> float:
+        # The share of the request budget that is left, 1 for endpoints without a limit
+        if not self.request_bucket:
+            return 1.0
+        return self.request_bucket.available / self.request_bucket.capacity
+
+
+class EndpointPool:
+    """
+    Spreads the requests across several OpenAI compatible endpoints. Every endpoint has a token bucket for
+    its requests per minute and one for its tokens per minute, and a request goes to the healthiest
+    endpoint whose budgets allow it right away, waiting for the first one that frees up otherwise.
+    Failed endpoints cool down for the Retry-After of the provider or for a jittered exponential backoff
+    that grows with their consecutive failures, so a broken endpoint gets fewer and fewer requests
+    while the others take its load.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[LlmEndpoint],
+        client_factory: Callable[[LlmEndpoint], Any],
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        rng: Optional[random.Random] = None,
+    ):
+        if not endpoints:
+            raise ValueError("The endpoint pool needs at least one endpoint")
+
+        self._logger = logging.getLogger(__name__)
+        self._backoff_base_seconds = backoff_base_seconds
+        self._backoff_max_seconds = backoff_max_seconds
+        self._clock = clock
+        self._sleep = sleep
+        self._random = rng or random.Random()
+        self._lock = threading.Lock()
+        self.endpoints = [
+            PooledEndpoint(
+                endpoint=endpoint,
+                client=client_factory(endpoint),
+                request_bucket=TokenBucket(endpoint.requests_per_minute, clock=clock)
+                if endpoint.requests_per_minute else None,
+                token_bucket=TokenBucket(endpoint.tokens_per_minute, clock=clock)
+                if endpoint.tokens_per_minute else None,
+            )
+            for endpoint in endpoints
+        ]
+
+    @property
+    def models(self) -> List[str]:
+        return list(dict.fromkeys(pooled.endpoint.model for pooled in self.endpoints))
+
+    def acquire(self, estimated_tokens: int) -> PooledEndpoint:
+        """
+        Returns the endpoint of the next request once its budgets allow it, and charges the request to them.
+        Every acquire must be followed by a `release` or a `release_failure`.
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                wait_times = {pooled: pooled.wait_time(estimated_tokens, now) for pooled in self.endpoints}
+                ready = [pooled for pooled, wait_time in wait_times.items() if wait_time == 0]
+
+                if ready:
+                    pooled = min(
+                        ready,
+                        key=lambda p: (p.consecutive_failures, p.in_flight, -p.headroom(), p.latency_ewma or 0.0),
+                    )
+
+                    if pooled.request_bucket:
+                        pooled.request_bucket.consume(1)
+                    if pooled.token_bucket:
+                        pooled.token_bucket.consume(estimated_tokens)
+
+                    pooled.in_flight += 1
+                    pooled.stats["requests"] += 1
+                    return pooled
+
+                delay = min(wait_times.values())
+
+            self._logger.debug(f"All the endpoints are busy, waiting {delay:.2f} seconds")
+            self._sleep(delay)
+
+    def release(
+        self,
+        pooled: PooledEndpoint,
+        estimated_tokens: int,
+        used_tokens: Optional[int] = None,
+        latency_seconds: Optional[float] = None,
+    ):
+        """
+        Marks a request as successful. The token budget is settled with the actual usage when it is known.
+        """
+        with self._lock:
+            pooled.in_flight -= 1
+            pooled.consecutive_failures = 0
+
+            if pooled.token_bucket and used_tokens is not None:
+                pooled.token_bucket.adjust(used_tokens - estimated_tokens)
+
+            if latency_seconds is not None:
+                pooled.latency_ewma = latency_seconds if pooled.latency_ewma is None else (
+                    LATENCY_EWMA_ALPHA * latency_seconds + (1 - LATENCY_EWMA_ALPHA) * pooled.latency_ewma
+                )
+
+    def release_failure(self, pooled: PooledEndpoint, retry_after: Optional[float] = None, rate_limited: bool = False):
+        """
+        Marks a request as failed and cools the endpoint down, for `retry_after` seconds when the provider
+        asked for it and for a jittered exponential backoff otherwise.
+        """
+        with self._lock:
+            pooled.in_flight -= 1
+            pooled.consecutive_failures += 1
+            pooled.stats["failures"] += 1
+
+            if rate_limited:
+                pooled.stats["rate_limited"] += 1
+                if pooled.request_bucket:
+                    pooled.request_bucket.drain()
+
+            if retry_after is None:
+                backoff = min(
+                    self._backoff_max_seconds,
+                    self._backoff_base_seconds * 2 ** (pooled.consecutive_failures - 1),
+                )
+                # Half of the backoff is random so the clients of a failed endpoint do not come back together
+                retry_after = backoff / 2 + self._random.uniform(0, backoff / 2)
+
+            pooled.available_at = max(pooled.available_at, self._clock() + retry_after)
+
+        self._logger.warning(
+            f"Endpoint {pooled.name} failed {pooled.consecutive_failures} times in a row, "
+            f"cooling down for {retry_after:.2f} seconds"
+        )
+
+    def release_unused(self, pooled: PooledEndpoint):
+        # The request was not answered because of the caller (an aborted stream or an invalid request),
+        # it says nothing about the health of the endpoint
+        with self._lock:
+            pooled.in_flight -= 1
+
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                pooled.name: {
+                    **pooled.stats,
+                    "consecutive_failures": pooled.consecutive_failures,
+                    "latency_ewma_seconds": round(pooled.latency_ewma, 3) if pooled.latency_ewma else None,
+                }
+                for pooled in self.endpoints
+            }
@@ -0,0 +1,34 @@
+import importlib.util
+import logging
+from typing import Dict
+
+import httpx
+
+from src.settings import get_settings
+
+
+def is_http2_available() -> bool:
+    # HTTP/2 needs the optional h2 package (pip install httpx[http2])
+    return importlib.util.find_spec("h2") is not None
+
+
+def http_client_options() -> Dict:
+    """
+    The options of the httpx clients of the openai clients, the sync and the async ones use the same pool limits.
+    """
+    settings = get_settings()
+    http2 = settings.llm_http2 and is_http2_available()
+
+    if settings.llm_http2 and not http2:
+        logging.getLogger(__name__).warning(
+            "LLM_HTTP2 is on but the h2 package is not installed (pip install httpx[http2]), using HTTP/1.1"
+        )
+
+    return {
+        "http2": http2,
+        "limits": httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+        ),
+    }
@@ -1,41 +1,208 @@
 import abc
+import copy
+import itertools
 import json
 import logging
-from typing import Dict, List
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Type, Union
 
+from pydantic import BaseModel, ValidationError
+
+from src.lib.llm_client.base_llm_client import BaseLlmClient, JsonResponseStats
+from src.lib.llm_client.conversation_memory import ConversationMemory
+from src.lib.llm_client.response_cache import ResponseCache
+from src.lib.llm_client.stream_events import StreamEvent, StreamFailed, StreamFinished, StreamStarted, TextDelta
+from src.lib.llm_client.stream_sinks import StreamSink
+from src.lib.llm_client.structured_output import get_list_field_name, response_format_for
+from src.lib.llm_client.telemetry import LlmTelemetry
+from src.lib.streaming_json import StreamingJsonArrayParser
+from src.types.enums import MemoryPolicy
 from src.types.schema import LlmMessage
+from src.utils.exceptions import GenerationCancelledError, UnrecoverableJsonStreamError
+
 
+# Every llm call of the process gets its own stream id
+_stream_ids = itertools.count(1)
 
-class LlMClient(abc.ABC):
 
-    def __init__(self):
+class LlMClient(BaseLlmClient):
+
+    def __init__(
+        self,
+        response_cache: Optional[ResponseCache] = None,
+        structured_output: bool = False,
+        memory_max_tokens: Optional[int] = None,
+        memory_policy: MemoryPolicy = MemoryPolicy.SLIDING_WINDOW,
+        telemetry: Optional[LlmTelemetry] = None,
+        stream_sink: Optional[StreamSink] = None,
+    ):
+        # The memory is created by the base client and summarizes with this policy
+        self._memory_policy = memory_policy
+        super().__init__(
+            response_cache=response_cache,
+            structured_output=structured_output,
+            memory_max_tokens=memory_max_tokens,
+            telemetry=telemetry,
+        )
         self._logger = logging.getLogger(__name__)
-        self._memory: List[LlmMessage] = []
+        # Where the stream events of the calls go, nothing is written to the console without a sink
+        self.stream_sink = stream_sink
+        self.stream_label: Optional[str] = None
+        self._stream_id = 0
+        self._stream_label = ""
+
+    def _create_memory(self) -> ConversationMemory:
+        return ConversationMemory(
+            max_tokens=self._memory_max_tokens,
+            policy=self._memory_policy,
+            summarizer=self._summarize_messages,
+        )
+
+    def _summarize_messages(self, messages: List[Dict[str, str]]) -> str:
+        transcript = "\n\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        summary_request = LlmMessage(
+            role="user",
+            content=f"Summarize the following conversation. Keep every decision, requirement and file name.\n\n{transcript}",
+        )
+
+        # The summary is requested out of the conversation, with an empty memory. It is a call of its own, with
+        # its own stream and call record, while the call that outgrew the memory already finished.
+        memory, self._memory = self._memory, ConversationMemory()
+        stream_id, stream_label = self._stream_id, self._stream_label
+        self._start_call_record(streamed=False)
+        self._start_stream()
+        self._mark_request_dispatched()
+
+        try:
+            response = self._send_message_implementation_specific_logic(message=summary_request)
+        except Exception as e:
+            self._finish_call_record(message=summary_request, response_content="", error=type(e).__name__)
+            self._emit(StreamFailed(stream_id=self._stream_id, label=self._stream_label, error=type(e).__name__))
+            raise
+        else:
+            self._finish_call_record(message=summary_request, response_content=response.content)
+            self._emit(StreamFinished(stream_id=self._stream_id, label=self._stream_label, text=response.content))
+            return response.content
+        finally:
+            self._memory = memory
+            self._stream_id, self._stream_label = stream_id, stream_label
+
+    def _start_stream(self) -> StreamStarted:
+        self._stream_id = next(_stream_ids)
+        self._stream_label = self.stream_label or threading.current_thread().name
+        return self._emit(StreamStarted(stream_id=self._stream_id, label=self._stream_label, model=self.model_name))
+
+    def _emit(self, event: StreamEvent) -> StreamEvent:
+        if self.stream_sink:
+            self.stream_sink.handle(event)
+
+        return event
+
+    def _emit_text_delta(self, text: str) -> TextDelta:
+        # Implementations that stream internally call it for the calls of send_message
+        return self._emit(TextDelta(stream_id=self._stream_id, label=self._stream_label, text=text))
 
     def send_message_expecting_json_response(
-        self, message: str, num_attempts: int = 10, **kwargs
-    ) -> Dict:
-        response = self.send_message(message, **kwargs)
+        self,
+        message: str,
+        num_attempts: int = 10,
+        response_model: Optional[Type[BaseModel]] = None,
+        **kwargs,
+    ) -> Union[Dict, List, BaseModel]:
+        """
+        Sends a message and parses the response as json. When a response model is given the response is
+        validated and returned as an instance of it, and with structured output enabled the model json schema
+        is sent as the `response_format`. Invalid json goes through a local repair pass before any resend.
+        """
+        if response_model and self._structured_output:
+            kwargs["response_format"] = response_format_for(response_model)
 
-        # Clean the response from any non-json characters
-        response = response.removeprefix('```json').removesuffix('```').removeprefix('```').strip()
+        self._record_json_response_stat("attempts")
+        response = self.send_message(message, **kwargs)
 
         try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            self._logger.error(f"Could not parse response as json: {response}")
-            # Remove the last two messages from memory since they are invalid
-            self._memory = self._memory[:-2]
-            if num_attempts > 0:
+            return self._parse_json_response(response, response_model=response_model)
+        except (json.JSONDecodeError, ValidationError):
+            if not self._discard_invalid_json_response(response, num_attempts):
+                raise
+
+            return self.send_message_expecting_json_response(
+                message=message, num_attempts=num_attempts - 1, response_model=response_model, **kwargs
+            )
+
+    def send_message_expecting_json_array_stream(
+        self,
+        message: str,
+        num_attempts: int = 10,
+        response_model: Optional[Type[BaseModel]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        **kwargs,
+    ) -> Iterator[Any]:
+        """
+        Sends a message expecting a json array and yields every item of the array as soon as it
+        is closed in the stream. When the stream can not be a json array anymore it is aborted right
+        away and the message is retried, unless items were already yielded.
+        The response model must wrap a single list, its items are yielded unvalidated.
+        :raises GenerationCancelledError: When `cancel_event` is set, the request is aborted at the next chunk.
+        """
+        if response_model and self._structured_output:
+            kwargs["response_format"] = response_format_for(response_model)
+
+        retries = 0
+
+        while True:
+            parser = StreamingJsonArrayParser(array_key=get_list_field_name(response_model) if response_model else None)
+            self._next_call_retries = retries
+            stream = self.stream_message(message, **kwargs)
+            self._record_json_response_stat("attempts")
+            num_yielded_items = 0
+            stream_completed = False
+
+            try:
+                for text in stream:
+                    if cancel_event is not None and cancel_event.is_set():
+                        stream.close()
+                        raise GenerationCancelledError("The generation was cancelled")
+
+                    for item in parser.feed(text):
+                        num_yielded_items += 1
+                        yield item
+
+                stream_completed = True
+                parser.close()
+                return
+            except UnrecoverableJsonStreamError as e:
+                # Closing the generator aborts the request, an aborted reply is never added to memory
+                stream.close()
+                self._logger.error(f"Could not parse the streamed response as a json array: {e}")
+
+                if stream_completed:
+                    if self._response_cache and self._last_response_cache_key:
+                        self._response_cache.delete(self._last_response_cache_key)
+                    self._memory.discard_last(2)
+
+                if num_yielded_items or num_attempts <= 0:
+                    self._record_json_response_stat("failures")
+                    raise
+
                 self._logger.info(f"Retrying {num_attempts} more times")
-                return self.send_message_expecting_json_response(
-                    message=message, num_attempts=num_attempts - 1, **kwargs
-                )
-            raise
+                self._record_json_response_stat("retries")
+                retries += 1
+                num_attempts -= 1
 
-    def reset_memory(self):
-        self._memory = []
-        self._logger.info("Memory reset successfully")
+    def fork(self) -> "LlMClient":
+        """
+        Returns a client with a copy of the conversation so far, for requests that run in parallel with this
+        conversation. Forks do not use the response cache, so parallel forks of the same request get
+        different responses.
+        """
+        fork = copy.copy(self)
+        fork._memory = self._memory.copy(summarizer=fork._summarize_messages)
+        fork._response_cache = None
+        fork._current_call_record = None
+        fork.json_response_stats = JsonResponseStats()
+        fork.last_call_record = None
+        return fork
 
     def send_message(
         self,
@@ -47,19 +214,111 @@ class LlMClient(abc.ABC):
         user_message = LlmMessage(role=role, content=message)
 
         if add_to_memory_without_response:
-            self._memory.append(user_message)
+            # Context messages are pinned to the stable prefix of the conversation
+            self._memory.append(user_message, pinned=True)
             return ""
 
-        response = self._send_message_implementation_specific_logic(
-            message=user_message, **kwargs
-        )
+        self._start_call_record(streamed=False)
+        self._start_stream()
+        response = self._get_cached_response(message=user_message, **kwargs)
 
+        if response is None:
+            self._mark_request_dispatched()
+
+            try:
+                response = self._send_message_implementation_specific_logic(
+                    message=user_message, **kwargs
+                )
+            except Exception as e:
+                self._finish_call_record(message=user_message, response_content="", error=type(e).__name__)
+                self._emit(StreamFailed(stream_id=self._stream_id, label=self._stream_label, error=type(e).__name__))
+                raise
+
+            if self._response_cache and self._last_response_cache_key:
+                self._response_cache.set(self._last_response_cache_key, response.content)
+
+        self._finish_call_record(message=user_message, response_content=response.content)
+        self._emit(StreamFinished(stream_id=self._stream_id, label=self._stream_label, text=response.content))
         self._memory.extend([user_message, response])
 
         return response.content
 
+    def send_message_stream(self, message: str, role: str = "user", **kwargs) -> Iterator[StreamEvent]:
+        """
+        Sends a message and yields typed events as the response is generated: a StreamStarted, a TextDelta
+        for every part of the text, then a StreamFinished with the whole response, or a StreamFailed.
+        Every event is passed to the stream sink of the client too.
+        The message and the response are added to memory only once the response is complete.
+        """
+        user_message = LlmMessage(role=role, content=message)
+        self._start_call_record(streamed=True)
+        started = self._start_stream()
+        # The ids of this call, another call may start before the stream is consumed
+        stream_id, label = self._stream_id, self._stream_label
+        response_parts = []
+
+        try:
+            yield started
+            response = self._get_cached_response(message=user_message, **kwargs)
+
+            if response is not None:
+                self._finish_call_record(message=user_message, response_content=response.content)
+                yield self._emit(TextDelta(stream_id=stream_id, label=label, text=response.content))
+            else:
+                # The cache key of this request, send_message may run before the stream is consumed
+                cache_key = self._last_response_cache_key
+                self._mark_request_dispatched()
+
+                chunks = self._stream_message_implementation_specific_logic(message=user_message, **kwargs)
+
+                try:
+                    for text in chunks:
+                        self._record_first_token()
+                        response_parts.append(text)
+                        yield self._emit(TextDelta(stream_id=stream_id, label=label, text=text))
+                finally:
+                    # Aborts the request when the stream is aborted, instead of when the generator is collected
+                    chunks.close()
+
+                response = LlmMessage(role="assistant", content="".join(response_parts))
+                self._finish_call_record(message=user_message, response_content=response.content)
+
+                if self._response_cache and cache_key:
+                    self._response_cache.set(cache_key, response.content)
+        except GeneratorExit:
+            self._finish_call_record(user_message, "".join(response_parts), error="aborted")
+            self._emit(StreamFailed(stream_id=stream_id, label=label, error="aborted"))
+            raise
+        except Exception as e:
+            self._finish_call_record(user_message, "".join(response_parts), error=type(e).__name__)
+            self._emit(StreamFailed(stream_id=stream_id, label=label, error=type(e).__name__))
+            raise
+
+        self._memory.extend([user_message, response])
+        yield self._emit(StreamFinished(stream_id=stream_id, label=label, text=response.content))
+
+    def stream_message(self, message: str, role: str = "user", **kwargs) -> Iterator[str]:
+        """
+        Sends a message and yields the response text as it is generated, see send_message_stream.
+        """
+        events = self.send_message_stream(message, role=role, **kwargs)
+
+        try:
+            for event in events:
+                if isinstance(event, TextDelta):
+                    yield event.text
+        finally:
+            # Aborts the request right away when the consumer stops reading
+            events.close()
+
     @abc.abstractmethod
     def _send_message_implementation_specific_logic(
         self, message: LlmMessage, **kwargs
     ) -> LlmMessage:
         pass
+
+    def _stream_message_implementation_specific_logic(
+        self, message: LlmMessage, **kwargs
+    ) -> Iterator[str]:
+        # Clients that can not stream yield the whole response at once
+        yield self._send_message_implementation_specific_logic(message=message, **kwargs).content
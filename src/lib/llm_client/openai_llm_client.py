@@ -1,48 +1,116 @@
 import sys
+from functools import lru_cache
+from typing import Iterator, Optional
 
-from openai import OpenAI
+from openai import DefaultHttpxClient, OpenAI
 
+from src.lib.llm_client.http_client_options import http_client_options
 from src.lib.llm_client.llm_client import LlMClient
+from src.lib.llm_client.response_cache import ResponseCache
+from src.lib.llm_client.stream_sinks import StreamSink
+from src.lib.llm_client.telemetry import LlmTelemetry
 from src.settings import get_settings
+from src.types.enums import MemoryPolicy
 from src.types.schema import LlmMessage
 
 
+@lru_cache()
+def get_shared_openai_client() -> OpenAI:
+    # A single OpenAI client (and therefore a single httpx connection pool) is shared by all the
+    # conversations of the process, the client is thread safe and keeps the connections alive.
+    settings = get_settings()
+
+    return OpenAI(
+        base_url=settings.openai_base_url,
+        http_client=DefaultHttpxClient(**http_client_options()),
+    )
+
+
 class OpenAiLlMClient(LlMClient):
 
-    def __init__(self, openai_client: OpenAI, model: str):
-        super().__init__()
+    def __init__(
+        self,
+        openai_client: OpenAI,
+        model: str,
+        response_cache: Optional[ResponseCache] = None,
+        structured_output: bool = False,
+        memory_max_tokens: Optional[int] = None,
+        memory_policy: MemoryPolicy = MemoryPolicy.SLIDING_WINDOW,
+        stream_usage: bool = True,
+        telemetry: Optional[LlmTelemetry] = None,
+        stream_sink: Optional[StreamSink] = None,
+    ):
+        super().__init__(
+            response_cache=response_cache,
+            structured_output=structured_output,
+            memory_max_tokens=memory_max_tokens,
+            memory_policy=memory_policy,
+            telemetry=telemetry,
+            stream_sink=stream_sink,
+        )
         self._openai_client = openai_client
         self._model = model
+        self._stream_usage = stream_usage
+
+    @property
+    def model_name(self) -> str:
+        return self._model
 
     @classmethod
-    def from_env(cls):
+    def from_env(cls, response_cache: Optional[ResponseCache] = None):
         settings = get_settings()
-
-        client = OpenAI(
-            base_url=settings.openai_base_url,
+        return cls(
+            openai_client=get_shared_openai_client(),
+            model=settings.gpt_model,
+            response_cache=response_cache,
+            structured_output=settings.llm_structured_output,
+            memory_max_tokens=settings.llm_memory_max_tokens,
+            memory_policy=settings.llm_memory_policy,
+            stream_usage=settings.llm_stream_usage,
         )
 
-        return cls(openai_client=client, model=settings.gpt_model)
-
     def _send_message_implementation_specific_logic(
         self, message: LlmMessage, **kwargs
     ) -> LlmMessage:
+        response_parts = []
+
+        # The reply is streamed so the stream sink can show the progress of the call
+        for text in self._stream_message_implementation_specific_logic(message=message, **kwargs):
+            self._emit_text_delta(text)
+            response_parts.append(text)
+
+        return LlmMessage(role="assistant", content="".join(response_parts))
+
+    def _stream_message_implementation_specific_logic(
+        self, message: LlmMessage, **kwargs
+    ) -> Iterator[str]:
+        if self._stream_usage:
+            # The last chunk of the stream reports the token usage of the request
+            kwargs.setdefault("stream_options", {"include_usage": True})
+
         response = self._openai_client.chat.completions.create(
             model=self._model,
-            messages=[*self._memory, message.model_dump(mode="json")],
+            messages=[*self._memory.as_messages(), message.model_dump(mode="json")],
             stream=True,
             **kwargs
         )
 
-        response_text = ""
+        yield from self._iter_response_text(response)
+
+    def _iter_response_text(self, response) -> Iterator[str]:
+        try:
+            for chunk in response:
+                if chunk.usage:
+                    self._record_usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
 
-        for chunk in response:
-            updated_part = chunk.choices[0].delta.content
-            response_text += updated_part
+                updated_part = chunk.choices[0].delta.content if chunk.choices else None
 
-            # Print the updated response to the console by updating the last line and not adding a new line
-            print(updated_part, end="", flush=True)
+                if not updated_part:
+                    continue
 
-        llm_response = LlmMessage(role="assistant", content=response_text)
+                self._record_first_token()
 
-        return llm_response
+                yield updated_part
+        finally:
+            # Closes the http response when the consumer stops reading the stream early
+            response.close()
@@ -0,0 +1,175 @@
+import time
+from functools import lru_cache
+from typing import Iterator, Optional
+
+import httpx
+import openai
+from openai import DefaultHttpxClient, OpenAI
+
+from src.lib.llm_client.endpoint_pool import EndpointPool, parse_retry_after
+from src.lib.llm_client.http_client_options import http_client_options
+from src.lib.llm_client.openai_llm_client import OpenAiLlMClient
+from src.lib.llm_client.response_cache import ResponseCache
+from src.lib.llm_client.stream_sinks import StreamSink
+from src.lib.llm_client.telemetry import LlmTelemetry
+from src.settings import get_settings
+from src.types.enums import MemoryPolicy
+from src.types.schema import LlmEndpoint, LlmMessage
+from src.utils.tokens import estimate_tokens
+
+# The status codes that say nothing about the request itself, another endpoint may answer it
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+def is_retryable_error(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return True
+
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+
+    return False
+
+
+def create_endpoint_client(endpoint: LlmEndpoint) -> OpenAI:
+    # The pool retries on another endpoint, so the client itself never retries
+    return OpenAI(
+        base_url=endpoint.base_url,
+        api_key=endpoint.api_key,
+        max_retries=0,
+        http_client=DefaultHttpxClient(**http_client_options()),
+    )
+
+
+@lru_cache()
+def get_shared_endpoint_pool() -> EndpointPool:
+    # The budgets of the endpoints are shared by all the conversations of the process
+    settings = get_settings()
+
+    return EndpointPool(
+        endpoints=settings.llm_endpoints,
+        client_factory=create_endpoint_client,
+        backoff_base_seconds=settings.llm_pool_backoff_base_seconds,
+        backoff_max_seconds=settings.llm_pool_backoff_max_seconds,
+    )
+
+
+class PooledOpenAiLlMClient(OpenAiLlMClient):
+    """
+    An OpenAI client that sends every request to an endpoint of an `EndpointPool`. Requests that are rate
+    limited or fail on the side of the endpoint are retried on the next available endpoint, as long as no
+    text of the reply was yielded yet.
+    """
+
+    def __init__(
+        self,
+        endpoint_pool: EndpointPool,
+        max_attempts: int = 6,
+        response_cache: Optional[ResponseCache] = None,
+        structured_output: bool = False,
+        memory_max_tokens: Optional[int] = None,
+        memory_policy: MemoryPolicy = MemoryPolicy.SLIDING_WINDOW,
+        stream_usage: bool = True,
+        telemetry: Optional[LlmTelemetry] = None,
+        stream_sink: Optional[StreamSink] = None,
+    ):
+        super().__init__(
+            openai_client=None,
+            model="+".join(endpoint_pool.models),
+            response_cache=response_cache,
+            structured_output=structured_output,
+            memory_max_tokens=memory_max_tokens,
+            memory_policy=memory_policy,
+            stream_usage=stream_usage,
+            telemetry=telemetry,
+            stream_sink=stream_sink,
+        )
+        self._endpoint_pool = endpoint_pool
+        self._max_attempts = max_attempts
+        self._used_tokens: Optional[int] = None
+
+    @classmethod
+    def from_env(cls, response_cache: Optional[ResponseCache] = None):
+        settings = get_settings()
+        return cls(
+            endpoint_pool=get_shared_endpoint_pool(),
+            max_attempts=settings.llm_pool_max_attempts,
+            response_cache=response_cache,
+            structured_output=settings.llm_structured_output,
+            memory_max_tokens=settings.llm_memory_max_tokens,
+            memory_policy=settings.llm_memory_policy,
+            stream_usage=settings.llm_stream_usage,
+        )
+
+    def _record_usage(self, prompt_tokens: int, completion_tokens: int):
+        super()._record_usage(prompt_tokens, completion_tokens)
+        self._used_tokens = prompt_tokens + completion_tokens
+
+    def _stream_message_implementation_specific_logic(
+        self, message: LlmMessage, **kwargs
+    ) -> Iterator[str]:
+        if self._stream_usage:
+            kwargs.setdefault("stream_options", {"include_usage": True})
+
+        messages = [*self._memory.as_messages(), message.model_dump(mode="json")]
+        # The token budget is charged with the prompt and the completion limit, and settled with the usage
+        estimated_tokens = self._memory.total_tokens + estimate_tokens(message.content) + kwargs.get("max_tokens", 0)
+
+        for attempt in range(1, self._max_attempts + 1):
+            pooled = self._endpoint_pool.acquire(estimated_tokens)
+            # The time spent waiting for a budget counts as queue time
+            self._mark_request_dispatched()
+            if self._current_call_record:
+                self._current_call_record.model = pooled.endpoint.model
+
+            self._used_tokens = None
+            started_at = time.perf_counter()
+            yielded = completed = released = False
+
+            try:
+                response = pooled.client.chat.completions.create(
+                    model=pooled.endpoint.model, messages=messages, stream=True, **kwargs
+                )
+
+                for text in self._iter_response_text(response):
+                    yielded = True
+                    yield text
+
+                completed = True
+            except Exception as e:
+                released = True
+
+                if not is_retryable_error(e):
+                    self._endpoint_pool.release_unused(pooled)
+                    raise
+
+                self._endpoint_pool.release_failure(
+                    pooled,
+                    retry_after=parse_retry_after(getattr(getattr(e, "response", None), "headers", None)),
+                    rate_limited=isinstance(e, openai.RateLimitError),
+                )
+
+                # A reply that was partly yielded cannot be replaced by the reply of another endpoint
+                if yielded or attempt == self._max_attempts:
+                    raise
+
+                self._logger.warning(
+                    f"Request to {pooled.name} failed with {type(e).__name__}, "
+                    f"retrying on the pool ({attempt}/{self._max_attempts})"
+                )
+                continue
+            finally:
+                if not released:
+                    if completed or yielded:
+                        released = True
+                        self._endpoint_pool.release(
+                            pooled,
+                            estimated_tokens=estimated_tokens,
+                            used_tokens=self._used_tokens,
+                            latency_seconds=time.perf_counter() - started_at,
+                        )
+                    else:
+                        # The consumer closed the stream before the endpoint answered anything
+                        self._endpoint_pool.release_unused(pooled)
+
+            return
@@ -0,0 +1,50 @@
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """
+    A token bucket that holds up to `capacity` units and refills them continuously over `period_seconds`,
+    used to budget the requests and the tokens per minute of an endpoint. Not thread safe, the owner
+    holds a lock around it.
+    """
+
+    def __init__(self, capacity: float, period_seconds: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self._refill_per_second = capacity / period_seconds
+        self._available = float(capacity)
+        self._clock = clock
+        self._updated_at = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._available = min(self.capacity, self._available + (now - self._updated_at) * self._refill_per_second)
+        self._updated_at = now
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._available
+
+    def time_until_available(self, amount: float) -> float:
+        """
+        Returns the seconds until `amount` units can be consumed, 0 when they are available now.
+        Amounts bigger than the capacity wait for a full bucket.
+        """
+        missing = min(amount, self.capacity) - self.available
+        return max(0.0, missing / self._refill_per_second)
+
+    def consume(self, amount: float):
+        self._refill()
+        self._available -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        # Settles an estimate once the actual usage is known, negative amounts give units back.
+        # The bucket may go below zero, which delays the next requests until the debt is repaid.
+        self._refill()
+        self._available = min(self.capacity, self._available - amount)
+
+    def drain(self):
+        # Used when the provider says the limit is reached although the bucket did not expect it
+        self._refill()
+        self._available = min(self._available, 0.0)
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from src.lib.sqlite_store import open_sqlite_store
+
+RESPONSE_CACHE_SCHEMA_VERSION = 1
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResponseCache:
+    """
+    A content addressed on-disk cache of llm responses.
+    Responses are stored compressed in a single SQLite file and evicted in least recently used order
+    once the store grows over `max_bytes` or an entry was not used for `max_age_seconds`.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = 256 * 1024 * 1024, max_age_seconds: Optional[int] = None):
+        self._logger = logging.getLogger(__name__)
+        self._db_path = db_path
+        self._max_bytes = max_bytes
+        self._max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self.stats = ResponseCacheStats()
+
+        self._connection = open_sqlite_store(
+            db_path,
+            schema_version=RESPONSE_CACHE_SCHEMA_VERSION,
+            schema=[
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """,
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)",
+                # The total size of the responses, kept up to date by triggers so every process writing the file
+                # agrees on it
+                "CREATE TABLE IF NOT EXISTS responses_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)",
+                "INSERT OR IGNORE INTO responses_size (id, total) VALUES (0, 0)",
+                *(
+                    f"CREATE TRIGGER IF NOT EXISTS responses_size_{name} AFTER {event} ON responses BEGIN "
+                    f"UPDATE responses_size SET total = total {change} WHERE id = 0; END"
+                    for name, event, change in (
+                        ("insert", "INSERT", "+ NEW.size"),
+                        ("update", "UPDATE OF size", "- OLD.size + NEW.size"),
+                        ("delete", "DELETE", "- OLD.size"),
+                    )
+                ),
+            ],
+            drop_tables=["responses", "responses_size"],
+            isolation_level=None,
+        )
+
+    @staticmethod
+    def make_key(model: str, memory: List[Dict], message: Dict, **kwargs) -> str:
+        payload = json.dumps(
+            {"model": model, "memory": memory, "message": message, "kwargs": kwargs},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, last_access FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            now = time.time()
+            if row and self._max_age_seconds is not None and now - row[1] > self._max_age_seconds:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats.evictions += 1
+                row = None
+
+            if not row:
+                self.stats.misses += 1
+                return None
+
+            self._connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.stats.hits += 1
+
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def set(self, key: str, value: str):
+        compressed = zlib.compress(value.encode("utf-8"))
+
+        with self._lock:
+            # An upsert instead of INSERT OR REPLACE, whose implicit delete does not fire the delete trigger
+            self._connection.execute(
+                "INSERT INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                "last_access = excluded.last_access",
+                (key, compressed, len(compressed), time.time()),
+            )
+            self._evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def _evict(self):
+        if self._max_age_seconds is not None:
+            cursor = self._connection.execute(
+                "DELETE FROM responses WHERE last_access < ?", (time.time() - self._max_age_seconds,)
+            )
+            self.stats.evictions += cursor.rowcount
+
+        total_size = self.total_size()
+        if total_size <= self._max_bytes:
+            return
+
+        # Drop the least recently used entries until the store fits in the size budget
+        size_to_free = total_size - self._max_bytes
+        keys_to_delete = []
+        for key, size in self._connection.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if size_to_free <= 0:
+                break
+            keys_to_delete.append((key,))
+            size_to_free -= size
+
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", keys_to_delete)
+        self.stats.evictions += len(keys_to_delete)
+        self._logger.debug(f"Evicted {len(keys_to_delete)} responses from the cache")
+
+    def total_size(self) -> int:
+        return self._connection.execute("SELECT total FROM responses_size WHERE id = 0").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
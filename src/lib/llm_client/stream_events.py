@@ -0,0 +1,31 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class StreamEvent:
+    # Unique per llm call in the process
+    stream_id: int
+    # What the call is for, the name of the thread making it unless the client has a stream label
+    label: str
+
+
+@dataclass
+class StreamStarted(StreamEvent):
+    model: str
+
+
+@dataclass
+class TextDelta(StreamEvent):
+    text: str
+
+
+@dataclass
+class StreamFinished(StreamEvent):
+    # The whole response
+    text: str
+
+
+@dataclass
+class StreamFailed(StreamEvent):
+    # The name of the exception, or "aborted" when the consumer stopped reading
+    error: str
@@ -0,0 +1,195 @@
+import abc
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, TextIO
+
+from src.lib.llm_client.stream_events import StreamEvent, StreamFailed, StreamFinished, StreamStarted, TextDelta
+
+
+class StreamSink(abc.ABC):
+    """
+    Receives the stream events of the llm clients it is attached to. The clients of parallel jobs share
+    a sink, so the sinks are thread safe.
+    """
+
+    @abc.abstractmethod
+    def handle(self, event: StreamEvent):
+        pass
+
+    def close(self):
+        pass
+
+
+class BufferedCollector(StreamSink):
+    """
+    Keeps the events and the text of every stream in memory and writes nothing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.events: List[StreamEvent] = []
+        self._parts: Dict[int, List[str]] = {}
+
+    def handle(self, event: StreamEvent):
+        with self._lock:
+            self.events.append(event)
+
+            if isinstance(event, TextDelta):
+                self._parts.setdefault(event.stream_id, []).append(event.text)
+
+    def text(self, stream_id: int) -> str:
+        with self._lock:
+            return "".join(self._parts.get(stream_id, []))
+
+
+def _terminal_width(output: TextIO) -> int:
+    return shutil.get_terminal_size().columns if output.isatty() else 120
+
+
+class TtyRenderer(StreamSink):
+    """
+    Shows the stream being generated on a single line that is redrawn in place, at most once every
+    `min_interval_seconds`, with the size of the response and its last characters. A long generation
+    costs a handful of writes instead of one write per chunk.
+    """
+
+    def __init__(
+        self,
+        output: Optional[TextIO] = None,
+        min_interval_seconds: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._output = output or sys.stdout
+        self._min_interval_seconds = min_interval_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._chars = 0
+        self._tail = ""
+        self._rendered_at = float("-inf")
+        self._line_length = 0
+
+    def _render(self, label: str, status: str):
+        width = _terminal_width(self._output)
+        prefix = f"{label}: {status} {self._chars} chars | "
+        tail = self._tail.replace("\n", " ")[-max(0, width - len(prefix) - 1):]
+        line = (prefix + tail)[:width - 1]
+        # Padding erases the end of a longer previous line
+        self._output.write("\r" + line.ljust(self._line_length))
+        self._output.flush()
+        self._line_length = len(line)
+        self._rendered_at = self._clock()
+
+    def handle(self, event: StreamEvent):
+        with self._lock:
+            if isinstance(event, StreamStarted):
+                self._chars, self._tail, self._line_length = 0, "", 0
+                self._render(event.label, "generating")
+            elif isinstance(event, TextDelta):
+                self._chars += len(event.text)
+                self._tail = (self._tail + event.text)[-200:]
+                if self._clock() - self._rendered_at >= self._min_interval_seconds:
+                    self._render(event.label, "generating")
+            elif isinstance(event, StreamFinished):
+                self._chars = len(event.text)
+                self._render(event.label, "done")
+                self._output.write("\n")
+            elif isinstance(event, StreamFailed):
+                self._render(event.label, f"failed ({event.error})")
+                self._output.write("\n")
+
+
+@dataclass
+class _ProgressRow:
+    status: str
+    chars: int
+    started_at: float
+
+
+class MultiplexedProgressView(StreamSink):
+    """
+    Shows one line per label (a job or a worker thread) with the state of its current llm call, redrawn
+    in place at most once every `min_interval_seconds`. When the output is not a terminal, a line is only
+    written when a call finishes or fails.
+    """
+
+    def __init__(
+        self,
+        output: Optional[TextIO] = None,
+        min_interval_seconds: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._output = output or sys.stdout
+        self._interactive = self._output.isatty()
+        self._min_interval_seconds = min_interval_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._rows: "OrderedDict[str, _ProgressRow]" = OrderedDict()
+        self._rendered_rows = 0
+        self._rendered_at = float("-inf")
+
+    def _render(self):
+        width = _terminal_width(self._output)
+        now = self._clock()
+        lines = [
+            f"{label}: {row.status} {row.chars} chars {now - row.started_at:.1f}s"[:width - 1]
+            for label, row in self._rows.items()
+        ]
+        # Move back to the first line of the previous render, and clear every line before writing it
+        cursor_up = f"\x1b[{self._rendered_rows}F" if self._rendered_rows else ""
+        self._output.write(cursor_up + "".join(f"\x1b[2K{line}\n" for line in lines))
+        self._output.flush()
+        self._rendered_rows = len(lines)
+        self._rendered_at = now
+
+    def handle(self, event: StreamEvent):
+        with self._lock:
+            if isinstance(event, StreamStarted):
+                self._rows[event.label] = _ProgressRow(status="generating", chars=0, started_at=self._clock())
+            elif event.label not in self._rows:
+                return
+
+            row = self._rows[event.label]
+            force_render = False
+
+            if isinstance(event, TextDelta):
+                row.chars += len(event.text)
+            elif isinstance(event, StreamFinished):
+                row.status, row.chars, force_render = "done", len(event.text), True
+            elif isinstance(event, StreamFailed):
+                row.status, force_render = f"failed ({event.error})", True
+
+            if not self._interactive:
+                if force_render:
+                    self._output.write(
+                        f"{event.label}: {row.status} {row.chars} chars {self._clock() - row.started_at:.1f}s\n"
+                    )
+                return
+
+            if force_render or self._clock() - self._rendered_at >= self._min_interval_seconds:
+                self._render()
+
+    def write_line(self, text: str):
+        """
+        Writes a line above the progress lines, other output would be overwritten by the next render.
+        """
+        with self._lock:
+            if self._interactive and self._rendered_rows:
+                # Clears the progress lines, they are rendered again below the new line
+                self._output.write(f"\x1b[{self._rendered_rows}F\x1b[0J")
+                self._rendered_rows = 0
+
+            self._output.write(text + "\n")
+
+            if self._interactive and self._rows:
+                self._render()
+            else:
+                self._output.flush()
+
+    def close(self):
+        with self._lock:
+            if self._interactive and self._rows:
+                self._render()
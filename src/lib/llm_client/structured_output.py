@@ -0,0 +1,64 @@
+from functools import lru_cache
+from typing import Any, Dict, Optional, Type
+
+from pydantic import BaseModel
+
+
+def _make_strict(schema: Any) -> Any:
+    # Strict structured outputs require closed objects where every property is required
+    if isinstance(schema, dict):
+        schema = {
+            key: (
+                {name: _make_strict(value) for name, value in value.items()}
+                if key in ("properties", "$defs")
+                else _make_strict(value)
+            )
+            for key, value in schema.items()
+            if key not in ("title", "default")
+        }
+
+        if schema.get("type") == "object" and "properties" in schema:
+            schema["additionalProperties"] = False
+            schema["required"] = list(schema["properties"])
+
+        return schema
+
+    if isinstance(schema, list):
+        return [_make_strict(value) for value in schema]
+
+    return schema
+
+
+@lru_cache()
+def response_format_for(response_model: Type[BaseModel]) -> Dict:
+    """
+    Builds the `response_format` of a chat completion request that constrains the response to the
+    json schema of a pydantic model.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_model.__name__,
+            "schema": _make_strict(response_model.model_json_schema()),
+            "strict": True,
+        },
+    }
+
+
+def get_list_field_name(response_model: Type[BaseModel]) -> Optional[str]:
+    """
+    Returns the name of the field of a model that wraps a single list, e.g. "files" for CodedFilesResponse.
+    """
+    if len(response_model.model_fields) != 1:
+        return None
+
+    return next(iter(response_model.model_fields))
+
+
+def validate_response(response_model: Type[BaseModel], response: Any) -> BaseModel:
+    # Without structured output the llm answers with the bare list, as the prompts ask it to
+    list_field_name = get_list_field_name(response_model)
+    if list_field_name and isinstance(response, list):
+        response = {list_field_name: response}
+
+    return response_model.model_validate(response)
@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Histogram buckets of the latency metrics, in seconds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+METRIC_PREFIX = "ohad_llm"
+
+
+class CacheStatus:
+    HIT = "hit"
+    MISS = "miss"
+    DISABLED = "disabled"
+
+
+@dataclass
+class LlmCallRecord:
+    """
+    The telemetry of a single llm call. `queue_seconds` is the time from the call until the request
+    was dispatched (cache lookup, waiting for a connection or a rate limit), `latency_seconds`
+    is the time from the dispatch until the response was complete.
+    """
+    model: str
+    streamed: bool
+    started_at: float = field(default_factory=time.time)
+    queue_seconds: float = 0.0
+    time_to_first_token_seconds: Optional[float] = None
+    latency_seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    tokens_estimated: bool = True
+    retries: int = 0
+    cache_status: str = CacheStatus.DISABLED
+    error: Optional[str] = None
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percentile * (len(values) - 1))))]
+
+
+class LlmTelemetry:
+    """
+    Collects the call records of a session, thread safe. The records can be exported as JSONL,
+    one record per line, and as a Prometheus textfile for the node exporter textfile collector.
+    """
+
+    def __init__(self):
+        self._records: List[LlmCallRecord] = []
+        self._lock = threading.Lock()
+
+    def record(self, call_record: LlmCallRecord):
+        with self._lock:
+            self._records.append(call_record)
+
+    @property
+    def records(self) -> List[LlmCallRecord]:
+        with self._lock:
+            return list(self._records)
+
+    def reset(self):
+        with self._lock:
+            self._records = []
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Aggregates the records per model
+        """
+        records_by_model: Dict[str, List[LlmCallRecord]] = {}
+
+        for call_record in self.records:
+            records_by_model.setdefault(call_record.model, []).append(call_record)
+
+        summary = {}
+
+        for model, records in records_by_model.items():
+            latencies = [call_record.latency_seconds for call_record in records]
+            times_to_first_token = [
+                call_record.time_to_first_token_seconds
+                for call_record in records
+                if call_record.time_to_first_token_seconds is not None
+            ]
+
+            summary[model] = {
+                "calls": len(records),
+                "cache_hits": sum(call_record.cache_status == CacheStatus.HIT for call_record in records),
+                "errors": sum(call_record.error is not None for call_record in records),
+                "retries": sum(call_record.retries > 0 for call_record in records),
+                "prompt_tokens": sum(call_record.prompt_tokens for call_record in records),
+                "completion_tokens": sum(call_record.completion_tokens for call_record in records),
+                "queue_seconds": sum(call_record.queue_seconds for call_record in records),
+                "latency_seconds": sum(latencies),
+                "latency_p50_seconds": _percentile(latencies, 0.5),
+                "latency_p95_seconds": _percentile(latencies, 0.95),
+                "time_to_first_token_p50_seconds": _percentile(times_to_first_token, 0.5),
+            }
+
+        return summary
+
+    def format_summary(self) -> str:
+        lines = []
+
+        for model, model_summary in self.summary().items():
+            lines.append(
+                f"LLM calls ({model}): {model_summary['calls']} calls, {model_summary['cache_hits']} cache hits, "
+                f"{model_summary['retries']} retries, {model_summary['errors']} errors, "
+                f"{model_summary['prompt_tokens']} prompt / {model_summary['completion_tokens']} completion tokens, "
+                f"latency p50 {model_summary['latency_p50_seconds']:.2f}s p95 {model_summary['latency_p95_seconds']:.2f}s, "
+                f"TTFT p50 {model_summary['time_to_first_token_p50_seconds']:.2f}s, "
+                f"queued {model_summary['queue_seconds']:.2f}s"
+            )
+
+        return "\n".join(lines)
+
+    def export_jsonl(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        with open(path, "a") as f:
+            for call_record in self.records:
+                f.write(json.dumps(asdict(call_record)) + "\n")
+
+    def to_prometheus(self) -> str:
+        records = self.records
+        lines = []
+
+        def add_metric(name: str, metric_type: str, help_text: str, samples: List[str]):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}")
+            lines.extend(samples)
+
+        counters = {
+            "calls_total": ("LLM calls.", lambda call_record: 1),
+            "errors_total": ("LLM calls that failed.", lambda call_record: int(call_record.error is not None)),
+            "retries_total": ("LLM calls that retried a previous call.", lambda call_record: int(call_record.retries > 0)),
+            "prompt_tokens_total": ("Prompt tokens sent.", lambda call_record: call_record.prompt_tokens),
+            "completion_tokens_total": ("Completion tokens received.", lambda call_record: call_record.completion_tokens),
+        }
+
+        for name, (help_text, value_of) in counters.items():
+            values: Dict[tuple, int] = {}
+            for call_record in records:
+                labels = (call_record.model, call_record.cache_status)
+                values[labels] = values.get(labels, 0) + value_of(call_record)
+
+            add_metric(
+                name,
+                "counter",
+                help_text,
+                [
+                    f'{METRIC_PREFIX}_{name}{{model="{model}",cache="{cache_status}"}} {value}'
+                    for (model, cache_status), value in sorted(values.items())
+                ],
+            )
+
+        histograms = {
+            "queue_seconds": ("Time from the call until the request was dispatched.", "queue_seconds"),
+            "time_to_first_token_seconds": ("Time from the dispatch until the first token.", "time_to_first_token_seconds"),
+            "latency_seconds": ("Time from the dispatch until the response was complete.", "latency_seconds"),
+        }
+
+        for name, (help_text, attribute) in histograms.items():
+            values_by_model: Dict[str, List[float]] = {}
+            for call_record in records:
+                value = getattr(call_record, attribute)
+                if value is not None and call_record.cache_status != CacheStatus.HIT:
+                    values_by_model.setdefault(call_record.model, []).append(value)
+
+            samples = []
+            for model, values in sorted(values_by_model.items()):
+                for bucket in LATENCY_BUCKETS:
+                    count = sum(value <= bucket for value in values)
+                    samples.append(f'{METRIC_PREFIX}_{name}_bucket{{model="{model}",le="{bucket}"}} {count}')
+                samples.append(f'{METRIC_PREFIX}_{name}_bucket{{model="{model}",le="+Inf"}} {len(values)}')
+                samples.append(f'{METRIC_PREFIX}_{name}_sum{{model="{model}"}} {sum(values)}')
+                samples.append(f'{METRIC_PREFIX}_{name}_count{{model="{model}"}} {len(values)}')
+
+            add_metric(name, "histogram", help_text, samples)
+
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        # The textfile collector may read the file at any time, so it is replaced atomically
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus())
+
+        os.replace(tmp_path, path)
+
+
+# The telemetry of the session, shared by all the clients of the process
+_session_telemetry = LlmTelemetry()
+
+
+def get_llm_telemetry() -> LlmTelemetry:
+    return _session_telemetry
@@ -0,0 +1,219 @@
+import difflib
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+SEARCH_REPLACE_PATTERN = re.compile(
+    r"^<{5,9} SEARCH[^\n]*\n(?P<search>.*?)^={5,9}[ \t]*\n(?P<replace>.*?)^>{5,9} REPLACE[^\n]*$",
+    re.MULTILINE | re.DOTALL,
+)
+HUNK_HEADER_PATTERN = re.compile(r"^@@ -(?P<old_start>\d+)(?:,\d+)? .* @@")
+
+# The minimal similarity of a fuzzy match, between 0 and 1
+FUZZY_MATCH_THRESHOLD = 0.9
+
+
+@dataclass
+class Hunk:
+    search: str
+    replace: str
+    # The first line of the hunk in the original file, known for unified diff hunks. A hunk without
+    # search text inserts its lines after this line.
+    old_start: Optional[int] = None
+
+
+@dataclass
+class HunkFailure:
+    index: int
+    reason: str
+    search: str
+
+
+@dataclass
+class PatchResult:
+    content: str
+    applied: List[int] = field(default_factory=list)
+    failed: List[HunkFailure] = field(default_factory=list)
+
+    def describe_failures(self) -> str:
+        return "\n".join(
+            f"hunk {failure.index + 1}: {failure.reason}\n{failure.search[:200]}" for failure in self.failed
+        )
+
+
+def parse_search_replace_blocks(patch: str) -> List[Hunk]:
+    return [
+        Hunk(search=match.group("search"), replace=match.group("replace"))
+        for match in SEARCH_REPLACE_PATTERN.finditer(patch)
+    ]
+
+
+def parse_unified_diff(patch: str) -> List[Hunk]:
+    hunks: List[Hunk] = []
+    search_lines: Optional[List[str]] = None
+    replace_lines: List[str] = []
+    old_start: Optional[int] = None
+
+    def close_hunk():
+        if search_lines is not None and (search_lines or replace_lines):
+            hunks.append(Hunk(search="".join(search_lines), replace="".join(replace_lines), old_start=old_start))
+
+    for line in patch.splitlines(keepends=True):
+        header = HUNK_HEADER_PATTERN.match(line)
+        if header:
+            close_hunk()
+            search_lines, replace_lines = [], []
+            old_start = int(header.group("old_start"))
+        elif search_lines is None or line.startswith(("---", "+++")) or line.startswith("\\"):
+            # File headers, "\ No newline at end of file" and text before the first hunk
+            continue
+        elif line.startswith("-"):
+            search_lines.append(line[1:])
+        elif line.startswith("+"):
+            replace_lines.append(line[1:])
+        else:
+            context_line = line[1:] if line.startswith(" ") else line
+            search_lines.append(context_line)
+            replace_lines.append(context_line)
+
+    close_hunk()
+
+    return hunks
+
+
+def _ensure_trailing_new_line(text: str) -> str:
+    return text if not text or text.endswith("\n") else f"{text}\n"
+
+
+def _find_lines(content_lines: List[str], search_lines: List[str], start: int) -> Optional[Tuple[int, int]]:
+    """
+    Finds the search lines in the content, first ignoring whitespace differences and then fuzzily.
+    Returns the (start, end) line range of the match.
+    """
+    if not search_lines:
+        return None
+
+    stripped_search = [line.strip() for line in search_lines]
+    stripped_content = [line.strip() for line in content_lines]
+    window = len(search_lines)
+    candidates = [*range(start, len(content_lines) - window + 1), *range(0, min(start, len(content_lines) - window + 1))]
+
+    for idx in candidates:
+        if stripped_content[idx:idx + window] == stripped_search:
+            return idx, idx + window
+
+    best_ratio, best_idx = 0.0, None
+    search_text = "\n".join(stripped_search)
+
+    for idx in candidates:
+        matcher = difflib.SequenceMatcher(None, search_text, "\n".join(stripped_content[idx:idx + window]))
+        if matcher.real_quick_ratio() < FUZZY_MATCH_THRESHOLD or matcher.quick_ratio() < FUZZY_MATCH_THRESHOLD:
+            continue
+
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best_ratio, best_idx = ratio, idx
+
+    if best_idx is not None and best_ratio >= FUZZY_MATCH_THRESHOLD:
+        return best_idx, best_idx + window
+
+    return None
+
+
+def _apply_at_line(content: str, hunk: Hunk, line_delta: int) -> Optional[str]:
+    """
+    Applies a hunk without search text at the lines of its unified diff header. Returns None when the hunk
+    has no header or its lines are not in the content.
+    """
+    if hunk.old_start is None:
+        return None
+
+    content_lines = _ensure_trailing_new_line(content).splitlines(keepends=True)
+    search_lines = hunk.search.splitlines(keepends=True)
+    # A pure insertion goes after its start line, other hunks replace the lines from their start line
+    start = hunk.old_start + line_delta - (1 if search_lines else 0)
+    end = start + len(search_lines)
+
+    if start < 0 or end > len(content_lines):
+        return None
+
+    if [line.strip() for line in content_lines[start:end]] != [line.strip() for line in search_lines]:
+        return None
+
+    content_lines[start:end] = [_ensure_trailing_new_line(hunk.replace)] if hunk.replace else []
+    return "".join(content_lines)
+
+
+def apply_hunks(content: str, hunks: List[Hunk]) -> PatchResult:
+    """
+    Applies the hunks one after the other. Every hunk is anchored on its search text, exactly if possible,
+    then ignoring whitespace, then fuzzily. A hunk without search text is anchored on the line numbers of
+    its unified diff header, or on an empty file. Hunks that can not be anchored are reported and skipped.
+    """
+    result = PatchResult(content=content)
+    position = 0
+    # The lines added by the applied hunks, the line numbers of the next hunks are shifted by it
+    line_delta = 0
+
+    for idx, hunk in enumerate(hunks):
+        if not hunk.search.strip():
+            content_at_line = _apply_at_line(result.content, hunk, line_delta)
+
+            if content_at_line is not None:
+                result.content = content_at_line
+            elif not result.content.strip():
+                result.content = hunk.replace
+            else:
+                result.failed.append(HunkFailure(index=idx, reason="no search text to anchor on", search=hunk.search))
+                continue
+
+            line_delta += hunk.replace.count("\n") - hunk.search.count("\n")
+            result.applied.append(idx)
+            continue
+
+        exact_position = result.content.find(hunk.search, position)
+        if exact_position == -1:
+            exact_position = result.content.find(hunk.search)
+
+        if exact_position != -1:
+            result.content = (
+                result.content[:exact_position] + hunk.replace + result.content[exact_position + len(hunk.search):]
+            )
+            position = exact_position + len(hunk.replace)
+            line_delta += hunk.replace.count("\n") - hunk.search.count("\n")
+            result.applied.append(idx)
+            continue
+
+        content_lines = result.content.splitlines(keepends=True)
+        start_line = result.content.count("\n", 0, position)
+        match = _find_lines(content_lines, hunk.search.splitlines(keepends=True), start_line)
+
+        if match is None:
+            result.failed.append(HunkFailure(index=idx, reason="search text not found", search=hunk.search))
+            continue
+
+        start, end = match
+        replace = _ensure_trailing_new_line(hunk.replace) if end < len(content_lines) else hunk.replace
+        content_lines[start:end] = [replace]
+        result.content = "".join(content_lines)
+        position = len("".join(content_lines[:start + 1]))
+        line_delta += replace.count("\n") - (end - start)
+        result.applied.append(idx)
+
+    return result
+
+
+def parse_patch(patch: str) -> List[Hunk]:
+    # Search/replace blocks and unified diffs are told apart by their markers
+    hunks = parse_search_replace_blocks(patch)
+    return hunks if hunks else parse_unified_diff(patch)
+
+
+def apply_patch(content: str, patch: str) -> PatchResult:
+    hunks = parse_patch(patch)
+    result = apply_hunks(content, hunks)
+
+    if not hunks:
+        result.failed.append(HunkFailure(index=0, reason="no hunks found in the patch", search=patch))
+
+    return result
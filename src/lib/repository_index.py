@@ -0,0 +1,195 @@
+import hashlib
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import pathspec
+
+from src.lib.repository_walker import SAMPLE_SIZE, RepositoryWalker, classify_file
+from src.lib.sqlite_store import open_sqlite_store
+from src.types.enums import FileKind
+
+INDEX_SCHEMA_VERSION = 2
+
+
+@dataclass
+class IndexRefreshStats:
+    scanned: int = 0
+    updated: int = 0
+    removed: int = 0
+    # The paths relative to the directory of the files updated or removed
+    changed_paths: List[str] = field(default_factory=list)
+
+
+def hash_file(file_path: str) -> Tuple[str, bytes]:
+    """
+    Returns the sha256 of a file along with its first bytes, so the file can be classified
+    without being read twice.
+    """
+    sha256 = hashlib.sha256()
+    sample = b""
+
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            if not sample:
+                sample = block[:SAMPLE_SIZE]
+            sha256.update(block)
+
+    return sha256.hexdigest(), sample
+
+
+class RepositoryIndex:
+    """
+    A persistent index of the files of a repository, stored in SQLite.
+    Every file is stored with its size, mtime, content hash and kind, a refresh only re-hashes the
+    files whose size or mtime changed. File queries (by name or glob) are answered from the index.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        db_path: str,
+        excluded_folders: Iterable[str] = (),
+        max_file_bytes: int = 1024 * 1024,
+    ):
+        self._logger = logging.getLogger(__name__)
+        self._directory = os.path.abspath(directory)
+        self._walker = RepositoryWalker(directory=self._directory, excluded_folders=excluded_folders)
+        self._max_file_bytes = max_file_bytes
+        self._lock = threading.Lock()
+
+        self._connection = open_sqlite_store(
+            db_path,
+            schema_version=INDEX_SCHEMA_VERSION,
+            schema=[
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    kind TEXT NOT NULL
+                )
+                """,
+                "CREATE INDEX IF NOT EXISTS files_name ON files (name)",
+            ],
+            drop_tables=["files", "meta"],
+        )
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def refresh(self) -> IndexRefreshStats:
+        stats = IndexRefreshStats()
+
+        with self._lock, self._connection:
+            indexed = {
+                path: (size, mtime_ns)
+                for path, size, mtime_ns in self._connection.execute("SELECT path, size, mtime_ns FROM files")
+            }
+            seen = set()
+            updated_rows = []
+
+            for walked_file in self._walker.walk():
+                stats.scanned += 1
+                seen.add(walked_file.relative_path)
+
+                if indexed.get(walked_file.relative_path) == (walked_file.size, walked_file.mtime_ns):
+                    continue
+
+                try:
+                    sha256, sample = hash_file(walked_file.path)
+                except OSError as e:
+                    self._logger.warning(f"Failed to hash {walked_file.relative_path}: {e}")
+                    continue
+
+                kind = classify_file(
+                    name=walked_file.name,
+                    size=walked_file.size,
+                    sample=sample,
+                    max_file_bytes=self._max_file_bytes,
+                )
+                updated_rows.append(
+                    (
+                        walked_file.relative_path,
+                        walked_file.name,
+                        walked_file.size,
+                        walked_file.mtime_ns,
+                        sha256,
+                        kind.value,
+                    )
+                )
+
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO files (path, name, size, mtime_ns, sha256, kind) VALUES (?, ?, ?, ?, ?, ?)",
+                updated_rows,
+            )
+            stats.updated = len(updated_rows)
+
+            removed = [(path,) for path in indexed if path not in seen]
+            self._connection.executemany("DELETE FROM files WHERE path = ?", removed)
+            stats.removed = len(removed)
+            stats.changed_paths = [row[0] for row in updated_rows] + [row[0] for row in removed]
+
+        self._logger.info(
+            f"Indexed {stats.scanned} files under {self._directory}: "
+            f"{stats.updated} updated, {stats.removed} removed"
+        )
+
+        return stats
+
+    def query(
+        self,
+        include_files: Optional[List[str]] = None,
+        include_glob: Optional[Union[str, List[str]]] = None,
+        kinds: Iterable[FileKind] = (FileKind.TEXT,),
+    ) -> List[str]:
+        """
+        Returns the absolute paths of the indexed files.
+        :param include_files: Only return files with one of these names.
+        :param include_glob: Only return files whose path relative to the directory matches this glob, or any of these globs.
+        :param kinds: Only return files of these kinds, binary, minified and oversized files are skipped by default.
+        """
+        kinds = [kind.value for kind in kinds]
+        sql = f"SELECT path FROM files WHERE kind IN ({', '.join('?' for _ in kinds)})"
+        params: List[str] = list(kinds)
+
+        names = [name.strip() for name in include_files or [] if name.strip()]
+        if names:
+            sql += f" AND name IN ({', '.join('?' for _ in names)})"
+            params.extend(names)
+
+        with self._lock:
+            paths = [row[0] for row in self._connection.execute(f"{sql} ORDER BY path", params)]
+
+        if include_glob:
+            globs = [include_glob] if isinstance(include_glob, str) else include_glob
+            glob_spec = pathspec.PathSpec.from_lines("gitwildmatch", globs)
+            paths = [path for path in paths if glob_spec.match_file(path)]
+
+        return [os.path.join(self._directory, path) for path in paths]
+
+    def file_hashes(self, kinds: Iterable[FileKind] = (FileKind.TEXT,)) -> Dict[str, str]:
+        """
+        Returns the sha256 of every indexed file of these kinds, by path relative to the directory.
+        """
+        kinds = [kind.value for kind in kinds]
+
+        with self._lock:
+            return dict(
+                self._connection.execute(
+                    f"SELECT path, sha256 FROM files WHERE kind IN ({', '.join('?' for _ in kinds)})", kinds
+                )
+            )
+
+    def get_file_hash(self, file_path: str) -> Optional[str]:
+        relative_path = os.path.relpath(os.path.abspath(file_path), self._directory)
+
+        with self._lock:
+            row = self._connection.execute("SELECT sha256 FROM files WHERE path = ?", (relative_path,)).fetchone()
+
+        return row[0] if row else None
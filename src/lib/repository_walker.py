@@ -0,0 +1,131 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import pathspec
+from pathspec import PathSpec
+
+from src.types.enums import FileKind
+
+SAMPLE_SIZE = 8 * 1024
+
+LOCKFILE_NAMES = {
+    "package-lock.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    "poetry.lock",
+    "Pipfile.lock",
+    "Cargo.lock",
+    "composer.lock",
+    "Gemfile.lock",
+    "go.sum",
+    "uv.lock",
+}
+
+
+@dataclass
+class WalkedFile:
+    path: str
+    relative_path: str
+    name: str
+    size: int
+    mtime_ns: int
+
+
+def classify_file(name: str, size: int, sample: bytes, max_file_bytes: int) -> FileKind:
+    """
+    Classifies a file from its name, size and first bytes, without reading the whole file.
+    """
+    if name in LOCKFILE_NAMES:
+        return FileKind.LOCKFILE
+
+    if b"\0" in sample:
+        return FileKind.BINARY
+
+    try:
+        text = sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # The sample may end in the middle of a multi byte character
+        if e.start < len(sample) - 3:
+            return FileKind.BINARY
+        text = sample[:e.start].decode("utf-8")
+
+    if size > max_file_bytes:
+        return FileKind.OVERSIZED
+
+    lines = text.splitlines() or [""]
+    if len(text) >= 1024 and (max(len(line) for line in lines) > 5000 or len(text) / len(lines) > 500):
+        return FileKind.MINIFIED
+
+    return FileKind.TEXT
+
+
+class RepositoryWalker:
+    """
+    Walks a repository and yields its files. Excluded and gitignored directories are pruned before
+    descending into them, nested .gitignore files apply to their own sub tree like they do in git.
+    """
+
+    def __init__(self, directory: str, excluded_folders: Iterable[str] = ()):
+        self._logger = logging.getLogger(__name__)
+        self._directory = os.path.abspath(directory)
+        self._excluded_folders = set(excluded_folders)
+
+    def _read_gitignore(self, directory: str) -> Optional[PathSpec]:
+        gitignore_path = os.path.join(directory, ".gitignore")
+
+        try:
+            with open(gitignore_path, "r") as file:
+                return pathspec.PathSpec.from_lines("gitwildmatch", file.read().splitlines())
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            self._logger.warning(f"Failed to read {gitignore_path}: {e}")
+            return None
+
+    @staticmethod
+    def _is_ignored(gitignore_specs: List[Tuple[str, PathSpec]], path: str, is_dir: bool) -> bool:
+        ignored = False
+
+        # The deepest .gitignore that has an opinion about the path wins
+        for base_directory, spec in gitignore_specs:
+            relative_path = os.path.relpath(path, base_directory)
+            result = spec.check_file(f"{relative_path}/" if is_dir else relative_path)
+
+            if result.include is not None:
+                ignored = result.include
+
+        return ignored
+
+    def walk(self) -> Iterator[WalkedFile]:
+        directories: List[Tuple[str, List[Tuple[str, PathSpec]]]] = [(self._directory, [])]
+
+        while directories:
+            directory, parent_specs = directories.pop()
+            gitignore_spec = self._read_gitignore(directory)
+            gitignore_specs = [*parent_specs, (directory, gitignore_spec)] if gitignore_spec else parent_specs
+
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name in self._excluded_folders:
+                                continue
+
+                            if not self._is_ignored(gitignore_specs, entry.path, is_dir=True):
+                                directories.append((entry.path, gitignore_specs))
+                        elif entry.is_file():
+                            if self._is_ignored(gitignore_specs, entry.path, is_dir=False):
+                                continue
+
+                            stat = entry.stat()
+                            yield WalkedFile(
+                                path=entry.path,
+                                relative_path=os.path.relpath(entry.path, self._directory),
+                                name=entry.name,
+                                size=stat.st_size,
+                                mtime_ns=stat.st_mtime_ns,
+                            )
+            except OSError as e:
+                self._logger.warning(f"Failed to list {directory}: {e}")
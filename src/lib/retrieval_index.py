@@ -0,0 +1,255 @@
+import importlib.util
+import logging
+import math
+import os
+import threading
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from src.lib.code_chunker import CodeChunk, chunk_lines, chunk_source
+from src.lib.repository_index import RepositoryIndex
+from src.lib.sqlite_store import open_sqlite_store
+from src.utils.tokens import split_identifiers
+
+# The chunks are stored tokenized, a change of the tokenization changes the schema too
+RETRIEVAL_INDEX_SCHEMA_VERSION = 1
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Terms found in more than this share of the chunks barely change the ranking and are expensive to score
+MAX_TERM_CHUNK_RATIO = 0.5
+
+VECTOR_DIMENSIONS = 1024
+NGRAM_SIZE = 3
+# The BM25 candidates that are re-ranked with the n-gram vectors, and the weight of the vector similarity
+VECTOR_CANDIDATES = 200
+VECTOR_WEIGHT = 0.3
+
+
+def is_numpy_available() -> bool:
+    # The vector re-ranking needs the optional numpy package
+    return importlib.util.find_spec("numpy") is not None
+
+
+@dataclass
+class RetrievedChunk:
+    # The path is absolute, the lines are 1-based and inclusive
+    path: str
+    start_line: int
+    end_line: int
+    score: float
+
+
+def _hashed_ngram_vector(terms: List[str], numpy_module):
+    vector = numpy_module.zeros(VECTOR_DIMENSIONS, dtype=numpy_module.float32)
+
+    for term in terms:
+        padded_term = f"#{term}#"
+        for idx in range(max(1, len(padded_term) - NGRAM_SIZE + 1)):
+            # crc32 is stable across processes, unlike hash()
+            vector[zlib.crc32(padded_term[idx:idx + NGRAM_SIZE].encode("utf-8")) % VECTOR_DIMENSIONS] += 1.0
+
+    norm = numpy_module.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class RetrievalIndex:
+    """
+    A persistent BM25 index of the chunks of the files of a repository, stored in SQLite next to the
+    repository index. Python files are chunked by functions and classes, other files by lines, and the
+    terms are the identifiers and the words of the comments. A refresh only re-indexes the files whose
+    content hash changed. When numpy is installed the best BM25 candidates are re-ranked by the cosine
+    similarity of hashed character n-gram vectors, which also matches parts of identifiers.
+    """
+
+    def __init__(self, repository_index: RepositoryIndex, db_path: str, chunk_tokens: int = 300):
+        self._logger = logging.getLogger(__name__)
+        self._repository_index = repository_index
+        self._chunk_tokens = chunk_tokens
+        self._lock = threading.Lock()
+        self._chunk_lengths: Optional[Dict[int, int]] = None
+
+        self._connection = open_sqlite_store(
+            db_path,
+            schema_version=RETRIEVAL_INDEX_SCHEMA_VERSION,
+            schema=[
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    path TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL
+                )
+                """,
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    start_line INTEGER NOT NULL,
+                    end_line INTEGER NOT NULL,
+                    length INTEGER NOT NULL
+                )
+                """,
+                "CREATE INDEX IF NOT EXISTS chunks_path ON chunks (path)",
+                """
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    chunk_id INTEGER NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, chunk_id)
+                ) WITHOUT ROWID
+                """,
+                "CREATE INDEX IF NOT EXISTS postings_chunk_id ON postings (chunk_id)",
+            ],
+            drop_tables=["documents", "chunks", "postings"],
+        )
+
+    def _chunk_file(self, relative_path: str, content: str) -> List[CodeChunk]:
+        if relative_path.endswith(".py"):
+            return chunk_source(content, max_tokens=self._chunk_tokens)
+
+        return chunk_lines(content, max_tokens=self._chunk_tokens)
+
+    def _delete_documents(self, relative_paths: List[str]):
+        for relative_path in relative_paths:
+            chunk_ids = [
+                (chunk_id,)
+                for (chunk_id,) in self._connection.execute("SELECT id FROM chunks WHERE path = ?", (relative_path,))
+            ]
+            self._connection.executemany("DELETE FROM postings WHERE chunk_id = ?", chunk_ids)
+            self._connection.execute("DELETE FROM chunks WHERE path = ?", (relative_path,))
+            self._connection.execute("DELETE FROM documents WHERE path = ?", (relative_path,))
+
+    def _index_document(self, relative_path: str, sha256: str):
+        try:
+            with open(os.path.join(self._repository_index.directory, relative_path), "r", errors="replace") as f:
+                content = f.read()
+        except OSError as e:
+            self._logger.warning(f"Failed to read {relative_path}: {e}")
+            return
+
+        for chunk in self._chunk_file(relative_path, content):
+            # The path is part of the chunk text, so file names match too
+            terms = Counter(split_identifiers(f"{relative_path}\n{chunk.content}"))
+            cursor = self._connection.execute(
+                "INSERT INTO chunks (path, start_line, end_line, length) VALUES (?, ?, ?, ?)",
+                (relative_path, chunk.start_line, chunk.end_line, sum(terms.values())),
+            )
+            self._connection.executemany(
+                "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                [(term, cursor.lastrowid, tf) for term, tf in terms.items()],
+            )
+
+        self._connection.execute("INSERT INTO documents (path, sha256) VALUES (?, ?)", (relative_path, sha256))
+
+    def refresh(self) -> int:
+        """
+        Brings the index up to date with the repository, returns the number of re-indexed files.
+        """
+        self._repository_index.refresh()
+        file_hashes = self._repository_index.file_hashes()
+
+        with self._lock, self._connection:
+            indexed = dict(self._connection.execute("SELECT path, sha256 FROM documents"))
+            changed = [path for path, sha256 in file_hashes.items() if indexed.get(path) != sha256]
+            removed = [path for path in indexed if path not in file_hashes]
+
+            if changed or removed or self._chunk_lengths is None:
+                self._delete_documents(changed + removed)
+
+                for relative_path in changed:
+                    self._index_document(relative_path, file_hashes[relative_path])
+
+                self._chunk_lengths = dict(self._connection.execute("SELECT id, length FROM chunks"))
+
+        if changed or removed:
+            self._logger.info(f"Re-indexed {len(changed)} files and removed {len(removed)} files for retrieval")
+
+        return len(changed)
+
+    def _bm25_scores(self, query_terms: List[str]) -> Dict[int, float]:
+        num_chunks = len(self._chunk_lengths)
+        average_length = sum(self._chunk_lengths.values()) / num_chunks
+        scores: Dict[int, float] = {}
+
+        document_frequencies = {
+            term: self._connection.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+            for term in set(query_terms)
+        }
+        document_frequencies = {term: frequency for term, frequency in document_frequencies.items() if frequency}
+        rare_terms = {
+            term: frequency
+            for term, frequency in document_frequencies.items()
+            if frequency <= num_chunks * MAX_TERM_CHUNK_RATIO
+        }
+
+        # Common terms are only scored when the query has nothing else
+        for term, document_frequency in (rare_terms or document_frequencies).items():
+            idf = math.log(1 + (num_chunks - document_frequency + 0.5) / (document_frequency + 0.5))
+
+            for chunk_id, tf in self._connection.execute("SELECT chunk_id, tf FROM postings WHERE term = ?", (term,)):
+                length_norm = 1 - BM25_B + BM25_B * self._chunk_lengths[chunk_id] / average_length
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+
+        return scores
+
+    def _read_chunk(self, relative_path: str, start_line: int, end_line: int) -> str:
+        with open(os.path.join(self._repository_index.directory, relative_path), "r", errors="replace") as f:
+            return "".join(line for idx, line in enumerate(f, start=1) if start_line <= idx <= end_line)
+
+    def _rerank_with_vectors(self, query_terms: List[str], candidates: List[tuple]) -> List[tuple]:
+        import numpy
+
+        query_vector = _hashed_ngram_vector(query_terms, numpy)
+        chunk_vectors = []
+
+        for _, relative_path, start_line, end_line, _ in candidates:
+            try:
+                chunk_terms = split_identifiers(self._read_chunk(relative_path, start_line, end_line))
+            except OSError:
+                chunk_terms = []
+            chunk_vectors.append(_hashed_ngram_vector(chunk_terms, numpy))
+
+        # All the candidates are scored at once
+        similarities = numpy.stack(chunk_vectors) @ query_vector
+        max_score = max(candidate[4] for candidate in candidates) or 1.0
+
+        return [
+            (*candidate[:4], (1 - VECTOR_WEIGHT) * candidate[4] / max_score + VECTOR_WEIGHT * float(similarity))
+            for candidate, similarity in zip(candidates, similarities)
+        ]
+
+    def search(self, query: str, top_k: int = 40, use_vectors: bool = True) -> List[RetrievedChunk]:
+        """
+        Returns the `top_k` chunks most relevant to the query, best first.
+        The index must be refreshed first.
+        """
+        query_terms = split_identifiers(query)
+
+        with self._lock:
+            if not query_terms or not self._chunk_lengths:
+                return []
+
+            scores = self._bm25_scores(query_terms)
+            num_candidates = max(top_k, VECTOR_CANDIDATES) if use_vectors and is_numpy_available() else top_k
+            best_chunk_ids = sorted(scores, key=scores.get, reverse=True)[:num_candidates]
+
+            candidates = []
+            for chunk_id in best_chunk_ids:
+                path, start_line, end_line = self._connection.execute(
+                    "SELECT path, start_line, end_line FROM chunks WHERE id = ?", (chunk_id,)
+                ).fetchone()
+                candidates.append((chunk_id, path, start_line, end_line, scores[chunk_id]))
+
+        if candidates and num_candidates > top_k:
+            candidates = sorted(self._rerank_with_vectors(query_terms, candidates), key=lambda c: c[4], reverse=True)
+
+        return [
+            RetrievedChunk(
+                path=os.path.join(self._repository_index.directory, path),
+                start_line=start_line,
+                end_line=end_line,
+                score=score,
+            )
+            for _, path, start_line, end_line, score in candidates[:top_k]
+        ]
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+from src.lib.sqlite_store import open_sqlite_store
+
+REVIEW_MANIFEST_SCHEMA_VERSION = 1
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def make_review_key(
+    content_sha256: str,
+    dependency_sha256s: Dict[str, str],
+    model: str,
+    prompt_version: int,
+    options: Optional[Dict] = None,
+) -> str:
+    """
+    The key of the review of a file, it changes when the file, one of its dependencies, the model,
+    the review prompt or one of the `options` that change what is sent changes.
+    """
+    payload = json.dumps(
+        {
+            "content": content_sha256,
+            "dependencies": sorted(dependency_sha256s.items()),
+            "model": model,
+            "prompt_version": prompt_version,
+            "options": options or {},
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ReviewManifest:
+    """
+    Remembers the issues found in every reviewed file together with the key of the review, see
+    `make_review_key`. A file only needs a new review when its key changed. Every review is committed as
+    soon as it is recorded, so an interrupted run resumes with the files it did not get to.
+    """
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+
+        self._connection = open_sqlite_store(
+            db_path,
+            schema_version=REVIEW_MANIFEST_SCHEMA_VERSION,
+            schema=[
+                """
+                CREATE TABLE IF NOT EXISTS reviews (
+                    file_path TEXT PRIMARY KEY,
+                    review_key TEXT NOT NULL,
+                    issues TEXT NOT NULL,
+                    reviewed_at REAL NOT NULL
+                )
+                """
+            ],
+            drop_tables=["reviews"],
+            isolation_level=None,
+        )
+
+    def get(self, file_path: str, review_key: str) -> Optional[List[Dict]]:
+        """
+        Returns the issues of the last review of the file, or None when the file was never reviewed
+        with this key.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT issues FROM reviews WHERE file_path = ? AND review_key = ?", (file_path, review_key)
+            ).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def record(self, file_path: str, review_key: str, issues: List[Dict]):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO reviews (file_path, review_key, issues, reviewed_at) VALUES (?, ?, ?, ?)",
+                (file_path, review_key, json.dumps(issues), time.time()),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,95 @@
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from src.utils.tokens import CHARS_PER_TOKEN
+
+
+@dataclass
+class DependencyReuseReport:
+    files: int = 0
+    dependency_reads: int = 0
+    # What the naive loop reads from disk, and what was actually read with the content cache
+    naive_bytes_read: int = 0
+    bytes_read: int = 0
+    # The tokens of the dependencies as sent, skeletons included, and the part of them that repeats the prompt prefix of the previous review
+    dependency_tokens: int = 0
+    shared_prefix_tokens: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.naive_bytes_read - self.bytes_read
+
+    def summary(self) -> str:
+        return (
+            f"{self.files} files with {self.dependency_reads} dependency reads: "
+            f"{self.bytes_read}/{self.naive_bytes_read} bytes read from disk ({self.bytes_saved} saved), "
+            f"{self.shared_prefix_tokens}/{self.dependency_tokens} dependency tokens in a prefix shared with "
+            f"the previous review"
+        )
+
+
+@dataclass
+class ReviewSchedule:
+    # The order to review the files in, and the dependencies of every file in the order they are sent
+    order: List[str]
+    dependencies: Dict[str, List[str]] = field(default_factory=dict)
+
+    def dependency_tokens(self, sent_tokens: Optional[Mapping[str, int]] = None) -> int:
+        """
+        The estimated tokens of the dependencies sent. `sent_tokens` are the tokens of the text sent for
+        every dependency, e.g. its skeleton, the size of the file is used when not given.
+        """
+        return sum(
+            _dependency_tokens(dependency, sent_tokens) for path in self.order for dependency in self.dependencies[path]
+        )
+
+    def shared_prefix_tokens(self, sent_tokens: Optional[Mapping[str, int]] = None) -> int:
+        """
+        The estimated tokens of the dependencies every review shares, as a prompt prefix, with the review
+        before it. Providers with prompt caching only bill these tokens once.
+        """
+        shared_tokens = 0
+
+        for previous_path, path in zip(self.order, self.order[1:]):
+            for previous_dependency, dependency in zip(self.dependencies[previous_path], self.dependencies[path]):
+                if previous_dependency != dependency:
+                    break
+                shared_tokens += _dependency_tokens(dependency, sent_tokens)
+
+        return shared_tokens
+
+
+def _dependency_tokens(file_path: str, sent_tokens: Optional[Mapping[str, int]]) -> int:
+    if sent_tokens is not None:
+        return sent_tokens.get(file_path, 0)
+
+    try:
+        return os.path.getsize(file_path) // CHARS_PER_TOKEN
+    except OSError:
+        return 0
+
+
+def schedule_reviews(file_to_dependencies: Mapping[str, Iterable[str]]) -> ReviewSchedule:
+    """
+    Orders the dependencies of every file by how many files share them, hub modules first, so the
+    reviews share the longest possible prompt prefix. The files are then sorted by their ordered
+    dependencies, which puts files with the same dependencies, or the same leading ones, next to each other.
+    """
+    file_to_dependencies = {path: list(dict.fromkeys(dependencies)) for path, dependencies in file_to_dependencies.items()}
+    frequency = Counter(dependency for dependencies in file_to_dependencies.values() for dependency in dependencies)
+
+    def dependency_key(dependency: str):
+        return -frequency[dependency], dependency
+
+    ordered_dependencies = {
+        path: sorted(dependencies, key=dependency_key) for path, dependencies in file_to_dependencies.items()
+    }
+    # Sorting is stable, files without shared dependencies keep their input order
+    order = sorted(
+        file_to_dependencies,
+        key=lambda path: [dependency_key(dependency) for dependency in ordered_dependencies[path]],
+    )
+
+    return ReviewSchedule(order=order, dependencies=ordered_dependencies)
@@ -0,0 +1,147 @@
+import ast
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+# Values of constants whose source is longer than this are replaced with `...`
+MAX_CONSTANT_CHARS = 200
+SKELETON_HEADER = "# Signatures only, the function bodies are left out\n"
+
+
+class _BodyStripper(ast.NodeTransformer):
+    def _strip_body(self, node):
+        body = []
+
+        if ast.get_docstring(node, clean=False) is not None:
+            body.append(node.body[0])
+
+        body.append(ast.Expr(ast.Constant(...)))
+        node.body = body
+        return node
+
+    visit_FunctionDef = _strip_body
+    visit_AsyncFunctionDef = _strip_body
+
+    def _shorten_value(self, node):
+        if node.value is not None and len(ast.unparse(node.value)) > MAX_CONSTANT_CHARS:
+            node.value = ast.Constant(...)
+        return node
+
+    visit_Assign = _shorten_value
+    visit_AnnAssign = _shorten_value
+
+    def visit_If(self, node: ast.If):
+        # The script entry point is not part of the interface of a module
+        test = node.test
+        if (
+            isinstance(test, ast.Compare)
+            and isinstance(test.left, ast.Name)
+            and test.left.id == "__name__"
+            and len(test.comparators) == 1
+            and isinstance(test.comparators[0], ast.Constant)
+            and test.comparators[0].value == "__main__"
+        ):
+            return None
+
+        return self.generic_visit(node)
+
+
+def extract_skeleton(source: str) -> str:
+    """
+    Returns the interface of a python module: the imports, constants, classes and the signatures, type hints
+    and docstrings of the functions, whose bodies are replaced with `...`. Comments are not kept.
+    Raises SyntaxError when the source does not parse.
+    """
+    tree = _BodyStripper().visit(ast.parse(source))
+    return ast.unparse(ast.fix_missing_locations(tree))
+
+
+def _try_extract_skeleton(source: str) -> Optional[str]:
+    try:
+        return extract_skeleton(source)
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+
+
+def _content_key(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def _read_and_extract_skeleton(file_path: str) -> Optional[Tuple[str, Optional[str]]]:
+    try:
+        with open(file_path, "r") as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    return _content_key(content), _try_extract_skeleton(content)
+
+
+class SkeletonCache:
+    """
+    An in-process LRU cache of module skeletons keyed by the hash of the module content, shared by threads.
+    A module that does not parse is served as is.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _store(self, key: str, skeleton: Optional[str]):
+        with self._lock:
+            self._entries[key] = skeleton
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, content: str) -> str:
+        """
+        Returns the skeleton of the module with a header saying so, or the content when it does not parse.
+        """
+        key = _content_key(content)
+
+        with self._lock:
+            found = key in self._entries
+            if found:
+                self._entries.move_to_end(key)
+                skeleton = self._entries[key]
+
+        if not found:
+            skeleton = _try_extract_skeleton(content)
+            self._store(key, skeleton)
+
+        return SKELETON_HEADER + skeleton if skeleton is not None else content
+
+    def prefetch(self, file_paths: Iterable[str], max_workers: Optional[int] = None):
+        """
+        Extracts the skeletons of python modules in a process pool, so parsing many dependencies does not hold
+        the GIL of the threads that review. The workers read the files themselves and only send back the hash
+        of the content and the skeleton.
+        """
+        file_paths = list(dict.fromkeys(file_paths))
+        max_workers = min(max_workers or os.cpu_count() or 1, len(file_paths))
+
+        if max_workers < 2:
+            results = [_read_and_extract_skeleton(file_path) for file_path in file_paths]
+        else:
+            # The caller runs review threads, forking them could copy held locks into the workers
+            with ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                results = list(executor.map(_read_and_extract_skeleton, file_paths, chunksize=8))
+
+        for result in results:
+            if result:
+                self._store(*result)
+
+
+@lru_cache()
+def get_skeleton_cache() -> SkeletonCache:
+    return SkeletonCache()
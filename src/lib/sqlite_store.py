@@ -0,0 +1,60 @@
+import os
+import sqlite3
+from typing import Optional, Sequence
+
+from src.utils.exceptions import StoreSchemaError
+
+
+def open_sqlite_store(
+    db_path: str,
+    schema_version: int,
+    schema: Sequence[str] = (),
+    drop_tables: Sequence[str] = (),
+    migrations: Optional[Sequence[Sequence[str]]] = None,
+    isolation_level: Optional[str] = "",
+) -> sqlite3.Connection:
+    """
+    Opens the SQLite database of a store in WAL mode, shared by the threads of the store under the lock of the
+    store. The schema is set up in a single transaction, so processes opening the database at the same time set
+    it up once. A database of another `schema_version` is rebuilt from scratch, `drop_tables` are dropped, unless
+    `migrations` are given: the statements that upgrade the schema from every version to the next one, for the
+    stores that keep data that can not be rebuilt. The `schema` statements run every time.
+    :raises StoreSchemaError: When the database was migrated by a newer version, it is left untouched.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=isolation_level)
+
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            database_version = connection.execute("PRAGMA user_version").fetchone()[0]
+
+            if migrations is not None and database_version > schema_version:
+                raise StoreSchemaError(
+                    f"{db_path} has schema version {database_version}, newer than the {schema_version} this version "
+                    "knows. Open it with a newer version, it was left untouched."
+                )
+
+            if database_version != schema_version:
+                if migrations is not None:
+                    statements = [statement for migration in migrations[database_version:] for statement in migration]
+                else:
+                    statements = [f"DROP TABLE IF EXISTS {table}" for table in drop_tables]
+
+                for statement in [*statements, f"PRAGMA user_version = {schema_version}"]:
+                    connection.execute(statement)
+
+            for statement in schema:
+                connection.execute(statement)
+
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+    except BaseException:
+        connection.close()
+        raise
+
+    return connection
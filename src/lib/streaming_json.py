@@ -0,0 +1,152 @@
+import json
+import re
+from typing import Any, List, Optional
+
+from src.utils.exceptions import UnrecoverableJsonStreamError
+
+_WHITESPACE = " \t\r\n"
+_CODE_FENCES = ("```json", "```")
+_VALUE_START = '{["-0123456789tfn'
+
+
+class StreamingJsonArrayParser:
+    """
+    Incrementally parses a streamed json array and returns every item as soon as it is closed.
+    The parser fails fast with UnrecoverableJsonStreamError as soon as the text can not be a json array,
+    e.g. when the model starts its answer with prose, so the stream can be aborted early.
+    When `array_key` is given, the array may also be wrapped in an object, e.g. {"files": [...]},
+    which is the shape of structured outputs.
+    """
+
+    def __init__(self, array_key: Optional[str] = None):
+        self._array_key = array_key
+        self._wrapper_pattern = re.compile(rf'\{{\s*"{re.escape(array_key)}"\s*:\s*\[') if array_key else None
+        self._wrapper_open = False
+        self._state = "preamble"
+        self._pending = ""
+        self._item: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def _fail(self, reason: str):
+        raise UnrecoverableJsonStreamError(reason)
+
+    def _consume_preamble(self) -> bool:
+        # Allow whitespace and a markdown code fence before the array
+        text = self._pending.lstrip(_WHITESPACE)
+
+        for fence in _CODE_FENCES:
+            if text.startswith(fence):
+                text = text[len(fence):].lstrip(_WHITESPACE)
+                break
+            if fence.startswith(text):
+                # Wait for more text, this may still be a code fence
+                self._pending = text
+                return False
+
+        if not text:
+            self._pending = ""
+            return False
+
+        if text[0] == "{" and self._wrapper_pattern:
+            match = self._wrapper_pattern.match(text)
+
+            if not match:
+                if "[" in text or len(text) > 100:
+                    self._fail(f"Expected a json array under {self._array_key!r}, got: {text[:50]!r}")
+                # Wait for more text, the key of the array may still be streaming
+                self._pending = text
+                return False
+
+            self._wrapper_open = True
+            self._state = "between_items"
+            self._pending = text[match.end():]
+            return True
+
+        if text[0] != "[":
+            self._fail(f"Expected a json array, got: {text[:50]!r}")
+
+        self._state = "between_items"
+        self._pending = text[1:]
+        return True
+
+    def _finish_item(self) -> Any:
+        item_text = "".join(self._item)
+        self._item = []
+
+        try:
+            # Not strict, so raw new lines in strings (e.g. file contents) are accepted
+            return json.loads(item_text, strict=False)
+        except json.JSONDecodeError as e:
+            self._fail(f"Invalid json array item: {e}")
+
+    def feed(self, text: str) -> List[Any]:
+        items = []
+        self._pending += text
+
+        if self._state == "preamble" and not self._consume_preamble():
+            return items
+
+        pending, self._pending = self._pending, ""
+        idx = 0
+
+        while idx < len(pending):
+            char = pending[idx]
+
+            if self._state == "between_items":
+                if char == "]":
+                    self._state = "done"
+                elif char not in _WHITESPACE and char != ",":
+                    if char not in _VALUE_START:
+                        self._fail(f"Unexpected character {char!r} in json array")
+                    self._state = "in_item"
+                    continue
+            elif self._state == "in_item":
+                if self._in_string:
+                    self._item.append(char)
+                    if self._escaped:
+                        self._escaped = False
+                    elif char == "\\":
+                        self._escaped = True
+                    elif char == '"':
+                        self._in_string = False
+                        if self._depth == 0:
+                            items.append(self._finish_item())
+                            self._state = "between_items"
+                elif char == '"':
+                    self._in_string = True
+                    self._item.append(char)
+                elif char in "{[":
+                    self._depth += 1
+                    self._item.append(char)
+                elif char in "}]" and self._depth > 0:
+                    self._depth -= 1
+                    self._item.append(char)
+                    if self._depth == 0:
+                        items.append(self._finish_item())
+                        self._state = "between_items"
+                elif self._depth == 0 and (char in _WHITESPACE or char in ",]"):
+                    # The end of a number or literal item
+                    items.append(self._finish_item())
+                    self._state = "between_items"
+                    continue
+                else:
+                    self._item.append(char)
+            elif self._state == "done":
+                if char == "}" and self._wrapper_open:
+                    self._wrapper_open = False
+                elif char not in _WHITESPACE and char != "`":
+                    self._fail(f"Unexpected text after the json array: {pending[idx:idx + 50]!r}")
+
+            idx += 1
+
+        return items
+
+    def close(self):
+        if self._state != "done" or self._wrapper_open:
+            self._fail("The json array was not closed")
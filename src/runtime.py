@@ -0,0 +1,143 @@
+import os
+import sys
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, Optional, TypeVar
+
+LOGGING_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "logging_config.ini")
+
+T = TypeVar("T")
+
+
+def configure_logging():
+    # logging.config pulls in socketserver and friends, it is only imported by the entry points
+    import logging.config
+
+    # Loggers created by the modules imported before are kept
+    logging.config.fileConfig(LOGGING_CONFIG_PATH, disable_existing_loggers=False)
+
+
+class Runtime:
+    """
+    The state shared by all the menu actions and services of a session: the settings, the llm clients and
+    their connection pools, the caches and the services built on them. Every part is built on first use and
+    its module is only imported then, so starting the CLI costs nothing the chosen action does not need.
+    """
+
+    def __init__(self):
+        # Reentrant, building a part may build the parts it depends on
+        self._lock = threading.RLock()
+        self._parts: Dict[str, object] = {}
+        # Where the llm clients send their stream events, replaced by every CLI action that shows progress
+        self.stream_sink = None
+
+    def _get(self, name: str, build: Callable[[], T]) -> T:
+        with self._lock:
+            if name not in self._parts:
+                self._parts[name] = build()
+
+            return self._parts[name]
+
+    @property
+    def settings(self):
+        from src.settings import get_settings
+
+        return self._get("settings", get_settings)
+
+    @property
+    def telemetry(self):
+        from src.lib.llm_client.telemetry import get_llm_telemetry
+
+        return self._get("telemetry", get_llm_telemetry)
+
+    @property
+    def file_content_cache(self):
+        from src.lib.file_content_cache import get_file_content_cache
+
+        return self._get("file_content_cache", get_file_content_cache)
+
+    def new_llm_client(self):
+        """
+        Returns a client with a conversation of its own. All the clients share the connection pool
+        (or the endpoint pool) and the response cache of the process.
+        """
+        from src.lib.llm_client import llm_client_factory
+
+        llm_client = llm_client_factory()
+        llm_client.stream_sink = self.stream_sink
+        return llm_client
+
+    @property
+    def repository_reader_service(self):
+        from src.services.repository_reader_service import RepositoryReaderService
+
+        return self._get(
+            "repository_reader_service", lambda: RepositoryReaderService(llm_client_factory=self.new_llm_client)
+        )
+
+    def coding_service(self):
+        # A new conversation every time, the services underneath are shared
+        from src.services.coding_service import CodingService
+
+        return CodingService(llm_client=self.new_llm_client(), repo_reader_service=self.repository_reader_service)
+
+    def code_review_service(self, local_repo_path: str, max_workers: Optional[int] = None):
+        from src.services.code_review_service import CodeReviewService
+
+        return CodeReviewService(
+            local_repo_path=local_repo_path,
+            max_workers=max_workers,
+            content_cache=self.file_content_cache,
+            coding_service_factory=self.coding_service,
+            repo_reader_service=self.repository_reader_service,
+        )
+
+    @property
+    def job_queue(self):
+        from src.lib.job_queue import JobQueue, create_queue_engine
+
+        def build():
+            settings = self.settings
+            if not settings.database_url:
+                raise ValueError("DATABASE_URL is not set, the job queue needs a database")
+
+            job_queue = JobQueue(
+                engine=create_queue_engine(settings.database_url),
+                lease_seconds=settings.queue_lease_seconds,
+                max_attempts=settings.queue_max_attempts,
+                retry_backoff_seconds=settings.queue_retry_backoff_seconds,
+            )
+            if settings.database_url.startswith("sqlite"):
+                # Local runs do not need the migrations
+                job_queue.create_tables()
+            return job_queue
+
+        return self._get("job_queue", build)
+
+    def close(self):
+        """
+        Closes the stream sink, the http connections of the llm clients and the database connections
+        that were built.
+        """
+        if self.stream_sink:
+            self.stream_sink.close()
+
+        if "job_queue" in self._parts:
+            self._parts["job_queue"].engine.dispose()
+
+        # Nothing to close when no llm client module was imported
+        openai_llm_client = sys.modules.get("src.lib.llm_client.openai_llm_client")
+        if openai_llm_client and openai_llm_client.get_shared_openai_client.cache_info().currsize:
+            openai_llm_client.get_shared_openai_client().close()
+            openai_llm_client.get_shared_openai_client.cache_clear()
+
+        pooled_openai_llm_client = sys.modules.get("src.lib.llm_client.pooled_openai_llm_client")
+        if pooled_openai_llm_client and pooled_openai_llm_client.get_shared_endpoint_pool.cache_info().currsize:
+            for pooled in pooled_openai_llm_client.get_shared_endpoint_pool().endpoints:
+                pooled.client.close()
+            pooled_openai_llm_client.get_shared_endpoint_pool.cache_clear()
+
+
+@lru_cache()
+def get_runtime() -> Runtime:
+    return Runtime()
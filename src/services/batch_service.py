@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, closing
+from dataclasses import asdict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from pydantic import ValidationError
+
+from src.lib.issue_store import IssueStore
+from src.lib.llm_client.base_llm_client import get_json_response_stats
+from src.lib.llm_client.telemetry import get_llm_telemetry
+from src.lib.review_manifest import ReviewManifest
+from src.runtime import Runtime, get_runtime
+from src.settings import get_settings
+from src.types.enums import BatchJobStatus, BatchMode, CodeEditFormat
+from src.types.schema import BatchJob, BatchJobResult
+
+
+def load_jobs(jobs_path: str) -> List[BatchJob]:
+    """
+    Reads a JSONL job file, one job per line. Blank lines are skipped.
+    """
+    jobs = []
+
+    with open(jobs_path, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+
+            try:
+                jobs.append(BatchJob.model_validate(json.loads(line)))
+            except (json.JSONDecodeError, ValidationError) as e:
+                raise ValueError(f"Invalid job on line {line_number} of {jobs_path}: {e}") from e
+
+    return jobs
+
+
+class BatchService:
+    """
+    Runs coding and review jobs without any prompt. Jobs run concurrently, but the files of code jobs
+    are written one job at a time so two jobs never interleave their writes to the repository.
+    """
+
+    def __init__(
+        self,
+        local_repo_path: str,
+        mode: BatchMode = BatchMode.CODE,
+        include_files: Optional[List[str]] = None,
+        include_glob: Optional[List[str]] = None,
+        concurrency: int = 1,
+        auto_select: bool = False,
+        runtime: Optional[Runtime] = None,
+    ):
+        self._logger = logging.getLogger(__name__)
+        self._local_repo_path = local_repo_path
+        self._mode = mode
+        self._include_files = include_files
+        self._include_glob = include_glob
+        self._concurrency = concurrency
+        self._auto_select = auto_select
+        self._runtime = runtime or get_runtime()
+        self._write_lock = threading.Lock()
+
+    def _read_job_files(self, job: BatchJob):
+        return self._runtime.repository_reader_service.read_files(
+            directory=self._local_repo_path,
+            include_files=job.include_files or self._include_files,
+            include_glob=job.include_glob or self._include_glob,
+        )
+
+    def _run_code_job(self, job: BatchJob, result: BatchJobResult):
+        coding_service = self._runtime.coding_service()
+        auto_select = job.auto_select if job.auto_select is not None else self._auto_select
+
+        if auto_select:
+            file_path_to_content = coding_service.repo_reader_service.select_relevant_files(
+                directory=self._local_repo_path,
+                query=job.task,
+                excerpts=get_settings().code_edit_format != CodeEditFormat.WHOLE,
+            )
+        else:
+            file_path_to_content = self._read_job_files(job)
+
+        coding_service.learn_code(file_abs_path_to_content=file_path_to_content, relevance_query=job.task)
+        coded_files = list(coding_service.code_feature_from_settings(task=job.task, local_repo_path=self._local_repo_path))
+
+        with self._write_lock:
+            coding_service.write_code(coded_files=coded_files, local_repo_path=self._local_repo_path)
+
+        result.files_written = [coded_file.file_path for coded_file in coded_files]
+
+    def _run_review_job(self, job: BatchJob, result: BatchJobResult):
+        bugs_output_dir = os.path.join(self._local_repo_path, "ohad_bugs")
+        code_review_service = self._runtime.code_review_service(local_repo_path=self._local_repo_path)
+
+        # The stores are opened per job, a worker runs jobs for as long as it lives
+        with ExitStack() as stack:
+            # Every job is a run of the store
+            issue_store = stack.enter_context(closing(IssueStore(os.path.join(bugs_output_dir, "issues.sqlite"))))
+            manifest = (
+                stack.enter_context(closing(ReviewManifest(os.path.join(bugs_output_dir, "review_manifest.sqlite"))))
+                if self._runtime.settings.review_incremental else None
+            )
+            run_id = issue_store.start_run()
+
+            for file_path, issues in code_review_service.review_files(
+                file_path_to_content=self._read_job_files(job), manifest=manifest
+            ):
+                if not issues:
+                    continue
+
+                result.issues_found += len(issues)
+                result.new_issues += issue_store.add_issues(run_id=run_id, file_path=file_path, issues=issues)
+
+            issue_store.finish_run(run_id)
+            issue_store.export_jsonl(os.path.join(bugs_output_dir, "issues.jsonl"))
+
+    def run_job(self, job: BatchJob) -> BatchJobResult:
+        mode = job.mode or self._mode
+        result = BatchJobResult(job_id=job.job_id, mode=mode, status=BatchJobStatus.SUCCEEDED, duration_seconds=0)
+        started_at = time.perf_counter()
+        self._logger.info(f"Running {mode.value} job {job.job_id}")
+
+        try:
+            {
+                BatchMode.CODE: self._run_code_job,
+                BatchMode.REVIEW: self._run_review_job,
+            }[mode](job, result)
+        except Exception as e:
+            # A failed job is reported in its result, the other jobs keep running
+            self._logger.exception(f"Job {job.job_id} failed")
+            result.status = BatchJobStatus.FAILED
+            result.error = f"{type(e).__name__}: {e}"
+
+        result.duration_seconds = round(time.perf_counter() - started_at, 3)
+        return result
+
+    def run(
+        self,
+        jobs: Iterable[BatchJob],
+        on_result: Optional[Callable[[BatchJobResult], None]] = None,
+    ) -> Iterator[BatchJobResult]:
+        """
+        Runs the jobs and yields every result as soon as its job is done, in completion order.
+        """
+        with ThreadPoolExecutor(max_workers=self._concurrency, thread_name_prefix="batch-job") as executor:
+            futures = [executor.submit(self.run_job, job) for job in jobs]
+
+            try:
+                for future in as_completed(futures):
+                    result = future.result()
+
+                    if on_result:
+                        on_result(result)
+
+                    yield result
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def run_to_files(self, jobs: List[BatchJob], results_path: str, summary_path: str) -> Dict:
+        """
+        Runs the jobs, appends every result to `results_path` as JSONL as soon as it is done,
+        and writes a summary of the whole batch to `summary_path`.
+        """
+        started_at = time.perf_counter()
+        results = []
+
+        for path in (results_path, summary_path):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        with open(results_path, "a") as results_file:
+            for result in self.run(jobs):
+                results.append(result)
+                results_file.write(result.model_dump_json() + "\n")
+                results_file.flush()
+
+        summary = {
+            "jobs": len(results),
+            "succeeded": sum(result.status == BatchJobStatus.SUCCEEDED for result in results),
+            "failed": [result.job_id for result in results if result.status == BatchJobStatus.FAILED],
+            "duration_seconds": round(time.perf_counter() - started_at, 3),
+            "files_written": sum(len(result.files_written) for result in results),
+            "issues_found": sum(result.issues_found for result in results),
+            "new_issues": sum(result.new_issues for result in results),
+            "json_responses": asdict(get_json_response_stats()),
+            "llm_calls": get_llm_telemetry().summary(),
+        }
+
+        with open(summary_path, "w") as f:
+            f.write(json.dumps(summary, indent=4))
+
+        return summary
@@ -0,0 +1,360 @@
+import difflib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from src.lib.code_chunker import HEADER_BUDGET_RATIO, CodeChunk, build_header, chunk_source, number_lines
+from src.lib.file_content_cache import FileContentCache, get_file_content_cache
+from src.lib.issue_store import normalize_issue_text
+from src.lib.llm_client import llm_model_name
+from src.lib.review_manifest import ReviewManifest, make_review_key, sha256_text
+from src.lib.review_scheduler import DependencyReuseReport, schedule_reviews
+from src.lib.skeleton_extractor import SkeletonCache, get_skeleton_cache
+from src.services.coding_service import CODE_REVIEW_PROMPT_VERSION, CodingService
+from src.services.repository_reader_service import RepositoryReaderService
+from src.settings import get_settings
+from src.utils.tokens import estimate_tokens
+
+# Issues of overlapping lines whose explanations are at least this similar are duplicates
+DUPLICATE_ISSUE_SIMILARITY = 0.85
+
+
+def attribute_issue(issue: Dict, chunk: CodeChunk) -> Dict:
+    """
+    Makes sure the lines of an issue found in a chunk are inside the chunk, issues without lines
+    are attributed to the whole chunk.
+    """
+    line_start, line_end = issue.get("line_start"), issue.get("line_end")
+
+    if line_start is None:
+        line_start, line_end = chunk.start_line, chunk.end_line
+
+    line_start = min(max(line_start, chunk.start_line), chunk.end_line)
+    line_end = min(max(line_end if line_end is not None else line_start, line_start), chunk.end_line)
+
+    return {**issue, "line_start": line_start, "line_end": line_end}
+
+
+def merge_issues(issues: List[Dict]) -> List[Dict]:
+    """
+    Merges the issues of the chunks of a file, sorted by line. Chunks share a header, so the same issue
+    may be reported by several of them, issues with the same explanation or with overlapping lines and a
+    similar explanation are reported once.
+    """
+    merged: List[Dict] = []
+
+    for issue in sorted(issues, key=lambda issue: (issue.get("line_start") or 0, issue.get("line_end") or 0)):
+        explanation = normalize_issue_text(issue["explanation"])
+        is_duplicate = False
+
+        for kept_issue in merged:
+            kept_explanation = normalize_issue_text(kept_issue["explanation"])
+            lines_overlap = (
+                issue.get("line_start") is not None
+                and kept_issue.get("line_start") is not None
+                and issue["line_start"] <= kept_issue["line_end"]
+                and kept_issue["line_start"] <= issue["line_end"]
+            )
+
+            if explanation == kept_explanation or (
+                lines_overlap
+                and difflib.SequenceMatcher(None, explanation, kept_explanation).ratio() >= DUPLICATE_ISSUE_SIMILARITY
+            ):
+                is_duplicate = True
+                break
+
+        if not is_duplicate:
+            merged.append(issue)
+
+    return merged
+
+
+class CodeReviewService:
+    def __init__(
+        self,
+        local_repo_path: str,
+        max_workers: Optional[int] = None,
+        content_cache: Optional[FileContentCache] = None,
+        coding_service_factory: Callable[[], CodingService] = CodingService,
+        repo_reader_service: Optional[RepositoryReaderService] = None,
+        skeleton_cache: Optional[SkeletonCache] = None,
+        dependency_skeletons: Optional[bool] = None,
+        chunk_tokens: Optional[int] = None,
+        model_name: Optional[str] = None,
+    ):
+        self._logger = logging.getLogger(__name__)
+        self._local_repo_path = local_repo_path
+        self._max_workers = max_workers or get_settings().review_workers
+        self._content_cache = content_cache
+        self._coding_service_factory = coding_service_factory
+        self._repo_reader_service = repo_reader_service or RepositoryReaderService()
+        self._skeleton_cache = skeleton_cache
+        self._dependency_skeletons = dependency_skeletons
+        self._chunk_tokens = chunk_tokens
+        self._model_name = model_name
+        self.dependency_reuse_report: Optional[DependencyReuseReport] = None
+        # The estimated tokens of the text sent for every dependency, skeletons included
+        self._sent_dependency_tokens: Dict[str, int] = {}
+        self.reused_reviews = 0
+
+    @property
+    def content_cache(self) -> FileContentCache:
+        if self._content_cache is None:
+            self._content_cache = get_file_content_cache()
+
+        return self._content_cache
+
+    @property
+    def skeleton_cache(self) -> SkeletonCache:
+        if self._skeleton_cache is None:
+            self._skeleton_cache = get_skeleton_cache()
+
+        return self._skeleton_cache
+
+    @property
+    def dependency_skeletons(self) -> bool:
+        if self._dependency_skeletons is None:
+            self._dependency_skeletons = get_settings().review_dependency_skeletons
+
+        return self._dependency_skeletons
+
+    @property
+    def chunk_tokens(self) -> int:
+        if self._chunk_tokens is None:
+            self._chunk_tokens = get_settings().review_chunk_tokens
+
+        return self._chunk_tokens
+
+    @property
+    def model_name(self) -> str:
+        if self._model_name is None:
+            self._model_name = llm_model_name()
+
+        return self._model_name
+
+    def review_file(self, file_path: str, content: str, dependencies: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Reads the dependencies of a file, learns the code, and finds issues in the code.
+        Every call uses its own CodingService, so the conversation memory is isolated per file
+        while the http connection pool of the llm client is shared.
+        :param file_path: The path to the file to be reviewed.
+        :param content: The content of the file to be reviewed.
+        :param dependencies: The dependencies of the file, in the order they are sent. Found when not given.
+        :return: The issues found in the file.
+        """
+        if dependencies is None:
+            dependencies = self.find_dependencies(file_path)
+
+        file_path_to_content = self._read_dependencies(file_path=file_path, dependencies=dependencies)
+        if file_path.endswith(".py") and estimate_tokens(content) > self.chunk_tokens:
+            return self._review_file_in_chunks(
+                file_path=file_path, content=content, dependencies=file_path_to_content, chunk_tokens=self.chunk_tokens
+            )
+
+        file_path_to_content[file_path] = content
+        coding_service = self._coding_service_factory()
+        # The dependencies come first in a stable order and the file last, so reviews share a prompt prefix
+        coding_service.learn_code(
+            file_abs_path_to_content=file_path_to_content,
+            relevance_query=content,
+            pinned_paths=[file_path],
+            stable_order=True,
+        )
+        issues = coding_service.perform_code_review()
+        return issues
+
+    def find_dependencies(
+        self, file_path: str, repo_reader_service: Optional[RepositoryReaderService] = None
+    ) -> List[str]:
+        repo_reader_service = repo_reader_service or self._repo_reader_service
+        file_dependencies = repo_reader_service.find_dependencies_by_file(
+            file_path=file_path,
+            local_repo_path=self._local_repo_path
+        )
+        existing_dependencies = []
+
+        for file_dependency_path in file_dependencies:
+            if not os.path.isfile(file_dependency_path):
+                self._logger.warning(f"Dependency file {file_dependency_path} does not exist, skipping.")
+                continue
+
+            existing_dependencies.append(file_dependency_path)
+
+        return existing_dependencies
+
+    def _read_dependencies(self, file_path: str, dependencies: List[str]) -> Dict[str, str]:
+        file_path_to_content = {}
+
+        for dep_idx, file_dependency_path in enumerate(dependencies):
+            self._logger.info(
+                f"Reading dependency {dep_idx + 1}/{len(dependencies)} for the file {file_path}: {file_dependency_path}")
+
+            # Hub modules are read from disk once for the whole session
+            content = self.content_cache.read(file_dependency_path)
+
+            if self.dependency_skeletons and file_dependency_path.endswith(".py"):
+                content = self.skeleton_cache.get(content)
+
+            file_path_to_content[file_dependency_path] = content
+            self._sent_dependency_tokens[file_dependency_path] = estimate_tokens(content)
+
+        return file_path_to_content
+
+    def _review_file_in_chunks(
+        self, file_path: str, content: str, dependencies: Dict[str, str], chunk_tokens: int
+    ) -> List[Dict]:
+        """
+        Reviews a large python file one chunk of functions and classes at a time, the chunks are reviewed
+        in parallel and every chunk comes with a header of the imports, globals and signatures of the module.
+        """
+        try:
+            header = build_header(content, max_tokens=int(chunk_tokens * HEADER_BUDGET_RATIO))
+        except SyntaxError:
+            header = ""
+
+        chunks = chunk_source(content, max_tokens=chunk_tokens)
+        self._logger.info(f"Reviewing {file_path} in {len(chunks)} chunks")
+
+        def review_chunk(chunk: CodeChunk) -> List[Dict]:
+            chunk_content = f"# Lines {chunk.start_line}-{chunk.end_line} ({chunk.name}):\n" + number_lines(
+                chunk.content.splitlines(), chunk.start_line
+            )
+            if header:
+                chunk_content = f"# The imports, globals and signatures of the module:\n{header}\n\n{chunk_content}"
+
+            coding_service = self._coding_service_factory()
+            coding_service.learn_code(
+                file_abs_path_to_content={**dependencies, file_path: chunk_content},
+                relevance_query=chunk.content,
+                pinned_paths=[file_path],
+                stable_order=True,
+            )
+            issues = coding_service.perform_code_review(line_range=(chunk.start_line, chunk.end_line))
+            return [attribute_issue(issue, chunk) for issue in issues]
+
+        with ThreadPoolExecutor(
+            max_workers=get_settings().review_chunk_workers, thread_name_prefix="code-review-chunk"
+        ) as executor:
+            chunk_issues = list(executor.map(review_chunk, chunks))
+
+        return merge_issues([issue for issues in chunk_issues for issue in issues])
+
+    def _review_keys(
+        self, file_path_to_content: Mapping[str, str], file_to_dependencies: Dict[str, List[str]]
+    ) -> Dict[str, str]:
+        settings = get_settings()
+        # Options that change the prompt or the response of a review without changing the files
+        options = {
+            "dependency_skeletons": self.dependency_skeletons,
+            "chunk_tokens": self.chunk_tokens,
+            "context_token_budget": settings.context_token_budget,
+            "context_max_message_tokens": settings.context_max_message_tokens,
+            "structured_output": settings.llm_structured_output,
+        }
+        dependency_sha256s: Dict[str, str] = {}
+        review_keys = {}
+
+        for file_path, dependencies in file_to_dependencies.items():
+            for dependency_path in dependencies:
+                # Hub modules are hashed once for the whole run
+                if dependency_path not in dependency_sha256s:
+                    dependency_sha256s[dependency_path] = sha256_text(self.content_cache.read(dependency_path))
+
+            review_keys[file_path] = make_review_key(
+                content_sha256=sha256_text(file_path_to_content[file_path]),
+                dependency_sha256s={path: dependency_sha256s[path] for path in dependencies},
+                model=self.model_name,
+                prompt_version=CODE_REVIEW_PROMPT_VERSION,
+                options=options,
+            )
+
+        return review_keys
+
+    def review_files(
+        self,
+        file_path_to_content: Mapping[str, str],
+        on_progress: Optional[Callable[[int, int, str], None]] = None,
+        manifest: Optional[ReviewManifest] = None,
+    ) -> Iterator[Tuple[str, List[Dict]]]:
+        """
+        Reviews the files concurrently using a bounded pool of workers.
+        The dependencies of all the files are found first, and the reviews are started in an order where
+        files sharing dependencies run next to each other with the same prompt prefix.
+        The results are yielded in the order of the input, so the output is the same as a serial run.
+        :param file_path_to_content: The files to review.
+        :param on_progress: Called with (done, total, file_path) every time a file result is yielded.
+        :param manifest: When given, only the files whose review key changed are reviewed, the stored issues
+            are yielded for the others, and every finished review is recorded right away.
+        """
+        total = len(file_path_to_content)
+        self._logger.info(f"Reviewing {total} files using {self._max_workers} workers")
+
+        with ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix="code-review"
+        ) as executor:
+            file_to_dependencies = dict(
+                zip(file_path_to_content, executor.map(self.find_dependencies, file_path_to_content))
+            )
+            # Before the review keys, which are the first to read the dependencies
+            cache_stats_before = (self.content_cache.stats.bytes_read, self.content_cache.stats.bytes_served)
+            review_keys = {}
+            if manifest is not None:
+                review_keys = self._review_keys(file_path_to_content, file_to_dependencies)
+            stored_issues = {
+                file_path: manifest.get(file_path, review_key) for file_path, review_key in review_keys.items()
+            }
+            stored_issues = {file_path: issues for file_path, issues in stored_issues.items() if issues is not None}
+            self.reused_reviews = len(stored_issues)
+
+            if stored_issues:
+                self._logger.info(f"Reusing the reviews of {len(stored_issues)} unchanged files")
+
+            schedule = schedule_reviews(
+                {
+                    file_path: dependencies
+                    for file_path, dependencies in file_to_dependencies.items()
+                    if file_path not in stored_issues
+                }
+            )
+
+            python_dependencies = [
+                path for paths in schedule.dependencies.values() for path in paths if path.endswith(".py")
+            ]
+            if python_dependencies and self.dependency_skeletons:
+                # Hub modules are parsed once for the whole run, by a pool of processes
+                self.skeleton_cache.prefetch(python_dependencies)
+
+            def review(path: str) -> List[Dict]:
+                # The content is read inside the worker, so lazily read files are not all loaded upfront
+                issues = self.review_file(path, file_path_to_content[path], dependencies=schedule.dependencies[path])
+                if manifest is not None:
+                    manifest.record(path, review_keys[path], issues)
+                return issues
+
+            futures_by_path = {file_path: executor.submit(review, file_path) for file_path in schedule.order}
+            futures = [(file_path, futures_by_path.get(file_path)) for file_path in file_path_to_content]
+
+            try:
+                for idx, (file_path, future) in enumerate(futures):
+                    issues = future.result() if future else stored_issues[file_path]
+
+                    if on_progress:
+                        on_progress(idx + 1, total, file_path)
+
+                    yield file_path, issues
+            finally:
+                # Do not start reviews that nobody is going to consume
+                for _, future in futures:
+                    if future:
+                        future.cancel()
+
+        self.dependency_reuse_report = DependencyReuseReport(
+            files=len(schedule.order),
+            dependency_reads=sum(len(dependencies) for dependencies in schedule.dependencies.values()),
+            naive_bytes_read=self.content_cache.stats.bytes_served - cache_stats_before[1],
+            bytes_read=self.content_cache.stats.bytes_read - cache_stats_before[0],
+            dependency_tokens=schedule.dependency_tokens(self._sent_dependency_tokens),
+            shared_prefix_tokens=schedule.shared_prefix_tokens(self._sent_dependency_tokens),
+        )
+        self._logger.info(f"Dependency reuse: {self.dependency_reuse_report.summary()}")
@@ -1,32 +1,89 @@
 import logging
+import multiprocessing
 import os
-from typing import Dict, Optional, List
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, Mapping, Optional, List, Tuple
 
-from src.lib.llm_client import llm_client_factory
+from src.lib.candidate_validator import init_validation_worker, validate_candidate
+from src.lib.context_packer import ContextPacker, ContextPackingReport
+from src.lib.patch_applier import apply_patch
+from src.lib.llm_client import llm_client_factory, LlMClient
 from src.services.repository_reader_service import RepositoryReaderService
-from src.types.enums import CodedFileAction
-from src.types.schema import CodedFileResponse
+from src.settings import get_settings
+from src.types.enums import CodedFileAction, CodeEditFormat
+from src.types.schema import CodedFileResponse, CodedFilesResponse, CodeReviewResponse
+from src.utils.exceptions import CandidateValidationError, PatchApplyError
+
+EDIT_FORMAT_INSTRUCTIONS = {
+    CodeEditFormat.WHOLE: "",
+    CodeEditFormat.SEARCH_REPLACE: """
+            For UPDATE actions do not return the full content of the file, leave "content" empty and return a "patch"
+            made of search/replace blocks instead:
+            { "file_path": "file_path_1", "patch": "<<<<<<< SEARCH\\nold lines\\n=======\\nnew lines\\n>>>>>>> REPLACE\\n", action: "UPDATE" }
+            The SEARCH part must match the current lines of the file exactly, with enough lines to be unique.
+            Use one block per change, keep the blocks short and in the order they appear in the file.
+            """,
+    CodeEditFormat.UDIFF: """
+            For UPDATE actions do not return the full content of the file, leave "content" empty and return a "patch"
+            with a unified diff of the file instead:
+            { "file_path": "file_path_1", "patch": "@@ ... @@\\n context line\\n-removed line\\n+added line\\n", action: "UPDATE" }
+            Include a few unchanged context lines around every change so it can be located in the file.
+            """,
+}
+
+# Bump when the code review prompt changes, so the stored reviews of the Bug Finder are redone
+CODE_REVIEW_PROMPT_VERSION = 3
 
 
 class CodingService:
-    def __init__(self):
+    def __init__(
+        self,
+        llm_client: Optional[LlMClient] = None,
+        repo_reader_service: Optional[RepositoryReaderService] = None,
+    ):
         self._logger = logging.getLogger(__name__)
-        self._llm_client = llm_client_factory()
-        self._repo_reader_service = RepositoryReaderService()
+        self._llm_client = llm_client or llm_client_factory()
+        self._repo_reader_service = repo_reader_service or RepositoryReaderService()
 
     @property
     def repo_reader_service(self):
         return self._repo_reader_service
 
+    @property
+    def model_name(self) -> str:
+        return self._llm_client.model_name
+
     def code_feature(
         self, task: str, local_repo_path: Optional[str] = None
     ) -> List[CodedFileResponse]:
+        return list(self.code_feature_stream(task=task, local_repo_path=local_repo_path))
+
+    def code_feature_stream(
+        self, task: str, local_repo_path: Optional[str] = None
+    ) -> Iterator[CodedFileResponse]:
+        """
+        Same as code_feature, but yields every file as soon as the llm finished generating it,
+        so the files can be written while the rest of the response is still being generated.
+        """
         self._logger.info(f"Asking the llm to code the feature: {task}")
+        return self._request_coded_files(self._llm_client, task=task, local_repo_path=local_repo_path)
+
+    def _request_coded_files(
+        self,
+        llm_client: LlMClient,
+        task: str,
+        local_repo_path: Optional[str] = None,
+        cancel_event: Optional[threading.Event] = None,
+        **kwargs,
+    ) -> Iterator[CodedFileResponse]:
+        edit_format_instructions = EDIT_FORMAT_INSTRUCTIONS[get_settings().code_edit_format]
 
         # Based on the feature request, ask the llm to code the feature.
         # The llm should return a list of files and their updated content.
-        files = self._llm_client.send_message_expecting_json_response(
-            f"""
+        files = llm_client.send_message_expecting_json_array_stream(
+            response_model=CodedFilesResponse,
+            message=f"""
             You are a senior software engineer at a tech company.
             Based on the code I showed you previously, please implement the following feature: {task}.
 
@@ -36,7 +93,7 @@ class CodingService:
             {{ "file_path": "file_path_1", "content (optional)": "content_1", action: "CREATE" | "UPDATE" | "DELETE" }},
             {{ "file_path": "file_path_2", "content (optional)": "content_1", action: "CREATE" | "UPDATE" | "DELETE" }},
             ]
-
+            {edit_format_instructions}
             Additional Requirements:
             Always create an EXPLANATION.md file in the root directory of the repository that explains the changes made.
             The code that I showed you is the most important - you must take it into account when implementing the feature.
@@ -46,27 +103,147 @@ class CodingService:
             The content for each file must be JSON-serializable.
             Ensure your response reflects all necessary changes across multiple files.
             I will feed your response directly to a JSON parser, so it must strictly adhere to the JSON format.
-            """
+            """,
+            cancel_event=cancel_event,
+            **kwargs
         )
 
-        files = [CodedFileResponse.model_validate(file) for file in files]
+        for file in files:
+            coded_file = CodedFileResponse.model_validate(file)
 
-        if local_repo_path:
-            for file in files:
-                file.file_path = os.path.join(
+            if local_repo_path:
+                coded_file.file_path = os.path.join(
                     local_repo_path,
-                    file.file_path.replace(local_repo_path, "").lstrip("/"),
+                    coded_file.file_path.replace(local_repo_path, "").lstrip("/"),
                 )
 
-        return files
+            yield coded_file
+
+    def code_feature_candidates(
+        self,
+        task: str,
+        local_repo_path: str,
+        num_candidates: int,
+        test_command: Optional[str] = None,
+        test_timeout_seconds: float = 600,
+        temperature: Optional[float] = None,
+    ) -> List[CodedFileResponse]:
+        """
+        Asks for `num_candidates` implementations of the task at the same time, validates every candidate in a
+        process pool as soon as it is generated (see validate_candidate) and returns the first one that passes.
+        Nothing is written to the repository. The conversation continues from the chosen candidate.
+        :raises CandidateValidationError: When no candidate passes, with the errors of every candidate.
+        """
+        self._logger.info(f"Asking the llm for {num_candidates} candidates of the feature: {task}")
+        forks = [self._llm_client.fork() for _ in range(num_candidates)]
+        kwargs = {"temperature": temperature} if temperature is not None else {}
+        candidates: Dict[int, List[CodedFileResponse]] = {}
+        errors: Dict[int, List[str]] = {}
+
+        # Stops the generations that are still streaming once a candidate is chosen
+        cancel_event = threading.Event()
+
+        def generate(fork: LlMClient) -> List[CodedFileResponse]:
+            return list(
+                self._request_coded_files(
+                    fork, task=task, local_repo_path=local_repo_path, cancel_event=cancel_event, **kwargs
+                )
+            )
+
+        generation_pool = ThreadPoolExecutor(max_workers=num_candidates, thread_name_prefix="code-candidate")
+        # Forking while the generation threads hold the locks of the http and sqlite clients could deadlock
+        validation_pool = ProcessPoolExecutor(
+            max_workers=min(num_candidates, os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_validation_worker,
+        )
+        # Every pending future is either the generation or the validation of a candidate
+        pending = {generation_pool.submit(generate, fork): ("generation", idx) for idx, fork in enumerate(forks)}
+
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    stage, idx = pending.pop(future)
+
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self._logger.error(f"The {stage} of candidate {idx} failed: {e}")
+                        errors[idx] = [f"The {stage} failed: {type(e).__name__}: {e}"]
+                        continue
+
+                    if stage == "generation":
+                        candidates[idx] = result
+                        validation_future = validation_pool.submit(
+                            validate_candidate,
+                            local_repo_path,
+                            [coded_file.model_dump(mode="json") for coded_file in result],
+                            test_command,
+                            test_timeout_seconds,
+                        )
+                        pending[validation_future] = ("validation", idx)
+                    elif result.passed:
+                        self._logger.info(f"Candidate {idx} passed the validation, dropping the other candidates")
+                        self._llm_client = forks[idx]
+                        return candidates[idx]
+                    else:
+                        self._logger.warning(f"Candidate {idx} failed the validation: {result.errors}")
+                        errors[idx] = result.errors
+        finally:
+            # The candidates that are still generated abort their request at their next chunk. The running
+            # validations can not be cancelled and the interpreter joins the workers at exit, so they are
+            # terminated, which kills their test commands (see init_validation_worker)
+            cancel_event.set()
+            generation_pool.shutdown(wait=False, cancel_futures=True)
+            # The executor does not expose its processes and forgets them on shutdown
+            validation_processes = list((validation_pool._processes or {}).values())
+            validation_pool.shutdown(wait=False, cancel_futures=True)
+
+            for process in validation_processes:
+                process.terminate()
+
+        raise CandidateValidationError(
+            f"None of the {num_candidates} candidates passed the validation:\n"
+            + "\n".join(f"Candidate {idx}: " + "\n".join(errors[idx]) for idx in sorted(errors))
+        )
 
-    def write_code(self, coded_files: List[CodedFileResponse], local_repo_path: str):
+    def code_feature_from_settings(self, task: str, local_repo_path: str) -> Iterable[CodedFileResponse]:
+        """
+        Streams the files of a single response, or returns the first valid candidate when CODE_CANDIDATES > 1.
+        """
+        settings = get_settings()
+
+        if settings.code_candidates <= 1:
+            return self.code_feature_stream(task=task, local_repo_path=local_repo_path)
+
+        return self.code_feature_candidates(
+            task=task,
+            local_repo_path=local_repo_path,
+            num_candidates=settings.code_candidates,
+            test_command=settings.code_candidates_test_command,
+            test_timeout_seconds=settings.code_candidates_test_timeout_seconds,
+            temperature=settings.code_candidates_temperature,
+        )
+
+    def write_code(self, coded_files: Iterable[CodedFileResponse], local_repo_path: str):
         if len(local_repo_path) < 20:
             raise ValueError("local_repo_path is too short")
 
         self._logger.info("Writing the code to the local repository")
+        patch_errors = []
+
         for coded_file in coded_files:
-            self._handle_coded_feature_file_response(coded_file=coded_file)
+            try:
+                self._handle_coded_feature_file_response(coded_file=coded_file)
+            except PatchApplyError as e:
+                # Keep writing the other files, the failed patches are reported together
+                self._logger.error(str(e))
+                patch_errors.append(str(e))
+
+        if patch_errors:
+            raise PatchApplyError("\n\n".join(patch_errors))
 
         self._logger.info("All files written successfully")
 
@@ -76,7 +253,7 @@ class CodingService:
                 file_abs_path=coded_file.file_path, content=coded_file.content
             ),
             CodedFileAction.UPDATE: lambda: self._update_file(
-                file_abs_path=coded_file.file_path, content=coded_file.content
+                file_abs_path=coded_file.file_path, content=coded_file.content, patch=coded_file.patch
             ),
             CodedFileAction.DELETE: lambda: self._delete_file(
                 file_abs_path=coded_file.file_path
@@ -94,9 +271,22 @@ class CodingService:
 
         self._logger.debug(f"File created: {file_abs_path}")
 
-    def _update_file(self, file_abs_path: str, content: str):
+    def _update_file(self, file_abs_path: str, content: str, patch: Optional[str] = None):
         self._logger.info(f"Updating file: {file_abs_path}")
 
+        if patch:
+            with open(file_abs_path, "r") as f:
+                patch_result = apply_patch(f.read(), patch)
+
+            # A partially applied patch would leave the file in a state nobody asked for
+            if patch_result.failed:
+                raise PatchApplyError(
+                    f"Failed to apply {len(patch_result.failed)} hunks to {file_abs_path}, the file was not updated:\n"
+                    f"{patch_result.describe_failures()}"
+                )
+
+            content = patch_result.content
+
         with open(file_abs_path, "w") as f:
             f.write(content)
 
@@ -107,30 +297,53 @@ class CodingService:
         os.remove(file_abs_path)
         self._logger.debug(f"File deleted: {file_abs_path}")
 
-    def learn_code(self, file_abs_path_to_content: Dict[str, str]):
+    def learn_code(
+        self,
+        file_abs_path_to_content: Mapping[str, str],
+        relevance_query: Optional[str] = None,
+        pinned_paths: Iterable[str] = (),
+        stable_order: bool = False,
+    ) -> ContextPackingReport:
         self._logger.info("Teaching the llm the code")
 
-        for file_abs_path, content in file_abs_path_to_content.items():
-            self._llm_client.send_message(
-                f"""
-                #########################
-                # {file_abs_path}
-                {content}
-                #########################
-                """,
-                add_to_memory_without_response=True,
-            )
+        settings = get_settings()
+        context_packer = ContextPacker(
+            token_budget=settings.context_token_budget,
+            max_message_tokens=settings.context_max_message_tokens,
+        )
+        messages, report = context_packer.pack(
+            file_abs_path_to_content=file_abs_path_to_content,
+            relevance_query=relevance_query,
+            pinned_paths=pinned_paths,
+            stable_order=stable_order,
+        )
+
+        for message in messages:
+            self._llm_client.send_message(message, add_to_memory_without_response=True)
+
+        if report.truncated:
+            self._logger.warning(f"Truncated files to fit the context budget: {report.truncated}")
+
+        if report.dropped:
+            self._logger.warning(f"Dropped files that did not fit the context budget: {report.dropped}")
+
+        self._logger.info(f"Taught the llm the code: {report.summary()}")
 
-        self._logger.info("Taught the llm the code")
+        return report
 
-    def perform_code_review(self):
+    def perform_code_review(self, line_range: Optional[Tuple[int, int]] = None):
+        """
+        Reviews the code learned previously. With a line range only these lines of the reviewed file are
+        reviewed, the file lines are expected to be numbered and the issues point at the lines they are about.
+        """
         prompt = """
         AI Agent Code Review Prompt
         
         You are tasked with reviewing an input code file to identify potential bugs, issues, and areas for improvement. Your output should be a structured JSON list where each entry includes the following properties:
         
         explanation: A concise description of the issue, including why it might cause problems or be suboptimal, or how can it be improved.
-        fix_suggestion: A clear suggestion for how to fix the issue, including a brief explanation of why the fix works.
+        suggestion: A clear suggestion for how to fix the issue, including a brief explanation of why the fix works.
+        severity: How much the issue matters, one of "low", "medium", "high" and "critical".
         Your analysis should include syntax errors, logical bugs, performance issues, potential security vulnerabilities, and non-compliance with coding best practices.
         
         Input: A code file in Python (or specify another language if needed).
@@ -149,11 +362,13 @@ class CodingService:
         [
           {
             "explanation": "The function does not handle non-numeric input, which could cause a runtime error.",
-            "suggestion": "Add input validation to check if 'a' and 'b' are numbers before performing the addition."
+            "suggestion": "Add input validation to check if 'a' and 'b' are numbers before performing the addition.",
+            "severity": "medium"
           },
           {
             "explanation": "Division by zero is not handled, leading to a potential ZeroDivisionError.",
-            "suggestion": "Include a check to ensure 'b' is not zero before performing the division."
+            "suggestion": "Include a check to ensure 'b' is not zero before performing the division.",
+            "severity": "high"
           }
         ]
         
@@ -161,4 +376,15 @@ class CodingService:
         I will feed your response directly to a JSON parser, so it must strictly adhere to the JSON format.
         If bugs were not found, do not include any entries in the 'issues' list.
         """
-        return self._llm_client.send_message_expecting_json_response(prompt)
\ No newline at end of file
+
+        if line_range:
+            prompt += f"""
+        Only review lines {line_range[0]} to {line_range[1]} of the file, the lines are numbered and the code
+        around them is only shown for context. Add to every entry the "line_start" and "line_end" numbers of the
+        lines the issue is about, e.g. "line_start": {line_range[0]}, "line_end": {line_range[0]}.
+        """
+
+        response = self._llm_client.send_message_expecting_json_response(
+            prompt, response_model=CodeReviewResponse
+        )
+        return [issue.model_dump(exclude_none=True) for issue in response.issues]
\ No newline at end of file
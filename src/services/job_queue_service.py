@@ -0,0 +1,201 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.lib.import_graph import invalidate_import_graphs
+from src.lib.issue_store import IssueStore
+from src.lib.job_queue import JobQueue, QueuedJob
+from src.lib.repository_index import RepositoryIndex
+from src.runtime import Runtime, get_runtime
+from src.services.repository_reader_service import get_repository_index
+from src.types.enums import BatchJobStatus, BatchMode, QueueJobStatus
+from src.types.schema import BatchJob
+from src.utils.exceptions import QueueJobError
+
+
+class JobQueueService:
+    """
+    Spreads Bug Finder reviews and coding jobs over worker processes and hosts through the job queue.
+    The jobs refer to files by their path relative to the repository, every worker runs them on its own
+    checkout of the repository.
+    """
+
+    def __init__(
+        self,
+        job_queue: JobQueue,
+        local_repo_path: str,
+        runtime: Optional[Runtime] = None,
+        heartbeat_seconds: Optional[float] = None,
+        poll_seconds: Optional[float] = None,
+        repository_index: Optional[RepositoryIndex] = None,
+    ):
+        self._logger = logging.getLogger(__name__)
+        self._job_queue = job_queue
+        self._local_repo_path = local_repo_path
+        self._runtime = runtime or get_runtime()
+        self._heartbeat_seconds = heartbeat_seconds or self._runtime.settings.queue_heartbeat_seconds
+        self._poll_seconds = poll_seconds or self._runtime.settings.queue_poll_seconds
+        self._repository_index = repository_index
+
+    @property
+    def repository_index(self) -> RepositoryIndex:
+        if self._repository_index is None:
+            self._repository_index = get_repository_index(self._local_repo_path)
+
+        return self._repository_index
+
+    def _invalidate_changed_imports(self):
+        # Rebuilding the import graph parses every python file, so it is only dropped when one of them changed
+        refresh_stats = self.repository_index.refresh()
+
+        if any(path.endswith(".py") for path in refresh_stats.changed_paths):
+            invalidate_import_graphs()
+
+    def enqueue_reviews(self, file_paths: Iterable[str], batch_id: Optional[str] = None) -> str:
+        """
+        Enqueues a review job per file and returns the id of the batch.
+        """
+        batch_id = batch_id or uuid.uuid4().hex
+        payloads = [
+            {"file_path": os.path.relpath(os.path.abspath(file_path), self._local_repo_path)} for file_path in file_paths
+        ]
+        self._job_queue.enqueue(BatchMode.REVIEW, payloads, batch_id=batch_id)
+        self._logger.info(f"Enqueued {len(payloads)} review jobs in batch {batch_id}")
+        return batch_id
+
+    def enqueue_batch_jobs(self, jobs: Iterable[BatchJob], mode: BatchMode, batch_id: Optional[str] = None) -> str:
+        """
+        Enqueues batch jobs, a job without a mode gets `mode`, and returns the id of the batch.
+        """
+        batch_id = batch_id or uuid.uuid4().hex
+        payloads_by_mode: Dict[BatchMode, List[Dict]] = {}
+
+        for job in jobs:
+            payloads_by_mode.setdefault(job.mode or mode, []).append({"job": job.model_dump(mode="json")})
+
+        for job_mode, payloads in payloads_by_mode.items():
+            self._job_queue.enqueue(job_mode, payloads, batch_id=batch_id)
+
+        self._logger.info(f"Enqueued {sum(map(len, payloads_by_mode.values()))} batch jobs in batch {batch_id}")
+        return batch_id
+
+    def run_job(self, job: QueuedJob) -> Dict:
+        """
+        Runs a leased job and returns its result, raises when the job failed.
+        """
+        if "file_path" in job.payload:
+            file_path = os.path.join(self._local_repo_path, job.payload["file_path"])
+            code_review_service = self._runtime.code_review_service(local_repo_path=self._local_repo_path)
+            issues = code_review_service.review_file(
+                file_path=file_path, content=self._runtime.file_content_cache.read(file_path)
+            )
+            return {"file_path": job.payload["file_path"], "issues": issues}
+
+        from src.services.batch_service import BatchService
+
+        batch_job = BatchJob.model_validate(job.payload["job"])
+        result = BatchService(local_repo_path=self._local_repo_path, mode=job.mode, runtime=self._runtime).run_job(
+            batch_job
+        )
+
+        if result.status == BatchJobStatus.FAILED:
+            raise QueueJobError(result.error)
+
+        return result.model_dump(mode="json")
+
+    def _send_heartbeats(self, job: QueuedJob, worker_id: str, stop: threading.Event):
+        while not stop.wait(self._heartbeat_seconds):
+            if not self._job_queue.heartbeat(job.id, worker_id):
+                self._logger.warning(f"Lost the lease of job {job.id}, another worker may run it again")
+                return
+
+    def _process(self, job: QueuedJob, worker_id: str):
+        self._logger.info(f"Running {job.mode.value} job {job.id}, attempt {job.attempts}/{job.max_attempts}")
+        # The checkout may have changed since the previous job, e.g. written by a code job or pulled
+        self._invalidate_changed_imports()
+        stop = threading.Event()
+        heartbeat_thread = threading.Thread(
+            target=self._send_heartbeats, args=(job, worker_id, stop), name=f"heartbeat-{job.id}", daemon=True
+        )
+        heartbeat_thread.start()
+
+        try:
+            result = self.run_job(job)
+        except Exception as e:
+            # The job is retried by this worker or another one, the worker keeps going
+            self._logger.exception(f"Job {job.id} failed")
+            self._job_queue.fail(job, worker_id, f"{type(e).__name__}: {e}")
+            return
+        finally:
+            stop.set()
+            heartbeat_thread.join()
+
+        if not self._job_queue.complete(job.id, worker_id, result):
+            self._logger.warning(f"Lost the lease of job {job.id} before it finished, its result is dropped")
+
+    def run_worker(
+        self, worker_id: Optional[str] = None, max_jobs: Optional[int] = None, exit_when_empty: bool = False
+    ) -> int:
+        """
+        Leases and runs jobs until `max_jobs` ran, forever by default. With `exit_when_empty` the worker stops
+        once no job is queued, jobs waiting for a retry included. Returns the number of jobs run.
+        """
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        jobs_run = 0
+        self._logger.info(f"Worker {worker_id} started")
+
+        while max_jobs is None or jobs_run < max_jobs:
+            job = self._job_queue.lease(worker_id)
+
+            if job is None:
+                if exit_when_empty and not self._job_queue.counts()[QueueJobStatus.QUEUED]:
+                    break
+
+                time.sleep(self._poll_seconds)
+                continue
+
+            self._process(job, worker_id)
+            jobs_run += 1
+
+        return jobs_run
+
+    def wait_for_batch(self, batch_id: str, timeout_seconds: Optional[float] = None) -> Dict[QueueJobStatus, int]:
+        """
+        Waits until every job of the batch succeeded or failed for good, and returns the counts by status.
+        """
+        deadline = time.monotonic() + timeout_seconds if timeout_seconds is not None else None
+
+        while True:
+            counts = self._job_queue.counts(batch_id=batch_id)
+
+            if not counts[QueueJobStatus.QUEUED] and not counts[QueueJobStatus.RUNNING]:
+                return counts
+
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Batch {batch_id} did not finish within {timeout_seconds} seconds: {counts}")
+
+            time.sleep(self._poll_seconds)
+
+    def collect_reviews(self, batch_id: str, issue_store: IssueStore) -> Tuple[int, int]:
+        """
+        Adds the issues found by the review jobs of a batch to the issue store, as one run, keyed by the
+        full path of the files in this repository. Returns the number of issues and of new issues.
+        """
+        run_id = issue_store.start_run()
+        issues_found = new_issues = 0
+
+        for row in self._job_queue.jobs(batch_id=batch_id, status=QueueJobStatus.SUCCEEDED):
+            if row["mode"] != BatchMode.REVIEW.value or "issues" not in row["result"]:
+                continue
+
+            issues = row["result"]["issues"]
+            file_path = os.path.join(self._local_repo_path, row["result"]["file_path"])
+            issues_found += len(issues)
+            new_issues += issue_store.add_issues(run_id=run_id, file_path=file_path, issues=issues)
+
+        issue_store.finish_run(run_id)
+        return issues_found, new_issues
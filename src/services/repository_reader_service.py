@@ -1,11 +1,42 @@
 import logging
 import os
-from typing import Dict, List
+from functools import lru_cache
+from typing import Callable, Dict, List, Mapping, Optional, Union
 
-import pathspec
-from pathspec import PathSpec
+from src.lib.import_graph import get_import_graph
+from src.lib.lazy_file_contents import LazyFileContents
+from src.lib.llm_client import LlMClient, llm_client_factory
+from src.lib.repository_index import RepositoryIndex
+from src.lib.retrieval_index import RetrievalIndex
+from src.settings import get_cache_dir, get_settings
+from src.types.schema import DependenciesResponse
 
-from src.lib.llm_client import llm_client_factory
+
+@lru_cache()
+def _get_repository_index(directory: str) -> RepositoryIndex:
+    return RepositoryIndex(
+        directory=directory,
+        db_path=os.path.join(get_cache_dir(directory), "repository_index.sqlite"),
+        excluded_folders=RepositoryReaderService.EXCLUDED_FOLDERS,
+        max_file_bytes=get_settings().max_file_bytes,
+    )
+
+
+def get_repository_index(directory: str) -> RepositoryIndex:
+    return _get_repository_index(os.path.abspath(directory))
+
+
+@lru_cache()
+def _get_retrieval_index(directory: str) -> RetrievalIndex:
+    return RetrievalIndex(
+        repository_index=get_repository_index(directory),
+        db_path=os.path.join(get_cache_dir(directory), "retrieval_index.sqlite"),
+        chunk_tokens=get_settings().retrieval_chunk_tokens,
+    )
+
+
+def get_retrieval_index(directory: str) -> RetrievalIndex:
+    return _get_retrieval_index(os.path.abspath(directory))
 
 
 class RepositoryReaderService:
@@ -15,71 +46,93 @@ class RepositoryReaderService:
         "venv",
         "__pycache__",
         "node_modules",
+        ".ohad_cache",
     ]
 
-    def __init__(self):
+    def __init__(self, llm_client_factory: Callable[[], LlMClient] = llm_client_factory):
         self._logger = logging.getLogger(__name__)
-        self._llm_client = llm_client_factory()
+        # Python dependencies are found without the llm, so the client is only built for other languages
+        self._llm_client_factory = llm_client_factory
 
-    @staticmethod
-    def _read_gitignore_spec(gitignore_path: str) -> PathSpec:
-        with open(gitignore_path, "r") as file:
-            gitignore_patterns = file.read()
+    # a function that returns a mapping of all files under a directory with their content.
+    # the key is the absolute path of the file and the value is the content of the file.
+    # the content is read lazily on access, binary, minified, oversized and lock files are skipped.
+    def read_files(
+        self,
+        directory: str,
+        include_files: List[str] = None,
+        include_glob: Optional[Union[str, List[str]]] = None,
+    ) -> Mapping[str, str]:
+        # The index only re-hashes the files that changed since the last run,
+        # the file selection is answered from the index instead of walking the tree again.
+        repository_index = get_repository_index(directory)
+        repository_index.refresh()
+
+        return LazyFileContents(
+            file_paths=repository_index.query(include_files=include_files, include_glob=include_glob)
+        )
 
-        # Compile the patterns into a PathSpec object
-        spec = pathspec.PathSpec.from_lines('gitwildmatch', gitignore_patterns.splitlines())
+    def select_relevant_files(
+        self, directory: str, query: str, top_k: Optional[int] = None, excerpts: bool = False
+    ) -> Mapping[str, str]:
+        """
+        Selects the files of the chunks most relevant to the query, most relevant first.
+        With excerpts only the relevant chunks of every file are returned, each marked with its lines,
+        otherwise the whole files are returned.
+        """
+        settings = get_settings()
+        retrieval_index = get_retrieval_index(directory)
+        retrieval_index.refresh()
+        retrieved_chunks = retrieval_index.search(
+            query=query, top_k=top_k or settings.retrieval_top_k, use_vectors=settings.retrieval_use_vectors
+        )
 
-        return spec
+        chunks_by_path: Dict[str, list] = {}
+        for retrieved_chunk in retrieved_chunks:
+            chunks_by_path.setdefault(retrieved_chunk.path, []).append(retrieved_chunk)
 
+        self._logger.info(f"Selected {len(retrieved_chunks)} chunks of {len(chunks_by_path)} files for: {query}")
 
-    # a function that returns a dict of all files under a directory with their content.
-    # the key is the absolute path of the file and the value is the content of the file.
-    def read_files(
-        self, directory: str, include_files: List[str] = None
-    ) -> Dict[str, str]:
-        # Read .gitignore file if it exists
-        if os.path.exists(os.path.join(directory, ".gitignore")):
-            gitignore_spec = self._read_gitignore_spec(os.path.join(directory, ".gitignore"))
-        else:
-            gitignore_spec = None
-
-        file_contents = {}
-
-        # Walk through the directory tree
-        for root, _, files in os.walk(directory):
-            # Skip excluded folders
-            if any(folder in root for folder in self.EXCLUDED_FOLDERS):
-                continue
+        if not excerpts:
+            return LazyFileContents(file_paths=list(chunks_by_path))
 
-            for file_name in files:
-                if include_files and file_name not in include_files:
-                    continue
+        file_path_to_content = {}
+        for file_path, file_chunks in chunks_by_path.items():
+            try:
+                with open(file_path, "r", errors="replace") as f:
+                    lines = f.read().splitlines()
+            except OSError as e:
+                self._logger.warning(f"Failed to read {file_path}: {e}")
+                continue
 
-                if gitignore_spec and gitignore_spec.match_file(os.path.relpath(os.path.join(root, file_name), start=directory)):
-                    continue
+            file_path_to_content[file_path] = "\n".join(
+                f"# Lines {file_chunk.start_line}-{file_chunk.end_line}:\n"
+                + "\n".join(lines[file_chunk.start_line - 1:file_chunk.end_line])
+                for file_chunk in sorted(file_chunks, key=lambda file_chunk: file_chunk.start_line)
+            )
 
-                file_path = os.path.join(root, file_name)
+        return file_path_to_content
 
-                try:
-                    with open(file_path, "r", encoding="utf-8") as file:
-                        content = file.read()
-                        file_contents[file_path] = content
-                except Exception as e:
-                    print(f"Failed to read {file_path}: {e}")
+    def find_dependencies_by_file(self, file_path: str, local_repo_path: str) -> List[str]:
+        self._logger.info(f"Finding dependencies for the file {file_path} in the repository {local_repo_path}")
 
-        return file_contents
+        # Python imports are resolved statically from the import graph of the repository,
+        # the llm is only used for languages we can not parse locally.
+        if file_path.endswith(".py"):
+            return get_import_graph(local_repo_path).dependencies_of(file_path)
 
-    def find_dependencies_by_file(self, file_path: str, local_repo_path: str):
-        self._logger.info(f"Finding dependencies for the file {file_path} in the repository {local_repo_path}")
+        return self._find_dependencies_by_file_using_llm(file_path=file_path, local_repo_path=local_repo_path)
 
+    def _find_dependencies_by_file_using_llm(self, file_path: str, local_repo_path: str) -> List[str]:
         # Read the content of the file
         with open(file_path, "r") as file:
             code = file.read()
 
         # Find dependencies for the code
         # Ask the LLM to find dependencies for the code
-        dependencies = self._llm_client.send_message_expecting_json_response(
-            f"""
+        dependencies = self._llm_client_factory().send_message_expecting_json_response(
+            response_model=DependenciesResponse,
+            message=f"""
             You are a senior software engineer at a tech company.
             Based on the code I showed you previously, please find all the dependencies.
             
@@ -116,4 +169,4 @@ class RepositoryReaderService:
             """
         )
 
-        return dependencies
\ No newline at end of file
+        return dependencies.dependencies
\ No newline at end of file
@@ -1,4 +1,11 @@
+import hashlib
+import os
+from typing import List, Optional
+
 from pydantic_settings import BaseSettings
+
+from src.types.enums import CodeEditFormat, MemoryPolicy
+from src.types.schema import LlmEndpoint
 from functools import lru_cache
 
 
@@ -7,8 +14,64 @@ class Settings(BaseSettings):
     openai_api_key: str
     gpt_model: str
     repo_path: str
+    review_workers: int = 4
+    review_chunk_tokens: int = 6000
+    review_chunk_workers: int = 4
+    # Only review the files that changed, or whose dependencies changed, since the last Bug Finder run
+    review_incremental: bool = True
+    # Send the dependencies of a reviewed file as signatures and docstrings only, the file itself is sent whole
+    review_dependency_skeletons: bool = True
+    file_content_cache_max_bytes: int = 64 * 1024 * 1024
+    llm_max_connections: int = 32
+    llm_keepalive_expiry_seconds: float = 30.0
+    llm_http2: bool = True
+    llm_stream_usage: bool = True
+    llm_telemetry_dir: Optional[str] = None
+    # A JSON list of endpoints, when set the requests are spread across them instead of OPENAI_BASE_URL
+    llm_endpoints: List[LlmEndpoint] = []
+    llm_pool_max_attempts: int = 6
+    llm_pool_backoff_base_seconds: float = 0.5
+    llm_pool_backoff_max_seconds: float = 30.0
+    llm_structured_output: bool = False
+    llm_memory_max_tokens: Optional[int] = None
+    llm_memory_policy: MemoryPolicy = MemoryPolicy.SLIDING_WINDOW
+    code_edit_format: CodeEditFormat = CodeEditFormat.WHOLE
+    # More than one candidate generates them in parallel and writes the first one that passes the validation
+    code_candidates: int = 1
+    code_candidates_test_command: Optional[str] = None
+    code_candidates_test_timeout_seconds: float = 600
+    code_candidates_temperature: Optional[float] = None
+    context_token_budget: int = 24000
+    context_max_message_tokens: int = 4000
+    cache_dir: Optional[str] = None
+    max_file_bytes: int = 1024 * 1024
+    retrieval_top_k: int = 40
+    retrieval_chunk_tokens: int = 300
+    retrieval_use_vectors: bool = True
+    llm_cache_enabled: bool = False
+    llm_cache_max_bytes: int = 256 * 1024 * 1024
+    llm_cache_max_age_seconds: Optional[int] = 7 * 24 * 60 * 60
+    # The job queue of the distributed workers, a postgresql:// url, or a sqlite:/// url to run locally
+    database_url: Optional[str] = None
+    queue_lease_seconds: float = 300
+    queue_heartbeat_seconds: float = 30
+    queue_max_attempts: int = 3
+    queue_retry_backoff_seconds: float = 10
+    queue_poll_seconds: float = 2
 
 
 @lru_cache()
 def get_settings():
     return Settings()
+
+
+def get_cache_dir(local_repo_path: Optional[str] = None) -> str:
+    settings = get_settings()
+    local_repo_path = os.path.abspath(local_repo_path or settings.repo_path)
+
+    if settings.cache_dir:
+        # A shared cache dir holds one sub directory per repository
+        repo_key = hashlib.sha256(local_repo_path.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(settings.cache_dir, repo_key)
+
+    return os.path.join(local_repo_path, ".ohad_cache")
@@ -5,3 +5,39 @@ class CodedFileAction(enum.Enum):
     CREATE = "CREATE"
     UPDATE = "UPDATE"
     DELETE = "DELETE"
+
+
+class FileKind(enum.Enum):
+    TEXT = "TEXT"
+    BINARY = "BINARY"
+    MINIFIED = "MINIFIED"
+    OVERSIZED = "OVERSIZED"
+    LOCKFILE = "LOCKFILE"
+
+
+class MemoryPolicy(enum.Enum):
+    SLIDING_WINDOW = "SLIDING_WINDOW"
+    SUMMARIZE = "SUMMARIZE"
+
+
+class CodeEditFormat(enum.Enum):
+    WHOLE = "WHOLE"
+    SEARCH_REPLACE = "SEARCH_REPLACE"
+    UDIFF = "UDIFF"
+
+
+class BatchMode(enum.Enum):
+    CODE = "CODE"
+    REVIEW = "REVIEW"
+
+
+class BatchJobStatus(enum.Enum):
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+
+class QueueJobStatus(enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from typing import Any, List, Optional
 
-from src.types.enums import CodedFileAction
+from pydantic import AliasChoices, BaseModel, Field, model_validator
+
+from src.types.enums import BatchJobStatus, BatchMode, CodedFileAction
 
 
 class LlmMessage(BaseModel):
@@ -8,7 +10,80 @@ class LlmMessage(BaseModel):
     content: str
 
 
+class LlmEndpoint(BaseModel):
+    base_url: str
+    api_key: str
+    model: str
+    # The limits of the key, no limit is enforced when not set
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+
+
 class CodedFileResponse(BaseModel):
     file_path: str
-    content: str
+    content: str = ""
     action: CodedFileAction
+    # Search/replace blocks or a unified diff, used by UPDATE actions instead of the full content
+    patch: Optional[str] = None
+
+
+class CodedFilesResponse(BaseModel):
+    files: List[CodedFileResponse]
+
+
+class CodeReviewIssue(BaseModel):
+    explanation: str
+    # Named fix_suggestion by the first review prompt, replies and cached responses with that name are accepted
+    suggestion: str = Field(validation_alias=AliasChoices("suggestion", "fix_suggestion"))
+    # The lines of the file the issue is about, asked for when a part of a file is reviewed
+    line_start: Optional[int] = None
+    line_end: Optional[int] = None
+    # One of low, medium, high and critical
+    severity: Optional[str] = None
+
+
+class CodeReviewResponse(BaseModel):
+    issues: List[CodeReviewIssue]
+
+
+class DependenciesResponse(BaseModel):
+    dependencies: List[str]
+
+
+class BatchJob(BaseModel):
+    job_id: str
+    task: str = ""
+    # The mode, include files and globs of the batch are used when the job does not set them
+    mode: Optional[BatchMode] = None
+    include_files: Optional[List[str]] = None
+    include_glob: Optional[List[str]] = None
+    # Select the files relevant to the task with the retrieval index instead of reading the included files
+    auto_select: Optional[bool] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_request(cls, data: Any) -> Any:
+        # Backlog entries ({"request_id", "title", "body"}) are accepted as code jobs
+        if isinstance(data, dict) and "job_id" not in data and "request_id" in data:
+            data = {
+                **data,
+                "job_id": data["request_id"],
+                "task": data.get("task") or "\n\n".join(filter(None, [data.get("title"), data.get("body")])),
+            }
+
+        if isinstance(data, dict) and isinstance(data.get("include_glob"), str):
+            data = {**data, "include_glob": [data["include_glob"]]}
+
+        return data
+
+
+class BatchJobResult(BaseModel):
+    job_id: str
+    mode: BatchMode
+    status: BatchJobStatus
+    duration_seconds: float
+    error: Optional[str] = None
+    files_written: List[str] = []
+    issues_found: int = 0
+    # The issues found that no previous review run had found
+    new_issues: int = 0
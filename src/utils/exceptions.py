@@ -1,2 +1,26 @@
 class BadLlmResponseError(Exception):
     pass
+
+
+class UnrecoverableJsonStreamError(BadLlmResponseError):
+    pass
+
+
+class PatchApplyError(Exception):
+    pass
+
+
+class CandidateValidationError(Exception):
+    pass
+
+
+class GenerationCancelledError(Exception):
+    pass
+
+
+class QueueJobError(Exception):
+    pass
+
+
+class StoreSchemaError(Exception):
+    pass
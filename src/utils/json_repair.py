@@ -0,0 +1,78 @@
+import json
+from typing import Any
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def repair_json(text: str) -> str:
+    """
+    A cheap local repair pass for almost valid json from an llm, used before paying for a resend.
+    It drops the text around the json value, escapes raw control characters in strings and
+    removes trailing commas. A truncated response is not completed, since that would silently
+    drop the end of a file content, it is left for a resend.
+    """
+    starts = [idx for idx in (text.find("["), text.find("{")) if idx != -1]
+    if not starts:
+        return text
+
+    text = text[min(starts):]
+    repaired = []
+    stack = []
+    in_string = False
+    escaped = False
+
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            elif char == "\t":
+                char = "\\t"
+            elif char == "\r":
+                char = "\\r"
+            repaired.append(char)
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in "}]":
+            if not stack or stack[-1] != char:
+                # A closer that does not match anything, the rest is not part of the json value
+                break
+
+            # Drop a trailing comma before the closer
+            while repaired and repaired[-1] in " \t\r\n":
+                repaired.pop()
+            if repaired and repaired[-1] == ",":
+                repaired.pop()
+
+            stack.pop()
+            repaired.append(char)
+
+            if not stack:
+                break
+            continue
+
+        repaired.append(char)
+
+    if in_string or stack:
+        return text
+
+    return "".join(repaired)
+
+
+def loads_with_repair(text: str) -> Any:
+    """
+    Parses json, falling back to the local repair pass. Raises json.JSONDecodeError if both fail.
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(repair_json(text))
@@ -0,0 +1,28 @@
+import re
+from typing import List
+
+# A rough but stable estimation, most BPE tokenizers average around 4 characters per token on code
+CHARS_PER_TOKEN = 4
+
+_IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CAMEL_CASE_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_identifiers(text: str, min_length: int = 3) -> List[str]:
+    """
+    Splits the identifiers of a text into lowercase terms, snake_case and camelCase words are split
+    into their parts, e.g. "readFiles" and "read_files" both give ["read", "files"].
+    """
+    terms = []
+
+    for identifier in _IDENTIFIER_PATTERN.findall(text):
+        for part in identifier.split("_"):
+            for word in _CAMEL_CASE_PATTERN.findall(part):
+                if len(word) >= min_length:
+                    terms.append(word.lower())
+
+    return terms
@@ -0,0 +1,58 @@
+import itertools
+import os
+import threading
+from datetime import datetime, timedelta
+
+from src.lib.llm_client.llm_client import LlMClient
+from src.types.schema import LlmMessage
+
+
+def write_file(root, relative_path, content):
+    path = os.path.join(root, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+class FakeClock:
+    """
+    A clock that only moves when told to. It counts seconds, or is a datetime when it starts from one.
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += timedelta(seconds=seconds) if isinstance(self.now, datetime) else seconds
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.advance(seconds)
+
+
+class ScriptedLlMClient(LlMClient):
+    """
+    Answers the requests of all its forks from the same script, in the order of the requests.
+    """
+
+    def __init__(self, replies, **kwargs):
+        super().__init__(**kwargs)
+        self._replies = iter(replies)
+        self._lock = threading.Lock()
+
+    def _send_message_implementation_specific_logic(self, message: LlmMessage, **kwargs) -> LlmMessage:
+        with self._lock:
+            return LlmMessage(role="assistant", content=next(self._replies))
+
+
+class MockLlMClient(ScriptedLlMClient):
+    """
+    Answers every request with the same reply.
+    """
+
+    def __init__(self, reply: str = "Response to the message", **kwargs):
+        super().__init__(itertools.repeat(reply), **kwargs)
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+from openai import AsyncOpenAI
+
+from benchmarks.fake_openai_server import FakeOpenAiServer
+from src.lib.llm_client import async_openai_llm_client, http_client_options as http_client_options_module
+from src.lib.llm_client.async_openai_llm_client import (
+    AsyncOpenAiLlMClient,
+    close_shared_async_openai_client,
+    get_shared_async_openai_client,
+)
+from src.lib.llm_client.http_client_options import http_client_options
+from src.lib.llm_client.structured_output import response_format_for
+from src.lib.llm_client.telemetry import LlmTelemetry
+from src.types.schema import CodeReviewResponse
+
+
+def make_client(server: FakeOpenAiServer, **kwargs) -> AsyncOpenAiLlMClient:
+    return AsyncOpenAiLlMClient(
+        openai_client=AsyncOpenAI(base_url=server.base_url, api_key="test", max_retries=0),
+        model="fake-model",
+        **kwargs,
+    )
+
+
+class TestAsyncOpenAiLlMClient:
+    def test_send_message_streams_reply_and_updates_memory(self):
+        with FakeOpenAiServer(responder=lambda request: "Hello from the fake server") as server:
+            client = make_client(server)
+
+            async def run():
+                await client.send_message("context", add_to_memory_without_response=True)
+                return await client.send_message("Hello!")
+
+            assert asyncio.run(run()) == "Hello from the fake server"
+            assert len(client._memory) == 3
+            assert [message["content"] for message in server.requests[0]["messages"]] == ["context", "Hello!"]
+
+    def test_concurrent_conversations_have_isolated_memory(self):
+        def responder(request):
+            return f"echo {request['messages'][-1]['content']}"
+
+        with FakeOpenAiServer(responder=responder) as server:
+            openai_client = AsyncOpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+            clients = [AsyncOpenAiLlMClient(openai_client=openai_client, model="fake-model") for _ in range(20)]
+
+            async def run():
+                return await asyncio.gather(
+                    *(client.send_message(f"message {idx}") for idx, client in enumerate(clients))
+                )
+
+            assert asyncio.run(run()) == [f"echo message {idx}" for idx in range(20)]
+            assert all(len(client._memory) == 2 for client in clients)
+            assert all(len(request["messages"]) == 1 for request in server.requests)
+
+    def test_send_message_expecting_json_response_retries_invalid_json(self):
+        replies = iter(["not json", "```json\n{\"ok\": true}\n```"])
+
+        with FakeOpenAiServer(responder=lambda request: next(replies)) as server:
+            client = make_client(server)
+
+            assert asyncio.run(client.send_message_expecting_json_response("json please")) == {"ok": True}
+            assert len(server.requests) == 2
+            assert len(client._memory) == 2
+
+    def test_send_message_expecting_json_response_gives_up(self):
+        with FakeOpenAiServer(responder=lambda request: "not json") as server:
+            client = make_client(server)
+
+            with pytest.raises(json.JSONDecodeError):
+                asyncio.run(client.send_message_expecting_json_response("json please", num_attempts=2))
+
+            assert len(server.requests) == 3
+
+    def test_response_model_with_structured_output_and_local_repair(self):
+        replies = iter(['Sure! [{"explanation": "e", "suggestion": "s",}]'])
+
+        with FakeOpenAiServer(responder=lambda request: next(replies)) as server:
+            client = make_client(server, structured_output=True)
+
+            response = asyncio.run(
+                client.send_message_expecting_json_response("review", response_model=CodeReviewResponse)
+            )
+
+            assert [issue.explanation for issue in response.issues] == ["e"]
+            assert len(server.requests) == 1
+            assert server.requests[0]["response_format"] == response_format_for(CodeReviewResponse)
+            assert (client.json_response_stats.repaired, client.json_response_stats.retries) == (1, 0)
+
+    def test_calls_and_retries_are_recorded_in_telemetry(self):
+        replies = iter(["not json", "{}"])
+        telemetry = LlmTelemetry()
+
+        with FakeOpenAiServer(responder=lambda request: next(replies)) as server:
+            client = make_client(server, telemetry=telemetry)
+
+            assert asyncio.run(client.send_message_expecting_json_response("json please")) == {}
+
+        assert [call_record.retries for call_record in telemetry.records] == [0, 1]
+        assert all(not call_record.tokens_estimated for call_record in telemetry.records)
+        assert all(call_record.time_to_first_token_seconds is not None for call_record in telemetry.records)
+        assert client.json_response_stats.retry_rate == 0.5
+
+
+@pytest.fixture
+def llm_settings(monkeypatch):
+    settings = SimpleNamespace(
+        openai_base_url="http://localhost:1",
+        openai_api_key="test",
+        llm_http2=True,
+        llm_max_connections=4,
+        llm_keepalive_expiry_seconds=5.0,
+    )
+    monkeypatch.setattr(async_openai_llm_client, "get_settings", lambda: settings)
+    monkeypatch.setattr(http_client_options_module, "get_settings", lambda: settings)
+    return settings
+
+
+class TestSharedAsyncOpenAiClient:
+    def test_the_clients_of_a_loop_share_one_client_until_it_is_closed(self, llm_settings):
+        async def run():
+            openai_client = get_shared_async_openai_client()
+            assert get_shared_async_openai_client() is openai_client
+
+            await close_shared_async_openai_client()
+            assert openai_client.is_closed()
+            assert get_shared_async_openai_client() is not openai_client
+            await close_shared_async_openai_client()
+
+        asyncio.run(run())
+
+    def test_http_client_options_follow_the_settings(self, llm_settings, monkeypatch, caplog):
+        monkeypatch.setattr(http_client_options_module, "is_http2_available", lambda: False)
+
+        with caplog.at_level(logging.WARNING):
+            options = http_client_options()
+
+        assert options["http2"] is False
+        assert "h2 package is not installed" in caplog.text
+        assert (options["limits"].max_connections, options["limits"].keepalive_expiry) == (4, 5.0)
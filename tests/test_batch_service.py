@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from src.services.batch_service import BatchService, load_jobs
+from src.types.enums import BatchJobStatus, BatchMode
+from src.types.schema import BatchJob
+
+
+class FakeBatchService(BatchService):
+    def _run_code_job(self, job, result):
+        if job.task == "fail":
+            raise RuntimeError("the llm is down")
+        result.files_written = [f"{job.job_id}.py"]
+
+    def _run_review_job(self, job, result):
+        result.issues_found = 2
+
+
+class TestLoadJobs:
+    def test_jobs_and_backlog_entries(self, tmp_path):
+        jobs_path = tmp_path / "jobs.jsonl"
+        jobs_path.write_text(
+            '{"job_id": "a", "task": "Add a flag", "mode": "REVIEW", "include_glob": "src/**"}\n'
+            "\n"
+            '{"request_id": "user-001", "title": "Title", "body": "Body"}\n'
+        )
+
+        review_job, code_job = load_jobs(str(jobs_path))
+
+        assert review_job.mode == BatchMode.REVIEW
+        assert review_job.include_glob == ["src/**"]
+        assert code_job.job_id == "user-001"
+        assert code_job.task == "Title\n\nBody"
+        assert code_job.mode is None
+
+    def test_invalid_line_is_reported(self, tmp_path):
+        jobs_path = tmp_path / "jobs.jsonl"
+        jobs_path.write_text('{"job_id": "a"}\nnot json\n')
+
+        with pytest.raises(ValueError, match="line 2"):
+            load_jobs(str(jobs_path))
+
+
+class TestBatchService:
+    def test_failed_jobs_do_not_stop_the_batch(self, tmp_path):
+        jobs = [
+            BatchJob(job_id="a", task="ok"),
+            BatchJob(job_id="b", task="fail"),
+            BatchJob(job_id="c", task="ok", mode=BatchMode.REVIEW),
+        ]
+        results_path, summary_path = tmp_path / "results.jsonl", tmp_path / "summary.json"
+
+        summary = FakeBatchService(local_repo_path=str(tmp_path), concurrency=3).run_to_files(
+            jobs=jobs, results_path=str(results_path), summary_path=str(summary_path)
+        )
+
+        results = {
+            result["job_id"]: result for result in map(json.loads, results_path.read_text().splitlines())
+        }
+        assert results["a"]["files_written"] == ["a.py"]
+        assert results["b"]["status"] == BatchJobStatus.FAILED.value
+        assert "the llm is down" in results["b"]["error"]
+        assert results["c"]["mode"] == BatchMode.REVIEW.value
+        assert summary["succeeded"] == 2
+        assert summary["failed"] == ["b"]
+        assert summary["issues_found"] == 2
+        assert json.loads(summary_path.read_text())["jobs"] == 3
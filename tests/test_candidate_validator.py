@@ -0,0 +1,187 @@
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.lib.candidate_validator import validate_candidate
+from src.lib.llm_client.llm_client import LlMClient
+from src.services import coding_service as coding_service_module
+from src.services.coding_service import CodingService
+from src.types.enums import CodeEditFormat
+from src.types.schema import LlmMessage
+from src.utils.exceptions import CandidateValidationError
+
+from conftest import ScriptedLlMClient
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo_path = tmp_path / "repo"
+    (repo_path / "pkg").mkdir(parents=True)
+    (repo_path / "pkg" / "module.py").write_text("VALUE = 1\n")
+    return repo_path
+
+
+class TestValidateCandidate:
+    def test_valid_candidate(self, repo):
+        validation = validate_candidate(
+            str(repo),
+            [
+                {"file_path": "pkg/module.py", "content": "VALUE = 2\n", "action": "UPDATE"},
+                {"file_path": str(repo / "pkg" / "new.py"), "content": "def f():\n    return 1\n", "action": "CREATE"},
+            ],
+        )
+
+        assert validation.passed, validation.errors
+
+    def test_invalid_candidates(self, repo):
+        validation = validate_candidate(
+            str(repo),
+            [
+                {"file_path": "../outside.py", "content": "", "action": "CREATE"},
+                {"file_path": "pkg/missing.py", "content": "X = 1\n", "action": "UPDATE"},
+                {"file_path": "pkg/broken.py", "content": "def f(:\n", "action": "CREATE"},
+                {"file_path": "pkg/module.py", "action": "UPDATE", "patch": "<<<<<<< SEARCH\nNOPE\n=======\nX\n>>>>>>> REPLACE\n"},
+            ],
+        )
+
+        assert len(validation.errors) == 4
+        assert "outside of the repository" in validation.errors[0]
+        assert "does not exist" in validation.errors[1]
+        assert "not valid python" in validation.errors[2]
+        assert "does not apply" in validation.errors[3]
+        assert (repo / "pkg" / "module.py").read_text() == "VALUE = 1\n"
+
+    def test_test_command_runs_in_a_copy_with_the_candidate(self, repo):
+        test_command = f'{sys.executable} -c "import pkg.module; assert pkg.module.VALUE == 2"'
+        candidate = [{"file_path": "pkg/module.py", "content": "VALUE = 2\n", "action": "UPDATE"}]
+
+        assert validate_candidate(str(repo), candidate, test_command=test_command).passed
+        assert not validate_candidate(str(repo), [], test_command=test_command).passed
+        assert (repo / "pkg" / "module.py").read_text() == "VALUE = 1\n"
+
+
+class EndlessLlMClient(LlMClient):
+    """
+    The first request answers a valid candidate, the other ones stream forever until they are aborted.
+    """
+
+    def __init__(self, reply: str):
+        super().__init__()
+        self._reply = reply
+        # Shared by the forks, which are shallow copies
+        self._calls = itertools.count()
+        self.aborted = threading.Semaphore(0)
+
+    def _send_message_implementation_specific_logic(self, message: LlmMessage, **kwargs) -> LlmMessage:
+        raise NotImplementedError
+
+    def _stream_message_implementation_specific_logic(self, message: LlmMessage, **kwargs):
+        if next(self._calls) == 0:
+            yield self._reply
+            return
+
+        try:
+            yield '[{"file_path": "pkg/module.py", "action": "UPDATE", "content": "'
+            while True:
+                time.sleep(0.01)
+                yield "x"
+        finally:
+            self.aborted.release()
+
+
+def is_running(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            # A killed process nobody reaped yet is a zombie
+            return "\tZ" not in next(line for line in f if line.startswith("State:"))
+    except FileNotFoundError:
+        return False
+
+
+class TestCodeFeatureCandidates:
+    def test_first_valid_candidate_is_returned(self, repo, monkeypatch):
+        monkeypatch.setattr(
+            coding_service_module, "get_settings", lambda: SimpleNamespace(code_edit_format=CodeEditFormat.WHOLE)
+        )
+        broken = [{"file_path": "pkg/module.py", "content": "VALUE = (\n", "action": "UPDATE"}]
+        valid = [{"file_path": "pkg/module.py", "content": "VALUE = 2\n", "action": "UPDATE"}]
+        llm_client = ScriptedLlMClient([json.dumps(broken), json.dumps(broken), json.dumps(valid)])
+        service = CodingService(llm_client=llm_client, repo_reader_service=SimpleNamespace())
+
+        coded_files = service.code_feature_candidates(task="Bump the value", local_repo_path=str(repo), num_candidates=3)
+
+        assert [coded_file.content for coded_file in coded_files] == ["VALUE = 2\n"]
+        assert (repo / "pkg" / "module.py").read_text() == "VALUE = 1\n"
+        # The conversation continues from the chosen candidate
+        assert len(service._llm_client._memory) == 2 and len(llm_client._memory) == 0
+
+    def test_no_valid_candidate(self, repo, monkeypatch):
+        monkeypatch.setattr(
+            coding_service_module, "get_settings", lambda: SimpleNamespace(code_edit_format=CodeEditFormat.WHOLE)
+        )
+        broken = json.dumps([{"file_path": "pkg/gone.py", "action": "DELETE"}])
+        service = CodingService(llm_client=ScriptedLlMClient([broken, broken]), repo_reader_service=SimpleNamespace())
+
+        with pytest.raises(CandidateValidationError, match="None of the 2 candidates"):
+            service.code_feature_candidates(task="Delete", local_repo_path=str(repo), num_candidates=2)
+
+    def test_other_candidates_are_cancelled_once_one_is_chosen(self, repo, monkeypatch):
+        monkeypatch.setattr(
+            coding_service_module, "get_settings", lambda: SimpleNamespace(code_edit_format=CodeEditFormat.WHOLE)
+        )
+        valid = [{"file_path": "pkg/module.py", "content": "VALUE = 2\n", "action": "UPDATE"}]
+        llm_client = EndlessLlMClient(json.dumps(valid))
+        service = CodingService(llm_client=llm_client, repo_reader_service=SimpleNamespace())
+
+        coded_files = service.code_feature_candidates(task="Bump the value", local_repo_path=str(repo), num_candidates=3)
+
+        assert [coded_file.content for coded_file in coded_files] == ["VALUE = 2\n"]
+        # Both endless generations are aborted instead of streaming forever
+        assert all(llm_client.aborted.acquire(timeout=5) for _ in range(2))
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Reads the state of the processes from /proc")
+    def test_running_validations_are_killed_once_one_is_chosen(self, repo, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            coding_service_module, "get_settings", lambda: SimpleNamespace(code_edit_format=CodeEditFormat.WHOLE)
+        )
+        # One validation worker per candidate
+        monkeypatch.setattr(os, "cpu_count", lambda: 2)
+        pid_path = tmp_path / "slow.pid"
+        # The slow candidate hangs in its tests, the fast one passes once the slow tests started
+        test_script = (
+            "import os, pathlib, time\n"
+            f"pid_path = pathlib.Path({str(pid_path)!r})\n"
+            "if 'SLOW' in pathlib.Path('pkg/module.py').read_text():\n"
+            "    pid_path.write_text(str(os.getpid()))\n"
+            "    time.sleep(60)\n"
+            "while not pid_path.exists():\n"
+            "    time.sleep(0.01)\n"
+        )
+        (tmp_path / "run_tests.py").write_text(test_script)
+        slow = [{"file_path": "pkg/module.py", "content": "SLOW = True\n", "action": "UPDATE"}]
+        fast = [{"file_path": "pkg/module.py", "content": "VALUE = 2\n", "action": "UPDATE"}]
+        service = CodingService(
+            llm_client=ScriptedLlMClient([json.dumps(slow), json.dumps(fast)]), repo_reader_service=SimpleNamespace()
+        )
+
+        started_at = time.monotonic()
+        coded_files = service.code_feature_candidates(
+            task="Bump the value",
+            local_repo_path=str(repo),
+            num_candidates=2,
+            test_command=f"{sys.executable} {tmp_path / 'run_tests.py'}",
+        )
+
+        assert [coded_file.content for coded_file in coded_files] == ["VALUE = 2\n"]
+        assert time.monotonic() - started_at < 30
+        slow_pid = int(pid_path.read_text())
+        deadline = time.monotonic() + 10
+        while is_running(slow_pid) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not is_running(slow_pid)
@@ -0,0 +1,97 @@
+from src.lib.code_chunker import build_header, chunk_source, number_lines
+
+SOURCE = '''import os
+from typing import List
+
+LIMIT = 10
+
+
+def first(value: int) -> int:
+    return value + 1
+
+
+@staticmethod
+def second(values: List[int]):
+    total = 0
+    for value in values:
+        total += value
+    return total
+
+
+class Service:
+    """A service."""
+
+    def __init__(self, path: str):
+        self._path = path
+
+    def run(self) -> str:
+        return os.path.abspath(self._path)
+'''
+
+
+def function_source(idx: int) -> str:
+    return f"def function_{idx}(value):\n" + "".join(f"    value += {line}\n" for line in range(20)) + "    return value\n"
+
+
+class TestChunkSource:
+    def test_chunks_cover_every_line_once(self):
+        source = "\n\n".join(function_source(idx) for idx in range(10))
+        chunks = chunk_source(source, max_tokens=200)
+        lines = source.splitlines()
+
+        assert len(chunks) > 1
+        assert chunks[0].start_line == 1 and chunks[-1].end_line == len(lines)
+        assert all(chunk.start_line == previous.end_line + 1 for previous, chunk in zip(chunks, chunks[1:]))
+        assert "\n".join(chunk.content for chunk in chunks) == "\n".join(lines)
+
+    def test_functions_are_not_split(self):
+        source = "\n\n".join(function_source(idx) for idx in range(10))
+
+        for chunk in chunk_source(source, max_tokens=200):
+            assert chunk.content.count("def ") == chunk.content.count("return value")
+
+    def test_small_definitions_are_packed_together(self):
+        [chunk] = chunk_source(SOURCE, max_tokens=1000)
+
+        assert chunk.names == ["first", "second", "Service"]
+
+    def test_large_class_is_split_into_methods(self):
+        methods = "".join(f"    def method_{idx}(self):\n        return {idx}\n\n" for idx in range(40))
+        source = f"class Big:\n{methods}"
+
+        chunks = chunk_source(source, max_tokens=100)
+
+        assert len(chunks) > 1
+        assert "Big.method_0" in chunks[0].names
+        assert chunks[-1].end_line == len(source.splitlines())
+
+    def test_invalid_python_is_split_into_line_windows(self):
+        source = "def broken(:\n" + "x = 1\n" * 200
+
+        chunks = chunk_source(source, max_tokens=50)
+
+        assert len(chunks) > 1
+        assert chunks[-1].end_line == len(source.splitlines())
+
+
+class TestBuildHeader:
+    def test_header_has_imports_globals_and_signatures(self):
+        header = build_header(SOURCE)
+
+        assert "from typing import List" in header
+        assert "LIMIT = 10" in header
+        assert "def first(value: int) -> int: ..." in header
+        assert "    def run(self) -> str: ..." in header
+        assert "total = 0" not in header
+
+    def test_header_is_cut_to_the_budget(self):
+        source = "\n\n".join(function_source(idx) for idx in range(50))
+
+        header = build_header(source, max_tokens=50)
+
+        assert "more definitions" in header
+
+
+class TestNumberLines:
+    def test_lines_are_numbered_from_the_start_line(self):
+        assert number_lines(["a", "b"], start_line=9) == " 9 | a\n10 | b"
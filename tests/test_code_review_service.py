@@ -0,0 +1,229 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from src.lib.code_chunker import CodeChunk
+from src.lib.file_content_cache import FileContentCache
+from src.lib.review_manifest import ReviewManifest
+from src.services import code_review_service as code_review_service_module
+from src.services.code_review_service import CodeReviewService, attribute_issue, merge_issues
+from src.utils.tokens import estimate_tokens
+
+
+def review_key_settings():
+    return SimpleNamespace(context_token_budget=24000, context_max_message_tokens=4000, llm_structured_output=False)
+
+
+class TestReviewFiles:
+    def test_review_files_yields_results_in_input_order(self, monkeypatch):
+        service = CodeReviewService(local_repo_path="/repo", max_workers=4, content_cache=FileContentCache())
+        monkeypatch.setattr(service, "find_dependencies", lambda file_path: [])
+        delays = {"a.py": 0.05, "b.py": 0.0, "c.py": 0.02, "d.py": 0.0}
+
+        def review_file(file_path, content, dependencies=None):
+            time.sleep(delays[file_path])
+            return [{"explanation": content}]
+
+        monkeypatch.setattr(service, "review_file", review_file)
+
+        results = list(service.review_files({path: path.upper() for path in delays}))
+
+        assert [path for path, _ in results] == list(delays)
+        assert results[0][1] == [{"explanation": "A.PY"}]
+
+    def test_review_files_is_bounded_by_max_workers(self, monkeypatch):
+        service = CodeReviewService(local_repo_path="/repo", max_workers=2, content_cache=FileContentCache())
+        monkeypatch.setattr(service, "find_dependencies", lambda file_path: [])
+        lock = threading.Lock()
+        running = {"current": 0, "max": 0}
+
+        def review_file(file_path, content, dependencies=None):
+            with lock:
+                running["current"] += 1
+                running["max"] = max(running["max"], running["current"])
+            time.sleep(0.01)
+            with lock:
+                running["current"] -= 1
+            return []
+
+        monkeypatch.setattr(service, "review_file", review_file)
+        progress = []
+
+        list(
+            service.review_files(
+                {f"{idx}.py": "" for idx in range(8)},
+                on_progress=lambda done, total, path: progress.append((done, total)),
+            )
+        )
+
+        assert running["max"] <= 2
+        assert progress == [(idx + 1, 8) for idx in range(8)]
+
+
+class TestChunkedReview:
+    def test_a_coding_service_is_built_per_chunk_only(self, monkeypatch):
+        monkeypatch.setattr(code_review_service_module, "get_settings", lambda: SimpleNamespace(review_chunk_workers=2))
+        line_ranges = []
+
+        class FakeCodingService:
+            def learn_code(self, **kwargs):
+                pass
+
+            def perform_code_review(self, line_range=None):
+                line_ranges.append(line_range)
+                return []
+
+        factory_calls = []
+
+        def coding_service_factory():
+            factory_calls.append(1)
+            return FakeCodingService()
+
+        service = CodeReviewService(
+            local_repo_path="/repo",
+            max_workers=1,
+            content_cache=FileContentCache(),
+            coding_service_factory=coding_service_factory,
+            dependency_skeletons=False,
+            chunk_tokens=50,
+        )
+        content = "\n\n".join(f"def f_{idx}():\n    return '{'x' * 60}'\n" for idx in range(4))
+
+        assert service.review_file("/repo/big.py", content, dependencies=[]) == []
+        assert len(line_ranges) > 1
+        assert len(factory_calls) == len(line_ranges)
+
+
+class TestMergeIssues:
+    def test_issue_lines_are_kept_inside_the_chunk(self):
+        chunk = CodeChunk(start_line=10, end_line=20, names=["f"], content="")
+
+        assert attribute_issue({"explanation": "a", "suggestion": "b"}, chunk)["line_start"] == 10
+        assert attribute_issue({"explanation": "a", "suggestion": "b", "line_start": 3, "line_end": 90}, chunk) == {
+            "explanation": "a",
+            "suggestion": "b",
+            "line_start": 10,
+            "line_end": 20,
+        }
+
+    def test_duplicate_issues_are_merged_and_sorted_by_line(self):
+        issues = [
+            {"explanation": "Missing input validation", "suggestion": "x", "line_start": 50, "line_end": 52},
+            {"explanation": "The file handle is never closed.", "suggestion": "x", "line_start": 10, "line_end": 12},
+            {"explanation": "The file handle is never closed!", "suggestion": "y", "line_start": 11, "line_end": 11},
+            {"explanation": "missing  input validation", "suggestion": "z", "line_start": 5, "line_end": 5},
+        ]
+
+        merged = merge_issues(issues)
+
+        assert [issue["line_start"] for issue in merged] == [5, 10]
+
+
+class TestDependencyScheduling:
+    def test_reviews_run_in_schedule_order_and_read_dependencies_once(self, tmp_path, monkeypatch):
+        settings_path = str(tmp_path / "settings.py")
+        with open(settings_path, "w") as f:
+            f.write("DEBUG = True\n")
+
+        service = CodeReviewService(
+            local_repo_path=str(tmp_path), max_workers=1, content_cache=FileContentCache(), dependency_skeletons=True
+        )
+        file_dependencies = {"a.py": [], "b.py": [settings_path], "c.py": [], "d.py": [settings_path]}
+        monkeypatch.setattr(service, "find_dependencies", lambda file_path: file_dependencies[file_path])
+        reviewed = []
+
+        def review_file(file_path, content, dependencies=None):
+            service._read_dependencies(file_path, dependencies)
+            reviewed.append(file_path)
+            return []
+
+        monkeypatch.setattr(service, "review_file", review_file)
+
+        results = list(service.review_files({path: "" for path in file_dependencies}))
+
+        assert [path for path, _ in results] == ["a.py", "b.py", "c.py", "d.py"]
+        assert reviewed == ["a.py", "c.py", "b.py", "d.py"]
+        report = service.dependency_reuse_report
+        assert (report.dependency_reads, report.naive_bytes_read, report.bytes_read) == (2, 26, 13)
+        # The tokens are those of the skeleton sent, not of the file read
+        sent_tokens = estimate_tokens(service._read_dependencies("b.py", [settings_path])[settings_path])
+        assert (report.dependency_tokens, report.shared_prefix_tokens) == (2 * sent_tokens, sent_tokens)
+
+    def test_the_dependencies_read_for_the_review_keys_are_reported(self, tmp_path, monkeypatch):
+        settings_path = str(tmp_path / "settings.py")
+        with open(settings_path, "w") as f:
+            f.write("DEBUG = True\n")
+
+        service = CodeReviewService(
+            local_repo_path=str(tmp_path),
+            max_workers=1,
+            content_cache=FileContentCache(),
+            model_name="fake-model",
+            dependency_skeletons=False,
+            chunk_tokens=6000,
+        )
+        monkeypatch.setattr(service, "find_dependencies", lambda file_path: [settings_path])
+        monkeypatch.setattr(service, "review_file", lambda file_path, content, dependencies=None: [])
+        manifest = ReviewManifest(str(tmp_path / "review_manifest.sqlite"))
+        monkeypatch.setattr(code_review_service_module, "get_settings", review_key_settings)
+
+        list(service.review_files({"a.py": "", "b.py": ""}, manifest=manifest))
+
+        assert service.dependency_reuse_report.bytes_read == 13
+
+
+class TestIncrementalReview:
+    def test_only_changed_files_and_their_dependents_are_reviewed(self, tmp_path, monkeypatch):
+        dependency_path = tmp_path / "settings.py"
+        dependency_path.write_text("DEBUG = True\n")
+        manifest = ReviewManifest(str(tmp_path / "ohad_bugs" / "review_manifest.sqlite"))
+        file_dependencies = {"a.py": [], "b.py": [str(dependency_path)], "c.py": []}
+        reviewed = []
+        settings = review_key_settings()
+        monkeypatch.setattr(code_review_service_module, "get_settings", lambda: settings)
+
+        def run(contents, dependency_skeletons=True, chunk_tokens=6000):
+            service = CodeReviewService(
+                local_repo_path=str(tmp_path),
+                max_workers=2,
+                content_cache=FileContentCache(),
+                model_name="fake-model",
+                dependency_skeletons=dependency_skeletons,
+                chunk_tokens=chunk_tokens,
+            )
+            monkeypatch.setattr(service, "find_dependencies", lambda file_path: file_dependencies[file_path])
+
+            def review_file(file_path, content, dependencies=None):
+                reviewed.append(file_path)
+                return [{"explanation": content}]
+
+            monkeypatch.setattr(service, "review_file", review_file)
+            return dict(service.review_files(contents, manifest=manifest))
+
+        run({"a.py": "a", "b.py": "b", "c.py": "c"})
+        reviewed.clear()
+        dependency_path.write_text("DEBUG = False\n")
+
+        results = run({"a.py": "a2", "b.py": "b", "c.py": "c"})
+
+        assert sorted(reviewed) == ["a.py", "b.py"]
+        assert results == {
+            "a.py": [{"explanation": "a2"}],
+            "b.py": [{"explanation": "b"}],
+            "c.py": [{"explanation": "c"}],
+        }
+
+        # The prompts change with the skeletons or the chunk size, so do the reviews
+        reviewed.clear()
+        run({"a.py": "a2", "b.py": "b", "c.py": "c"}, dependency_skeletons=False)
+        assert sorted(reviewed) == ["a.py", "b.py", "c.py"]
+        reviewed.clear()
+        run({"a.py": "a2", "b.py": "b", "c.py": "c"}, dependency_skeletons=False, chunk_tokens=3000)
+        assert sorted(reviewed) == ["a.py", "b.py", "c.py"]
+
+        # So do they with the context budget and the structured output
+        for setting, value in (("context_token_budget", 12000), ("llm_structured_output", True)):
+            reviewed.clear()
+            setattr(settings, setting, value)
+            run({"a.py": "a2", "b.py": "b", "c.py": "c"}, dependency_skeletons=False, chunk_tokens=3000)
+            assert sorted(reviewed) == ["a.py", "b.py", "c.py"]
@@ -0,0 +1,64 @@
+from src.lib.context_packer import TRUNCATION_MARKER, ContextPacker
+from src.utils.tokens import split_identifiers
+
+
+class TestSplitIdentifiers:
+    def test_snake_and_camel_case(self):
+        assert split_identifiers("readFiles(read_files, HTTPClient)") == [
+            "read", "files", "read", "files", "http", "client"
+        ]
+
+
+class TestContextPacker:
+    def test_pinned_first_then_ranked_by_relevance(self):
+        packer = ContextPacker(token_budget=10_000)
+        files = {
+            "/repo/unrelated.py": "def add(a, b):\n    return a + b\n",
+            "/repo/invoices.py": "def render_invoice(invoice):\n    return invoice.total\n",
+            "/repo/reviewed.py": "print('hello')\n",
+        }
+
+        ranked = packer.rank(files, relevance_query="fix the invoice total", pinned_paths=["/repo/reviewed.py"])
+
+        assert ranked == ["/repo/reviewed.py", "/repo/invoices.py", "/repo/unrelated.py"]
+
+    def test_small_files_are_merged_into_few_messages(self):
+        packer = ContextPacker(token_budget=10_000, max_message_tokens=1000)
+        files = {f"/repo/file_{idx}.py": "x = 1\n" for idx in range(10)}
+
+        messages, report = packer.pack(files)
+
+        assert len(messages) == 1
+        assert report.num_messages == 1
+        assert len(report.included) == 10
+        assert all(f"# /repo/file_{idx}.py" in messages[0] for idx in range(10))
+
+    def test_budget_truncates_then_drops(self):
+        packer = ContextPacker(token_budget=1000, max_message_tokens=800, min_truncated_tokens=100)
+        files = {
+            "/repo/a.py": "a = 1\n" * 400,
+            "/repo/b.py": "b = 2\n" * 400,
+            "/repo/c.py": "c = 3\n" * 200,
+        }
+
+        messages, report = packer.pack(files)
+
+        assert report.included == ["/repo/a.py", "/repo/b.py"]
+        assert report.truncated == ["/repo/b.py"]
+        assert report.dropped == ["/repo/c.py"]
+        assert report.total_tokens <= 1000
+        assert TRUNCATION_MARKER in messages[-1]
+
+    def test_stable_order_sends_the_pinned_file_last(self):
+        packer = ContextPacker(token_budget=10_000, max_message_tokens=1)
+        files = {
+            "/repo/settings.py": "DEBUG = True\n",
+            "/repo/invoices.py": "def render_invoice(invoice):\n    return invoice.total\n",
+            "/repo/reviewed.py": "render_invoice(None)\n",
+        }
+
+        messages, _ = packer.pack(
+            files, relevance_query="render_invoice", pinned_paths=["/repo/reviewed.py"], stable_order=True
+        )
+
+        assert ["/repo/settings.py" in messages[0], "/repo/reviewed.py" in messages[-1]] == [True, True]
@@ -0,0 +1,109 @@
+from src.lib.llm_client.conversation_memory import ConversationMemory
+from src.lib.llm_client.llm_client import LlMClient
+from src.lib.llm_client.stream_events import StreamFinished, StreamStarted
+from src.lib.llm_client.stream_sinks import BufferedCollector
+from src.lib.llm_client.telemetry import LlmTelemetry
+from src.types.enums import MemoryPolicy
+from src.types.schema import LlmMessage
+
+
+def turn(idx):
+    return [
+        LlmMessage(role="user", content=f"question {idx} " + "x" * 400),
+        LlmMessage(role="assistant", content=f"answer {idx} " + "y" * 400),
+    ]
+
+
+class SummarizingMockLlMClient(LlMClient):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = []
+
+    def _send_message_implementation_specific_logic(self, message: LlmMessage, **kwargs) -> LlmMessage:
+        self.requests.append((len(self._memory), message.content))
+        # Like the clients that stream internally
+        self._emit_text_delta("y" * 400)
+        return LlmMessage(role="assistant", content="y" * 400)
+
+
+class TestConversationMemory:
+    def test_pinned_messages_stay_in_the_prefix(self):
+        memory = ConversationMemory(max_tokens=500)
+        memory.append(LlmMessage(role="system", content="system prompt"), pinned=True)
+        memory.append(LlmMessage(role="user", content="code context"), pinned=True)
+
+        for idx in range(5):
+            memory.extend(turn(idx))
+
+        messages = memory.as_messages()
+        assert [message["content"] for message in messages[:2]] == ["system prompt", "code context"]
+        assert messages[-1]["content"].startswith("answer 4")
+        assert memory.total_tokens <= 500
+        assert len(memory) == 4
+        assert messages[2]["role"] == "user"
+
+    def test_messages_are_serialized_once(self):
+        memory = ConversationMemory()
+        memory.extend(turn(0))
+
+        assert memory.as_messages() is memory.as_messages()
+        assert memory.as_messages() == [message.model_dump(mode="json") for message in turn(0)]
+
+    def test_summarize_policy_replaces_old_turns_with_a_summary(self):
+        summarized = []
+
+        def summarizer(messages):
+            summarized.append(messages)
+            return "they talked"
+
+        memory = ConversationMemory(max_tokens=600, policy=MemoryPolicy.SUMMARIZE, summarizer=summarizer)
+        memory.append(LlmMessage(role="user", content="code context"), pinned=True)
+
+        for idx in range(3):
+            memory.extend(turn(idx))
+
+        messages = memory.as_messages()
+        assert messages[0]["content"] == "code context"
+        assert messages[1]["content"] == "Summary of the earlier conversation:\nthey talked"
+        assert messages[-1]["content"].startswith("answer 2")
+        assert summarized[0][0]["content"].startswith("question 0")
+
+    def test_discard_last(self):
+        memory = ConversationMemory()
+        memory.append(LlmMessage(role="user", content="context"), pinned=True)
+        memory.extend(turn(0))
+        memory.discard_last(2)
+
+        assert memory.as_messages() == [{"role": "user", "content": "context"}]
+
+
+class TestLlmClientMemoryBudget:
+    def test_summary_is_requested_with_an_empty_memory(self):
+        client = SummarizingMockLlMClient(memory_max_tokens=600, memory_policy=MemoryPolicy.SUMMARIZE)
+        client.send_message("context", add_to_memory_without_response=True)
+
+        for idx in range(3):
+            client.send_message(f"question {idx} " + "x" * 400)
+
+        summary_requests = [request for request in client.requests if request[1].startswith("Summarize")]
+        assert summary_requests and all(memory_size == 0 for memory_size, _ in summary_requests)
+        assert client._memory.total_tokens <= 600
+        assert client._memory.as_messages()[0]["content"] == "context"
+
+    def test_summary_is_a_call_of_its_own(self):
+        collector, telemetry = BufferedCollector(), LlmTelemetry()
+        client = SummarizingMockLlMClient(
+            memory_max_tokens=600, memory_policy=MemoryPolicy.SUMMARIZE, stream_sink=collector, telemetry=telemetry
+        )
+
+        for idx in range(3):
+            client.send_message(f"question {idx} " + "x" * 400)
+
+        started = [event.stream_id for event in collector.events if isinstance(event, StreamStarted)]
+        assert len(started) == len(set(started)) == len(client.requests) == len(telemetry.records) > 3
+        # No event of a stream comes after it finished
+        finished = set()
+        for event in collector.events:
+            assert event.stream_id not in finished
+            if isinstance(event, StreamFinished):
+                finished.add(event.stream_id)
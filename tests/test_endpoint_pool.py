@@ -0,0 +1,141 @@
+import random
+
+import openai
+import pytest
+from openai import OpenAI
+
+from benchmarks.fake_openai_server import FakeOpenAiServer
+from src.lib.llm_client.endpoint_pool import EndpointPool, parse_retry_after
+from src.lib.llm_client.pooled_openai_llm_client import PooledOpenAiLlMClient
+from src.lib.llm_client.rate_limiter import TokenBucket
+from src.types.schema import LlmEndpoint
+
+from conftest import FakeClock
+
+
+def make_pool(endpoints, clock=None, **kwargs) -> EndpointPool:
+    clock = clock or FakeClock()
+    return EndpointPool(
+        endpoints=endpoints,
+        client_factory=lambda endpoint: OpenAI(base_url=endpoint.base_url, api_key=endpoint.api_key, max_retries=0),
+        clock=clock,
+        sleep=clock.sleep,
+        rng=random.Random(0),
+        **kwargs,
+    )
+
+
+def endpoint(base_url: str, **kwargs) -> LlmEndpoint:
+    return LlmEndpoint(base_url=base_url, api_key="test", model="fake-model", **kwargs)
+
+
+class TestTokenBucket:
+    def test_refills_over_the_period(self):
+        clock = FakeClock()
+        bucket = TokenBucket(capacity=60, clock=clock)
+        bucket.consume(60)
+
+        assert bucket.time_until_available(1) == pytest.approx(1.0)
+        clock.now += 30
+        assert bucket.available == pytest.approx(30)
+
+    def test_adjust_settles_the_estimate(self):
+        bucket = TokenBucket(capacity=1000, clock=FakeClock())
+        bucket.consume(100)
+        bucket.adjust(300)
+
+        assert bucket.available == pytest.approx(600)
+
+
+class TestParseRetryAfter:
+    def test_milliseconds_header_wins(self):
+        assert parse_retry_after({"retry-after-ms": "1500", "retry-after": "2"}) == 1.5
+
+    def test_seconds_header(self):
+        assert parse_retry_after({"retry-after": "3"}) == 3.0
+        assert parse_retry_after({}) is None
+
+
+class TestEndpointPool:
+    def test_requests_are_spread_by_the_request_budgets(self):
+        clock = FakeClock()
+        pool = make_pool([endpoint("http://a", requests_per_minute=2), endpoint("http://b", requests_per_minute=2)], clock)
+
+        names = []
+        for _ in range(5):
+            pooled = pool.acquire(estimated_tokens=10)
+            names.append(pooled.endpoint.base_url)
+            pool.release(pooled, estimated_tokens=10)
+
+        assert sorted(names[:4]) == ["http://a", "http://a", "http://b", "http://b"]
+        # The fifth request waits for a request to be refilled, 60 / 2 seconds
+        assert clock.sleeps == [pytest.approx(30.0)]
+
+    def test_token_budget_is_respected(self):
+        clock = FakeClock()
+        pool = make_pool([endpoint("http://a", tokens_per_minute=1000)], clock)
+
+        pool.release(pool.acquire(estimated_tokens=800), estimated_tokens=800)
+        pool.acquire(estimated_tokens=800)
+
+        assert clock.sleeps == [pytest.approx(36.0)]
+
+    def test_failed_endpoint_cools_down(self):
+        clock = FakeClock()
+        pool = make_pool([endpoint("http://a"), endpoint("http://b")], clock, backoff_base_seconds=1.0)
+
+        failed = pool.acquire(estimated_tokens=10)
+        pool.release_failure(failed, retry_after=5.0, rate_limited=True)
+
+        other = pool.acquire(estimated_tokens=10)
+        assert other is not failed
+        pool.release(other, estimated_tokens=10)
+
+        clock.now += 5
+        # The endpoint without failures is still preferred once the other one is available again
+        assert pool.acquire(estimated_tokens=10) is other
+        pool.release_failure(other)
+
+        # Without a Retry-After the backoff is jittered between half and all of the base delay
+        assert 0.5 <= other.available_at - clock.now <= 1.0
+
+
+class TestPooledOpenAiLlMClient:
+    def test_rate_limited_endpoint_fails_over(self):
+        with FakeOpenAiServer(rate_limit_rate=1.0, retry_after_seconds=30) as limited, \
+                FakeOpenAiServer(responder=lambda request: "from the healthy server") as healthy:
+            pool = make_pool([endpoint(limited.base_url), endpoint(healthy.base_url)])
+            # The limited endpoint is tried first
+            pool.endpoints[1].latency_ewma = 1.0
+            client = PooledOpenAiLlMClient(endpoint_pool=pool)
+
+            assert client.send_message("hi") == "from the healthy server"
+            assert client.send_message("again") == "from the healthy server"
+
+            # The Retry-After of the limited server kept the second request away from it
+            assert limited.stats.rate_limited_requests == 1
+            assert healthy.stats.requests == 2
+            assert pool.summary()[f"fake-model@{limited.base_url}"]["rate_limited"] == 1
+
+    def test_server_errors_fail_over(self):
+        with FakeOpenAiServer(failure_rate=1.0) as failing, FakeOpenAiServer() as healthy:
+            pool = make_pool([endpoint(failing.base_url), endpoint(healthy.base_url)])
+            pool.endpoints[1].latency_ewma = 1.0
+            client = PooledOpenAiLlMClient(endpoint_pool=pool)
+
+            client.send_message("hi")
+
+            assert failing.stats.failed_requests == 1
+            assert healthy.stats.requests == 1
+            assert pool.endpoints[0].consecutive_failures == 1
+
+    def test_gives_up_after_max_attempts(self):
+        with FakeOpenAiServer(rate_limit_rate=1.0, retry_after_seconds=0.01) as limited:
+            pool = make_pool([endpoint(limited.base_url)])
+            client = PooledOpenAiLlMClient(endpoint_pool=pool, max_attempts=3)
+
+            with pytest.raises(openai.RateLimitError):
+                client.send_message("hi")
+
+            assert limited.stats.rate_limited_requests == 3
+            assert pool.endpoints[0].in_flight == 0
@@ -0,0 +1,62 @@
+import os
+
+from src.lib.import_graph import ImportGraph
+
+
+def write_files(root, files):
+    for relative_path, content in files.items():
+        path = os.path.join(root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+
+class TestImportGraph:
+    def test_absolute_and_package_imports(self, tmp_path):
+        write_files(tmp_path, {
+            "app/__init__.py": "",
+            "app/models.py": "import os\n",
+            "app/utils/__init__.py": "",
+            "app/utils/strings.py": "",
+            "main.py": "import json\nimport app.models\nfrom app.utils import strings\nfrom app import missing\n",
+        })
+        graph = ImportGraph(local_repo_path=str(tmp_path))
+
+        assert graph.dependencies_of(os.path.join(tmp_path, "main.py")) == [
+            os.path.join(tmp_path, "app", "models.py"),
+            os.path.join(tmp_path, "app", "utils", "strings.py"),
+            os.path.join(tmp_path, "app", "__init__.py"),
+        ]
+
+    def test_relative_imports(self, tmp_path):
+        write_files(tmp_path, {
+            "pkg/__init__.py": "",
+            "pkg/base.py": "",
+            "pkg/sub/__init__.py": "",
+            "pkg/sub/child.py": "from ..base import Base\nfrom . import sibling\n",
+            "pkg/sub/sibling.py": "",
+        })
+        graph = ImportGraph(local_repo_path=str(tmp_path))
+
+        assert graph.dependencies_of(os.path.join(tmp_path, "pkg", "sub", "child.py")) == [
+            os.path.join(tmp_path, "pkg", "base.py"),
+            os.path.join(tmp_path, "pkg", "sub", "sibling.py"),
+        ]
+
+    def test_src_layout_and_dependents(self, tmp_path):
+        write_files(tmp_path, {
+            "src/lib_pkg/__init__.py": "",
+            "src/lib_pkg/core.py": "",
+            "tests/test_core.py": "from lib_pkg.core import run\n",
+        })
+        graph = ImportGraph(local_repo_path=str(tmp_path))
+        core_path = os.path.join(tmp_path, "src", "lib_pkg", "core.py")
+
+        assert graph.dependencies_of(os.path.join(tmp_path, "tests", "test_core.py")) == [core_path]
+        assert graph.dependents_of(core_path) == [os.path.join(tmp_path, "tests", "test_core.py")]
+
+    def test_syntax_error_has_no_dependencies(self, tmp_path):
+        write_files(tmp_path, {"broken.py": "def (:\n"})
+        graph = ImportGraph(local_repo_path=str(tmp_path))
+
+        assert graph.dependencies_of(os.path.join(tmp_path, "broken.py")) == []
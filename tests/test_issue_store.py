@@ -0,0 +1,101 @@
+import json
+import sqlite3
+
+import pytest
+
+from src.lib import issue_store as issue_store_module
+from src.lib.issue_store import IssueStore, issue_fingerprint
+from src.utils.exceptions import StoreSchemaError
+
+
+def make_issue(explanation: str, line_start=None, line_end=None, severity=None):
+    issue = {"explanation": explanation, "suggestion": "Fix it"}
+
+    if line_start is not None:
+        issue.update(line_start=line_start, line_end=line_end)
+
+    if severity is not None:
+        issue["severity"] = severity
+
+    return issue
+
+
+class TestIssueStore:
+    def test_issues_are_deduplicated_across_runs(self, tmp_path):
+        store = IssueStore(str(tmp_path / "issues.sqlite"))
+
+        first_run = store.start_run()
+        assert store.add_issues(first_run, "/repo/a/util.py", [make_issue("Division by zero", 3, 4)]) == 1
+        # Same basename in another directory is another file
+        assert store.add_issues(first_run, "/repo/b/util.py", [make_issue("Division by zero", 3, 4)]) == 1
+        store.finish_run(first_run)
+
+        second_run = store.start_run()
+        new_issues = store.add_issues(
+            second_run,
+            "/repo/a/util.py",
+            [make_issue("division  by ZERO ", 3, 4), make_issue("Unused import", severity="Low")],
+        )
+        store.finish_run(second_run)
+
+        assert new_issues == 1
+        assert len(store) == 3
+        assert store.last_finished_run() == second_run
+        assert store.last_finished_run(before_run_id=second_run) == first_run
+        assert [issue["explanation"] for issue in store.issues(new_since_run=first_run)] == ["Unused import"]
+        assert len(store.issues(seen_in_run=second_run)) == 2
+        assert len(store.issues(file_path="/repo/a/util.py")) == 2
+        assert "line_start" not in store.issues(severity="LOW")[0]
+        deduplicated = store.issues(file_path="/repo/a/util.py", severity=None)[1]
+        assert (deduplicated["first_seen_run"], deduplicated["last_seen_run"]) == (first_run, second_run)
+
+    def test_store_survives_reopening_and_exports_jsonl(self, tmp_path):
+        db_path = str(tmp_path / "issues.sqlite")
+        store = IssueStore(db_path)
+        store.add_issues(store.start_run(), "/repo/util.py", [make_issue("Leaks a file handle", 1, 2, "high")])
+        store.close()
+
+        store = IssueStore(db_path)
+        export_path = tmp_path / "export" / "issues.jsonl"
+
+        assert store.export_jsonl(str(export_path)) == 1
+        exported = [json.loads(line) for line in export_path.read_text().splitlines()]
+        assert exported[0]["file_path"] == "/repo/util.py"
+        assert exported[0]["severity"] == "high"
+        assert list(export_path.parent.iterdir()) == [export_path]
+
+    def test_fingerprint_ignores_whitespace_and_case(self):
+        assert issue_fingerprint(make_issue("A  bug\n")) == issue_fingerprint(make_issue("a bug"))
+        assert issue_fingerprint(make_issue("A bug")) != issue_fingerprint(make_issue("Another bug"))
+
+    def test_schema_changes_keep_the_history(self, tmp_path, monkeypatch):
+        db_path = str(tmp_path / "issues.sqlite")
+        store = IssueStore(db_path)
+        run_id = store.start_run()
+        store.add_issues(run_id, "/repo/a.py", [make_issue("Division by zero", 3, 4)])
+        store.finish_run(run_id)
+        store.close()
+
+        migrations = [*issue_store_module.ISSUE_STORE_MIGRATIONS, ["ALTER TABLE issues ADD COLUMN status TEXT"]]
+        monkeypatch.setattr(issue_store_module, "ISSUE_STORE_MIGRATIONS", migrations)
+        monkeypatch.setattr(issue_store_module, "ISSUE_STORE_SCHEMA_VERSION", len(migrations))
+        store = IssueStore(db_path)
+
+        assert len(store) == 1
+        assert store.last_finished_run() == run_id
+        assert "status" in [row["name"] for row in store._connection.execute("PRAGMA table_info(issues)")]
+        store.close()
+
+    def test_a_store_of_a_newer_version_is_not_opened(self, tmp_path):
+        db_path = str(tmp_path / "issues.sqlite")
+        store = IssueStore(db_path)
+        store.add_issues(store.start_run(), "/repo/a.py", [make_issue("Division by zero")])
+        store._connection.execute(f"PRAGMA user_version = {issue_store_module.ISSUE_STORE_SCHEMA_VERSION + 1}")
+        store.close()
+
+        with pytest.raises(StoreSchemaError, match="newer"):
+            IssueStore(db_path)
+
+        connection = sqlite3.connect(db_path)
+        assert connection.execute("SELECT COUNT(*) FROM issues").fetchone()[0] == 1
+        connection.close()
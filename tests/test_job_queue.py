@@ -0,0 +1,265 @@
+import os
+import random
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+from src.lib.file_content_cache import FileContentCache
+from src.lib.import_graph import get_import_graph
+from src.lib.issue_store import IssueStore
+from src.lib.job_queue import JobQueue, create_queue_engine, metadata
+from src.lib.repository_index import RepositoryIndex
+from src.lib.review_manifest import ReviewManifest
+from src.services import batch_service as batch_service_module
+from src.services.job_queue_service import JobQueueService
+from src.types.enums import BatchMode, QueueJobStatus
+from src.types.schema import BatchJob
+
+from conftest import FakeClock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(datetime(2026, 1, 1, tzinfo=timezone.utc))
+
+
+@pytest.fixture
+def job_queue(tmp_path, clock):
+    job_queue = JobQueue(
+        engine=create_queue_engine(f"sqlite:///{tmp_path / 'jobs.sqlite'}"),
+        lease_seconds=60,
+        max_attempts=2,
+        retry_backoff_seconds=10,
+        clock=clock,
+        rng=random.Random(0),
+    )
+    job_queue.create_tables()
+    yield job_queue
+    job_queue.engine.dispose()
+
+
+def make_service(tmp_path, job_queue, repo_path, runtime) -> JobQueueService:
+    return JobQueueService(
+        job_queue=job_queue,
+        local_repo_path=str(repo_path),
+        runtime=runtime,
+        heartbeat_seconds=1,
+        poll_seconds=0.01,
+        repository_index=RepositoryIndex(directory=str(repo_path), db_path=str(tmp_path / "repository_index.sqlite")),
+    )
+
+
+class TestJobQueue:
+    def test_lease_heartbeat_and_complete(self, job_queue, clock):
+        ids = job_queue.enqueue(BatchMode.REVIEW, [{"file_path": "a.py"}, {"file_path": "b.py"}], batch_id="batch")
+
+        job = job_queue.lease("worker-1")
+        assert (job.id, job.payload, job.attempts, job.batch_id) == (ids[0], {"file_path": "a.py"}, 1, "batch")
+        assert job_queue.lease("worker-2").id == ids[1]
+        assert job_queue.lease("worker-3") is None
+
+        assert job_queue.heartbeat(job.id, "worker-1")
+        assert not job_queue.heartbeat(job.id, "worker-2")
+        assert job_queue.complete(job.id, "worker-1", {"issues": []})
+
+        counts = job_queue.counts(batch_id="batch")
+        assert (counts[QueueJobStatus.SUCCEEDED], counts[QueueJobStatus.RUNNING]) == (1, 1)
+        assert job_queue.jobs(status=QueueJobStatus.SUCCEEDED)[0]["result"] == {"issues": []}
+
+    def test_expired_leases_are_queued_again_until_max_attempts(self, job_queue, clock):
+        [job_id] = job_queue.enqueue(BatchMode.CODE, [{"job": {}}])
+        job_queue.lease("worker-1")
+
+        # The heartbeats keep the lease
+        clock.advance(50)
+        job_queue.heartbeat(job_id, "worker-1")
+        clock.advance(50)
+        assert job_queue.lease("worker-2") is None
+
+        clock.advance(61)
+        job = job_queue.lease("worker-2")
+        assert (job.id, job.attempts) == (job_id, 2)
+        # The first worker lost the lease, its result is not stored
+        assert not job_queue.complete(job_id, "worker-1", {})
+
+        clock.advance(61)
+        assert job_queue.lease("worker-3") is None
+        [row] = job_queue.jobs()
+        assert (row["status"], row["error"]) == (QueueJobStatus.FAILED.value, "The lease expired")
+
+    def test_failed_jobs_are_retried_with_a_backoff(self, job_queue, clock):
+        job_queue.enqueue(BatchMode.REVIEW, [{"file_path": "a.py"}])
+
+        assert job_queue.fail(job_queue.lease("worker-1"), "worker-1", "RateLimitError")
+        assert job_queue.lease("worker-1") is None
+
+        clock.advance(10)
+        job = job_queue.lease("worker-1")
+        assert job.attempts == 2
+
+        job_queue.fail(job, "worker-1", "RateLimitError")
+        [row] = job_queue.jobs()
+        assert (row["status"], row["attempts"]) == (QueueJobStatus.FAILED.value, 2)
+
+    def test_concurrent_workers_never_lease_the_same_job(self, tmp_path):
+        job_queue = JobQueue(engine=create_queue_engine(f"sqlite:///{tmp_path / 'jobs.sqlite'}"))
+        job_queue.create_tables()
+        job_queue.enqueue(BatchMode.REVIEW, [{"file_path": f"{idx}.py"} for idx in range(40)])
+        leased = []
+
+        def work(worker_id: str):
+            while job := job_queue.lease(worker_id):
+                leased.append(job.id)
+
+        threads = [threading.Thread(target=work, args=(f"worker-{idx}",)) for idx in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(leased) == list(range(1, 41))
+        job_queue.engine.dispose()
+
+    def test_migrations_create_the_schema_of_the_queue(self, tmp_path, monkeypatch):
+        database_url = f"sqlite:///{tmp_path / 'migrated.sqlite'}"
+        monkeypatch.setenv("DATABASE_URL", database_url)
+        config = Config(os.path.join(REPO_ROOT, "alembic.ini"))
+        config.set_main_option("script_location", os.path.join(REPO_ROOT, "migrations"))
+
+        command.upgrade(config, "head")
+
+        engine = create_queue_engine(database_url)
+        inspector = inspect(engine)
+        columns = {column["name"] for column in inspector.get_columns("jobs")}
+        assert columns == set(metadata.tables["jobs"].columns.keys())
+        indexes = {index["name"] for index in inspector.get_indexes("jobs")}
+        assert indexes == {"ix_jobs_batch_id", "ix_jobs_status_run_after"}
+        JobQueue(engine=engine).enqueue(BatchMode.REVIEW, [{"file_path": "a.py"}])
+        engine.dispose()
+
+
+class TestJobQueueService:
+    def test_distributed_review_run(self, tmp_path, job_queue, clock):
+        repo_path = tmp_path / "repo"
+        (repo_path / "pkg").mkdir(parents=True)
+        for name in ["good.py", "bad.py", "flaky.py"]:
+            (repo_path / "pkg" / name).write_text(f"# {name}\n")
+        attempts = {"flaky.py": 0}
+
+        def review_file(file_path, content):
+            name = os.path.basename(file_path)
+            if name == "flaky.py":
+                attempts[name] += 1
+                if attempts[name] == 1:
+                    raise TimeoutError("The llm did not answer")
+            return [] if name == "good.py" else [{"explanation": f"Bug in {name}", "suggestion": "Fix it"}]
+
+        runtime = SimpleNamespace(
+            code_review_service=lambda local_repo_path: SimpleNamespace(review_file=review_file),
+            file_content_cache=FileContentCache(),
+        )
+        service = make_service(tmp_path, job_queue, repo_path, runtime)
+        batch_id = service.enqueue_reviews(str(repo_path / "pkg" / name) for name in ["good.py", "bad.py", "flaky.py"])
+
+        assert service.run_worker(max_jobs=3) == 3
+        # The failed review of flaky.py is retried once its backoff passed
+        [flaky] = job_queue.jobs(status=QueueJobStatus.QUEUED)
+        assert flaky["error"] == "TimeoutError: The llm did not answer"
+        clock.advance(10)
+        assert service.run_worker(exit_when_empty=True) == 1
+
+        counts = service.wait_for_batch(batch_id, timeout_seconds=1)
+        assert counts[QueueJobStatus.SUCCEEDED] == 3
+
+        issue_store = IssueStore(str(tmp_path / "issues.sqlite"))
+        assert service.collect_reviews(batch_id, issue_store) == (2, 2)
+        assert [issue["file_path"] for issue in issue_store.issues()] == [
+            str(repo_path / "pkg" / "bad.py"),
+            str(repo_path / "pkg" / "flaky.py"),
+        ]
+
+    def test_the_import_graph_is_rebuilt_when_a_python_file_changed(self, tmp_path, job_queue):
+        repo_path = tmp_path / "repo"
+        (repo_path / "pkg").mkdir(parents=True)
+        (repo_path / "pkg" / "__init__.py").write_text("")
+        (repo_path / "pkg" / "util.py").write_text("VALUE = 1\n")
+        main_path = repo_path / "pkg" / "main.py"
+        main_path.write_text("print(1)\n")
+        graphs = []
+
+        def review_file(file_path, content):
+            graphs.append(get_import_graph(str(repo_path)))
+            dependencies = graphs[-1].dependencies_of(file_path)
+            return [{"explanation": os.path.basename(path), "suggestion": ""} for path in dependencies]
+
+        runtime = SimpleNamespace(
+            code_review_service=lambda local_repo_path: SimpleNamespace(review_file=review_file),
+            file_content_cache=FileContentCache(),
+        )
+        service = make_service(tmp_path, job_queue, repo_path, runtime)
+
+        service.enqueue_reviews([str(main_path)])
+        service.run_worker(max_jobs=1)
+        main_path.write_text("from pkg.util import VALUE\n")
+        (repo_path / "notes.txt").write_text("not python\n")
+        service.enqueue_reviews([str(main_path), str(main_path)])
+        service.run_worker(max_jobs=2)
+        (repo_path / "notes.txt").write_text("still not python\n")
+        service.enqueue_reviews([str(main_path)])
+        service.run_worker(max_jobs=1)
+
+        results = [row["result"]["issues"] for row in job_queue.jobs(status=QueueJobStatus.SUCCEEDED)]
+        assert results == [[]] + [[{"explanation": "util.py", "suggestion": ""}]] * 3
+        # Only the change of main.py rebuilt the graph
+        assert graphs[0] is not graphs[1]
+        assert graphs[1] is graphs[2] is graphs[3]
+
+    def test_review_jobs_close_their_stores(self, tmp_path, job_queue, monkeypatch):
+        opened = []
+
+        class TrackedIssueStore(IssueStore):
+            def __init__(self, db_path):
+                super().__init__(db_path)
+                opened.append(self)
+
+        class TrackedReviewManifest(ReviewManifest):
+            def __init__(self, db_path):
+                super().__init__(db_path)
+                opened.append(self)
+
+        monkeypatch.setattr(batch_service_module, "IssueStore", TrackedIssueStore)
+        monkeypatch.setattr(batch_service_module, "ReviewManifest", TrackedReviewManifest)
+
+        def review_files(file_path_to_content, manifest=None):
+            for file_path in file_path_to_content:
+                if file_path == "broken.py":
+                    raise TimeoutError("The llm did not answer")
+                yield file_path, [{"explanation": f"Bug in {file_path}", "suggestion": "Fix it"}]
+
+        runtime = SimpleNamespace(
+            settings=SimpleNamespace(review_incremental=True),
+            repository_reader_service=SimpleNamespace(
+                read_files=lambda directory, include_files, include_glob: {path: "" for path in include_files}
+            ),
+            code_review_service=lambda local_repo_path: SimpleNamespace(review_files=review_files),
+        )
+        service = make_service(tmp_path, job_queue, tmp_path, runtime)
+        service.enqueue_batch_jobs(
+            [BatchJob(job_id="a", include_files=["a.py"]), BatchJob(job_id="b", include_files=["broken.py"])],
+            mode=BatchMode.REVIEW,
+        )
+
+        assert service.run_worker(max_jobs=2) == 2
+
+        assert len(opened) == 4
+        for store in opened:
+            with pytest.raises(sqlite3.ProgrammingError):
+                store._connection.execute("SELECT 1")
@@ -1,14 +1,8 @@
 import pytest
 from unittest.mock import MagicMock
-from src.lib.llm_client.llm_client import LlMClient
 from src.types.schema import LlmMessage
 
-
-class MockLlMClient(LlMClient):
-    def _send_message_implementation_specific_logic(
-        self, message: LlmMessage, **kwargs
-    ) -> LlmMessage:
-        return LlmMessage(role="bot", content="Response to the message")
+from conftest import MockLlMClient
 
 
 class TestResetMemory:
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+from openai import OpenAI
+
+from benchmarks.fake_openai_server import FakeOpenAiServer
+from src.lib.llm_client.openai_llm_client import OpenAiLlMClient
+from src.lib.llm_client.response_cache import ResponseCache
+from src.lib.llm_client.telemetry import CacheStatus, LlmTelemetry
+
+from conftest import ScriptedLlMClient
+
+
+class TestLlmCallRecords:
+    def test_send_message_records_estimated_tokens(self):
+        telemetry = LlmTelemetry()
+        client = ScriptedLlMClient(["a" * 40], telemetry=telemetry)
+        client.send_message("b" * 80)
+
+        [call_record] = telemetry.records
+        assert call_record.prompt_tokens == 20
+        assert call_record.completion_tokens == 10
+        assert call_record.tokens_estimated
+        assert call_record.cache_status == CacheStatus.DISABLED
+        assert call_record.error is None
+
+    def test_json_retries_are_counted(self):
+        telemetry = LlmTelemetry()
+        client = ScriptedLlMClient(["not json", "still not json", "{}"], telemetry=telemetry)
+        client.send_message_expecting_json_response("json please")
+
+        assert [call_record.retries for call_record in telemetry.records] == [0, 1, 2]
+        assert telemetry.summary()["ScriptedLlMClient"]["retries"] == 2
+
+    def test_cache_hits_send_no_tokens(self, tmp_path):
+        telemetry = LlmTelemetry()
+        response_cache = ResponseCache(db_path=str(tmp_path / "cache.sqlite"))
+        ScriptedLlMClient(["cached"], telemetry=telemetry, response_cache=response_cache).send_message("hi")
+        ScriptedLlMClient([], telemetry=telemetry, response_cache=response_cache).send_message("hi")
+
+        miss, hit = telemetry.records
+        assert miss.cache_status == CacheStatus.MISS and miss.prompt_tokens > 0
+        assert hit.cache_status == CacheStatus.HIT and hit.prompt_tokens == 0
+
+    def test_aborted_stream_is_recorded(self):
+        telemetry = LlmTelemetry()
+        client = ScriptedLlMClient(["partial reply"], telemetry=telemetry)
+        stream = client.stream_message("hi")
+        next(stream)
+        stream.close()
+
+        [call_record] = telemetry.records
+        assert call_record.streamed
+        assert call_record.error == "aborted"
+        assert call_record.time_to_first_token_seconds is not None
+
+    def test_failed_call_is_recorded(self):
+        telemetry = LlmTelemetry()
+        client = ScriptedLlMClient([], telemetry=telemetry)
+
+        with pytest.raises(StopIteration):
+            client.send_message("hi")
+
+        assert telemetry.records[0].error == "StopIteration"
+
+
+class TestOpenAiTelemetry:
+    def test_usage_of_the_stream_is_recorded(self):
+        telemetry = LlmTelemetry()
+
+        with FakeOpenAiServer(responder=lambda request: "Hello from the fake server", chunk_size=4) as server:
+            client = OpenAiLlMClient(
+                openai_client=OpenAI(base_url=server.base_url, api_key="test", max_retries=0),
+                model="fake-model",
+                telemetry=telemetry,
+            )
+            client.send_message("Hello!")
+
+            [call_record] = telemetry.records
+            assert not call_record.tokens_estimated
+            assert call_record.prompt_tokens == server.stats.prompt_tokens
+            assert call_record.completion_tokens == server.stats.completion_tokens
+            assert 0 < call_record.time_to_first_token_seconds <= call_record.latency_seconds
+
+
+class TestTelemetryExport:
+    def test_jsonl_and_prometheus_export(self, tmp_path):
+        telemetry = LlmTelemetry()
+        client = ScriptedLlMClient(["one", "two"], telemetry=telemetry)
+        client.send_message("first")
+        client.send_message("second")
+
+        telemetry.export_jsonl(str(tmp_path / "calls.jsonl"))
+        telemetry.export_prometheus(str(tmp_path / "llm.prom"))
+
+        lines = (tmp_path / "calls.jsonl").read_text().splitlines()
+        assert [json.loads(line)["model"] for line in lines] == ["ScriptedLlMClient"] * 2
+
+        metrics = (tmp_path / "llm.prom").read_text()
+        assert 'ohad_llm_calls_total{model="ScriptedLlMClient",cache="disabled"} 2' in metrics
+        assert 'ohad_llm_latency_seconds_count{model="ScriptedLlMClient"} 2' in metrics
+        assert "# TYPE ohad_llm_latency_seconds histogram" in metrics
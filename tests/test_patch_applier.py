@@ -0,0 +1,116 @@
+from src.lib.patch_applier import apply_patch
+
+ORIGINAL = """def add(a, b):
+    return a + b
+
+
+def sub(a, b):
+    return a - b
+
+
+def mul(a, b):
+    return a * b
+"""
+
+
+class TestApplyPatch:
+    def test_search_replace_blocks(self):
+        patch = (
+            "<<<<<<< SEARCH\n"
+            "def sub(a, b):\n"
+            "    return a - b\n"
+            "=======\n"
+            "def sub(a, b):\n"
+            "    return b - a\n"
+            ">>>>>>> REPLACE\n"
+            "<<<<<<< SEARCH\n"
+            "    return a * b\n"
+            "=======\n"
+            "    return b * a\n"
+            ">>>>>>> REPLACE\n"
+        )
+
+        result = apply_patch(ORIGINAL, patch)
+
+        assert result.failed == []
+        assert result.applied == [0, 1]
+        assert "return b - a" in result.content
+        assert "return b * a" in result.content
+        assert "return a + b" in result.content
+
+    def test_unified_diff(self):
+        patch = (
+            "--- a/math.py\n"
+            "+++ b/math.py\n"
+            "@@ -4,3 +4,3 @@\n"
+            " \n"
+            " def sub(a, b):\n"
+            "-    return a - b\n"
+            "+    return b - a\n"
+        )
+
+        result = apply_patch(ORIGINAL, patch)
+
+        assert result.failed == []
+        assert result.content == ORIGINAL.replace("return a - b", "return b - a")
+
+    def test_whitespace_and_fuzzy_anchoring(self):
+        patch = (
+            "<<<<<<< SEARCH\n"
+            "def mul(a,b):\n"
+            "  return a * b\n"
+            "=======\n"
+            "def mul(a, b):\n"
+            "    return a * b * 1\n"
+            ">>>>>>> REPLACE\n"
+        )
+
+        result = apply_patch(ORIGINAL, patch)
+
+        assert result.failed == []
+        assert result.content.endswith("def mul(a, b):\n    return a * b * 1\n")
+
+    def test_failed_hunks_are_reported(self):
+        patch = (
+            "<<<<<<< SEARCH\n"
+            "def div(a, b):\n"
+            "    return a / b\n"
+            "=======\n"
+            "def div(a, b):\n"
+            "    return a // b\n"
+            ">>>>>>> REPLACE\n"
+            "<<<<<<< SEARCH\n"
+            "    return a + b\n"
+            "=======\n"
+            "    return b + a\n"
+            ">>>>>>> REPLACE\n"
+        )
+
+        result = apply_patch(ORIGINAL, patch)
+
+        assert [failure.index for failure in result.failed] == [0]
+        assert result.applied == [1]
+        assert "hunk 1: search text not found" in result.describe_failures()
+
+    def test_patch_without_hunks_fails(self):
+        assert apply_patch(ORIGINAL, "just some text").failed
+
+    def test_pure_insertions_are_anchored_on_the_hunk_header(self):
+        content = "a\nb\nc\nd\ne\n"
+
+        result = apply_patch(content, "@@ -2,0 +3,1 @@\n+inserted\n@@ -4,0 +6,1 @@\n+also inserted\n")
+
+        assert (result.applied, result.failed) == ([0, 1], [])
+        assert result.content == "a\nb\ninserted\nc\nd\nalso inserted\ne\n"
+
+    def test_hunks_without_an_anchor_fail(self):
+        content = "a\nb\nc\nd\ne\n"
+        empty_search = "<<<<<<< SEARCH\n=======\ninserted\n>>>>>>> REPLACE\n"
+
+        for patch in (empty_search, "@@ -9,0 +10,1 @@\n+inserted\n"):
+            result = apply_patch(content, patch)
+
+            assert result.content == content
+            assert (result.applied, [failure.index for failure in result.failed]) == ([], [0])
+
+        assert apply_patch("", empty_search).content == "inserted\n"
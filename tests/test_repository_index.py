@@ -0,0 +1,70 @@
+import os
+import time
+
+from src.lib.repository_index import RepositoryIndex
+
+from conftest import write_file
+
+
+def make_index(root):
+    return RepositoryIndex(
+        directory=str(root),
+        db_path=os.path.join(root, ".ohad_cache", "index.sqlite"),
+        excluded_folders=[".git", "node_modules", ".ohad_cache"],
+    )
+
+
+class TestRepositoryIndex:
+    def test_refresh_only_rehashes_changed_files(self, tmp_path):
+        write_file(tmp_path, "a.py", "a = 1\n")
+        write_file(tmp_path, "pkg/b.py", "b = 1\n")
+        index = make_index(tmp_path)
+
+        assert index.refresh().updated == 2
+
+        warm_index = make_index(tmp_path)
+        assert warm_index.refresh().updated == 0
+
+        time.sleep(0.01)
+        write_file(tmp_path, "pkg/b.py", "b = 2\n")
+        os.remove(os.path.join(tmp_path, "a.py"))
+        stats = warm_index.refresh()
+
+        assert (stats.updated, stats.removed) == (1, 1)
+        assert warm_index.query() == [os.path.join(tmp_path, "pkg", "b.py")]
+
+    def test_query_by_name_and_glob(self, tmp_path):
+        write_file(tmp_path, "a.py", "")
+        write_file(tmp_path, "pkg/b.py", "")
+        write_file(tmp_path, "pkg/c.txt", "")
+        write_file(tmp_path, "node_modules/d.py", "")
+        index = make_index(tmp_path)
+        index.refresh()
+
+        assert index.query(include_files=["b.py", " c.txt"]) == [
+            os.path.join(tmp_path, "pkg", "b.py"),
+            os.path.join(tmp_path, "pkg", "c.txt"),
+        ]
+        assert index.query(include_glob="pkg/**/*.py") == [os.path.join(tmp_path, "pkg", "b.py")]
+
+    def test_query_skips_binary_and_lock_files(self, tmp_path):
+        write_file(tmp_path, "a.py", "")
+        write_file(tmp_path, "package-lock.json", "{}")
+        with open(os.path.join(tmp_path, "image.png"), "wb") as f:
+            f.write(b"\x89PNG\0\0")
+        index = make_index(tmp_path)
+        index.refresh()
+
+        assert index.query() == [os.path.join(tmp_path, "a.py")]
+
+    def test_gitignore_changes_are_applied_to_indexed_files(self, tmp_path):
+        write_file(tmp_path, "a.py", "")
+        write_file(tmp_path, "build/out.py", "")
+        index = make_index(tmp_path)
+        index.refresh()
+
+        assert os.path.join(tmp_path, "build", "out.py") in index.query()
+
+        write_file(tmp_path, ".gitignore", "build/\n")
+        assert index.refresh().removed == 1
+        assert index.query() == [os.path.join(tmp_path, ".gitignore"), os.path.join(tmp_path, "a.py")]
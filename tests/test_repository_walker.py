@@ -0,0 +1,73 @@
+import os
+
+from src.lib.lazy_file_contents import LazyFileContents
+from src.lib.repository_walker import RepositoryWalker, classify_file
+from src.types.enums import FileKind
+
+from conftest import write_file
+
+
+class TestRepositoryWalker:
+    def test_prunes_excluded_and_nested_gitignored_directories(self, tmp_path):
+        write_file(tmp_path, ".gitignore", "build/\n*.log\n")
+        write_file(tmp_path, "main.py", "")
+        write_file(tmp_path, "debug.log", "")
+        write_file(tmp_path, "build/out.py", "")
+        write_file(tmp_path, "node_modules/lib.js", "")
+        write_file(tmp_path, "pkg/.gitignore", "generated/\n!keep.log\n")
+        write_file(tmp_path, "pkg/keep.log", "")
+        write_file(tmp_path, "pkg/generated/code.py", "")
+        write_file(tmp_path, "other/generated/code.py", "")
+        walker = RepositoryWalker(directory=str(tmp_path), excluded_folders=["node_modules"])
+
+        relative_paths = sorted(walked_file.relative_path for walked_file in walker.walk())
+
+        assert relative_paths == [
+            ".gitignore",
+            "main.py",
+            os.path.join("other", "generated", "code.py"),
+            os.path.join("pkg", ".gitignore"),
+            os.path.join("pkg", "keep.log"),
+        ]
+
+
+class TestClassifyFile:
+    def test_kinds(self):
+        assert classify_file("a.py", 10, b"print('hi')\n", max_file_bytes=1000) == FileKind.TEXT
+        assert classify_file("a.bin", 10, b"\x00\x01", max_file_bytes=1000) == FileKind.BINARY
+        assert classify_file("yarn.lock", 10, b"", max_file_bytes=1000) == FileKind.LOCKFILE
+        assert classify_file("a.py", 5000, b"x = 1\n", max_file_bytes=1000) == FileKind.OVERSIZED
+        assert classify_file("a.min.js", 8192, b"a" * 8192, max_file_bytes=100_000) == FileKind.MINIFIED
+
+    def test_sample_cut_in_the_middle_of_a_character_is_text(self):
+        sample = ("x" * 10 + "é").encode("utf-8")[:-1]
+        assert classify_file("a.txt", 100, sample, max_file_bytes=1000) == FileKind.TEXT
+
+
+class TestLazyFileContents:
+    def test_reads_content_on_access(self, tmp_path):
+        write_file(tmp_path, "a.py", "a = 1\n")
+        write_file(tmp_path, "empty.py", "")
+        paths = [os.path.join(tmp_path, "a.py"), os.path.join(tmp_path, "empty.py")]
+
+        contents = LazyFileContents(file_paths=paths)
+
+        assert len(contents) == 2
+        assert list(contents) == paths
+        assert dict(contents.items()) == {paths[0]: "a = 1\n", paths[1]: ""}
+        assert "missing.py" not in contents
+
+        write_file(tmp_path, "a.py", "a = 2\n")
+        assert contents[paths[0]] == "a = 2\n"
+
+    def test_deleted_files_are_skipped(self, tmp_path):
+        write_file(tmp_path, "a.py", "a = 1\n")
+        write_file(tmp_path, "deleted.py", "b = 1\n")
+        paths = [os.path.join(tmp_path, "a.py"), os.path.join(tmp_path, "deleted.py")]
+        contents = LazyFileContents(file_paths=paths)
+
+        os.remove(paths[1])
+
+        assert dict(contents) == {paths[0]: "a = 1\n"}
+        assert len(contents) == 1 and paths[1] not in contents
+        assert contents.get(paths[1]) is None
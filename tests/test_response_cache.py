@@ -0,0 +1,93 @@
+import base64
+import os
+import time
+from unittest.mock import MagicMock
+
+from src.lib.llm_client.response_cache import ResponseCache
+from src.types.schema import LlmMessage
+
+from conftest import MockLlMClient
+
+
+class TestResponseCache:
+    def test_get_set_and_stats(self, tmp_path):
+        cache = ResponseCache(db_path=os.path.join(tmp_path, "cache.sqlite"))
+        key = ResponseCache.make_key(model="m", memory=[], message={"role": "user", "content": "hi"})
+
+        assert cache.get(key) is None
+        cache.set(key, "hello")
+        assert cache.get(key) == "hello"
+        assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+    def test_key_depends_on_memory_and_kwargs(self):
+        message = {"role": "user", "content": "hi"}
+        key = ResponseCache.make_key(model="m", memory=[], message=message)
+
+        assert key != ResponseCache.make_key(model="m", memory=[message], message=message)
+        assert key != ResponseCache.make_key(model="m", memory=[], message=message, temperature=0)
+        assert key != ResponseCache.make_key(model="other", memory=[], message=message)
+
+    def test_size_based_lru_eviction(self, tmp_path):
+        cache = ResponseCache(db_path=os.path.join(tmp_path, "cache.sqlite"), max_bytes=2500)
+        values = {key: base64.b64encode(os.urandom(1000)).decode() for key in ["a", "b", "c"]}
+
+        cache.set("a", values["a"])
+        cache.set("b", values["b"])
+        cache.get("a")
+        time.sleep(0.01)
+        cache.set("c", values["c"])
+
+        assert cache.get("b") is None
+        assert cache.get("a") == values["a"]
+        assert cache.get("c") == values["c"]
+
+    def test_total_size_is_kept_without_summing_the_store(self, tmp_path):
+        db_path = os.path.join(tmp_path, "cache.sqlite")
+        cache, other_process_cache = ResponseCache(db_path=db_path), ResponseCache(db_path=db_path)
+        statements = []
+        cache._connection.set_trace_callback(statements.append)
+
+        cache.set("a", "x" * 1000)
+        cache.set("a", "y" * 10)
+        other_process_cache.set("b", "z" * 100)
+        cache.delete("a")
+
+        assert not [statement for statement in statements if "SUM(" in statement]
+        stored_size = cache._connection.execute("SELECT SUM(size) FROM responses").fetchone()[0]
+        assert cache.total_size() == other_process_cache.total_size() == stored_size
+
+    def test_age_based_eviction(self, tmp_path):
+        cache = ResponseCache(db_path=os.path.join(tmp_path, "cache.sqlite"), max_age_seconds=0)
+        cache.set("a", "value")
+        time.sleep(0.01)
+
+        assert cache.get("a") is None
+
+
+class TestLlmClientWithResponseCache:
+    def test_identical_requests_are_served_from_cache(self, tmp_path):
+        cache = ResponseCache(db_path=os.path.join(tmp_path, "cache.sqlite"))
+        client = MockLlMClient(response_cache=cache)
+        client._send_message_implementation_specific_logic = MagicMock(
+            return_value=LlmMessage(role="assistant", content="[]")
+        )
+
+        client.send_message_expecting_json_response("Give me a JSON response.")
+        client.reset_memory()
+        client.send_message_expecting_json_response("Give me a JSON response.")
+
+        assert client._send_message_implementation_specific_logic.call_count == 1
+        assert len(client._memory) == 2
+
+    def test_invalid_json_response_is_not_reused_on_retry(self, tmp_path):
+        cache = ResponseCache(db_path=os.path.join(tmp_path, "cache.sqlite"))
+        client = MockLlMClient(response_cache=cache)
+        client._send_message_implementation_specific_logic = MagicMock(
+            side_effect=[
+                LlmMessage(role="assistant", content="not json"),
+                LlmMessage(role="assistant", content="{}"),
+            ]
+        )
+
+        assert client.send_message_expecting_json_response("Give me a JSON response.") == {}
+        assert client._send_message_implementation_specific_logic.call_count == 2
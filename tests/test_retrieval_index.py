@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from src.lib.repository_index import RepositoryIndex
+from src.lib.retrieval_index import RetrievalIndex
+
+from conftest import write_file
+
+
+def make_retrieval_index(root):
+    repository_index = RepositoryIndex(
+        directory=str(root),
+        db_path=os.path.join(root, ".ohad_cache", "index.sqlite"),
+        excluded_folders=[".ohad_cache"],
+    )
+    return RetrievalIndex(
+        repository_index=repository_index,
+        db_path=os.path.join(root, ".ohad_cache", "retrieval.sqlite"),
+        chunk_tokens=50,
+    )
+
+
+def write_repository(root):
+    write_file(root, "billing/invoice.py", "def create_invoice(customer):\n    # Sends the invoice email\n    return customer\n")
+    write_file(root, "auth/login.py", "def authenticate_user(password):\n    return check_password(password)\n")
+    for idx in range(10):
+        write_file(root, f"utils/helper_{idx}.py", f"def helper_{idx}(value):\n    return value + {idx}\n")
+
+
+class TestRetrievalIndex:
+    def test_search_ranks_the_relevant_chunk_first(self, tmp_path):
+        write_repository(tmp_path)
+        index = make_retrieval_index(tmp_path)
+        index.refresh()
+
+        [first, *_] = index.search("Send an invoice email to every customer", top_k=3, use_vectors=False)
+
+        assert first.path == os.path.join(tmp_path, "billing", "invoice.py")
+        assert (first.start_line, first.end_line) == (1, 3)
+
+    def test_large_files_are_split_into_chunks(self, tmp_path):
+        functions = "\n\n".join(f"def function_{idx}():\n    return {idx}\n" for idx in range(30))
+        write_file(tmp_path, "big.py", functions + "\n\ndef parse_configuration():\n    return None\n")
+        index = make_retrieval_index(tmp_path)
+        index.refresh()
+
+        [result] = index.search("parse the configuration", top_k=1, use_vectors=False)
+
+        assert result.start_line > 1
+        assert result.end_line == len((tmp_path / "big.py").read_text().splitlines())
+
+    def test_refresh_is_incremental(self, tmp_path):
+        write_repository(tmp_path)
+        assert make_retrieval_index(tmp_path).refresh() == 12
+
+        index = make_retrieval_index(tmp_path)
+        assert index.refresh() == 0
+
+        write_file(tmp_path, "auth/login.py", "def rotate_api_token():\n    return None\n")
+        os.remove(os.path.join(tmp_path, "billing", "invoice.py"))
+
+        assert index.refresh() == 1
+        assert index.search("invoice", use_vectors=False) == []
+        assert index.search("rotate token", use_vectors=False)[0].path == os.path.join(tmp_path, "auth", "login.py")
+
+    def test_vectors_rerank_the_candidates(self, tmp_path):
+        pytest.importorskip("numpy")
+        write_repository(tmp_path)
+        index = make_retrieval_index(tmp_path)
+        index.refresh()
+
+        results = index.search("authenticate the user password", top_k=2, use_vectors=True)
+
+        assert results[0].path == os.path.join(tmp_path, "auth", "login.py")
+        assert 0 < results[0].score <= 1
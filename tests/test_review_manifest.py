@@ -0,0 +1,21 @@
+from src.lib.review_manifest import ReviewManifest, make_review_key
+
+
+class TestReviewManifest:
+    def test_issues_are_only_reused_with_the_same_key(self, tmp_path):
+        manifest = ReviewManifest(str(tmp_path / "manifest.sqlite"))
+        key = make_review_key("content", {"dep.py": "dep"}, model="m", prompt_version=1)
+        manifest.record("a.py", key, [{"explanation": "bug"}])
+
+        assert manifest.get("a.py", key) == [{"explanation": "bug"}]
+        assert manifest.get("a.py", make_review_key("content", {"dep.py": "changed"}, "m", 1)) is None
+        assert manifest.get("a.py", make_review_key("content", {"dep.py": "dep"}, "other-model", 1)) is None
+        assert manifest.get("a.py", make_review_key("content", {"dep.py": "dep"}, "m", 2)) is None
+        assert manifest.get("a.py", make_review_key("content", {"dep.py": "dep"}, "m", 1, {"skeletons": True})) is None
+
+    def test_records_survive_a_new_connection(self, tmp_path):
+        db_path = str(tmp_path / "manifest.sqlite")
+        ReviewManifest(db_path).record("a.py", "key", [])
+
+        assert ReviewManifest(db_path).get("a.py", "key") == []
+        assert len(ReviewManifest(db_path)) == 1
@@ -0,0 +1,77 @@
+import os
+
+from src.lib.file_content_cache import FileContentCache
+from src.lib.review_scheduler import schedule_reviews
+
+
+class TestScheduleReviews:
+    def test_hub_dependencies_come_first(self):
+        schedule = schedule_reviews(
+            {
+                "a.py": ["models.py", "settings.py"],
+                "b.py": ["settings.py"],
+                "c.py": ["views.py", "settings.py", "models.py"],
+            }
+        )
+
+        assert schedule.dependencies["a.py"] == ["settings.py", "models.py"]
+        assert schedule.dependencies["c.py"] == ["settings.py", "models.py", "views.py"]
+
+    def test_files_with_the_same_dependencies_are_adjacent(self):
+        schedule = schedule_reviews(
+            {
+                "a.py": ["settings.py", "models.py"],
+                "b.py": ["utils.py"],
+                "c.py": ["settings.py", "models.py"],
+                "d.py": ["utils.py"],
+                "e.py": [],
+            }
+        )
+
+        assert schedule.order == ["e.py", "a.py", "c.py", "b.py", "d.py"]
+
+    def test_shared_prefix_tokens(self, tmp_path):
+        settings_path, models_path = str(tmp_path / "settings.py"), str(tmp_path / "models.py")
+        for path in (settings_path, models_path):
+            with open(path, "w") as f:
+                f.write("x" * 400)
+
+        schedule = schedule_reviews(
+            {"a.py": [settings_path, models_path], "b.py": [settings_path], "c.py": [settings_path, models_path]}
+        )
+
+        assert schedule.dependency_tokens() == 500
+        # a and c share both files, b shares the settings with one of them
+        assert schedule.shared_prefix_tokens() == 300
+
+
+class TestFileContentCache:
+    def test_reads_are_served_from_the_cache_until_the_file_changes(self, tmp_path):
+        path = str(tmp_path / "settings.py")
+        with open(path, "w") as f:
+            f.write("DEBUG = True\n")
+
+        cache = FileContentCache()
+        assert cache.read(path) == cache.read(path) == "DEBUG = True\n"
+        assert (cache.stats.hits, cache.stats.misses, cache.stats.bytes_saved) == (1, 1, 13)
+
+        with open(path, "w") as f:
+            f.write("DEBUG = False\n")
+        os.utime(path, ns=(0, 1))
+
+        assert cache.read(path) == "DEBUG = False\n"
+        assert cache.stats.misses == 2
+
+    def test_least_recently_used_files_are_evicted(self, tmp_path):
+        paths = []
+        for idx in range(3):
+            paths.append(str(tmp_path / f"{idx}.py"))
+            with open(paths[-1], "w") as f:
+                f.write("x" * 10)
+
+        cache = FileContentCache(max_bytes=25)
+        for path in paths:
+            cache.read(path)
+        cache.read(paths[0])
+
+        assert cache.stats.misses == 4
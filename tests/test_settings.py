@@ -0,0 +1,16 @@
+import os
+
+from src.settings import Settings
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestSettings:
+    def test_env_example_loads(self, monkeypatch):
+        for name in Settings.model_fields:
+            monkeypatch.delenv(name.upper(), raising=False)
+
+        settings = Settings(_env_file=os.path.join(REPO_ROOT, ".env.example"))
+
+        assert settings.llm_endpoints == []
+        assert settings.repo_path == "/path/to/your/repo"
@@ -0,0 +1,104 @@
+import ast
+import textwrap
+
+from src.lib.file_content_cache import FileContentCache
+from src.lib.skeleton_extractor import SKELETON_HEADER, SkeletonCache, extract_skeleton
+from src.services.code_review_service import CodeReviewService
+
+MODULE = textwrap.dedent(
+    '''
+    """The module docstring."""
+    import os
+    from typing import List
+
+    TIMEOUT_SECONDS: float = 2.5
+    BIG_TABLE = {idx: str(idx) for idx in range(1000)} or {%s}
+
+
+    def helper(paths: List[str], strict: bool = False) -> int:
+        """Counts the files."""
+        total = 0
+        for path in paths:
+            total += os.path.isfile(path)
+        return total
+
+
+    class Reader:
+        """Reads things."""
+
+        retries = 3
+
+        def __init__(self, path: str):
+            self._path = path
+
+        async def read(self) -> bytes:
+            def nested():
+                return 1
+            return b""
+
+
+    if __name__ == "__main__":
+        helper([])
+    '''
+    % ", ".join(f"{idx}: {idx}" for idx in range(100))
+)
+
+
+class TestExtractSkeleton:
+    def test_bodies_are_stripped_and_the_interface_is_kept(self):
+        skeleton = extract_skeleton(MODULE)
+
+        assert skeleton == textwrap.dedent(
+            '''\
+            """The module docstring."""
+            import os
+            from typing import List
+            TIMEOUT_SECONDS: float = 2.5
+            BIG_TABLE = ...
+
+            def helper(paths: List[str], strict: bool=False) -> int:
+                """Counts the files."""
+                ...
+
+            class Reader:
+                """Reads things."""
+                retries = 3
+
+                def __init__(self, path: str):
+                    ...
+
+                async def read(self) -> bytes:
+                    ...'''
+        )
+        ast.parse(skeleton)
+
+
+class TestSkeletonCache:
+    def test_skeletons_are_cached_by_content(self, tmp_path):
+        paths = []
+        for idx in range(3):
+            path = tmp_path / f"module_{idx}.py"
+            path.write_text(f"def f_{idx}():\n    return {idx}\n")
+            paths.append(str(path))
+
+        cache = SkeletonCache()
+        cache.prefetch(paths + [str(tmp_path / "missing.py")], max_workers=2)
+
+        assert len(cache._entries) == 3
+        assert cache.get("def f_1():\n    return 1\n") == SKELETON_HEADER + "def f_1():\n    ..."
+        assert len(cache._entries) == 3
+        assert cache.get("def broken(:\n") == "def broken(:\n"
+
+
+class TestDependencySkeletons:
+    def test_dependencies_are_sent_as_skeletons(self, tmp_path):
+        dependency_path = tmp_path / "util.py"
+        dependency_path.write_text(MODULE)
+        service = CodeReviewService(
+            local_repo_path=str(tmp_path), max_workers=1, content_cache=FileContentCache(), dependency_skeletons=True
+        )
+
+        contents = service._read_dependencies("main.py", [str(dependency_path)])
+
+        assert contents[str(dependency_path)].startswith(SKELETON_HEADER)
+        assert len(contents[str(dependency_path)]) < len(MODULE) / 2
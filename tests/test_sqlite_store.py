@@ -0,0 +1,39 @@
+import pytest
+
+from src.lib.sqlite_store import open_sqlite_store
+from src.utils.exceptions import StoreSchemaError
+
+SCHEMA = ["CREATE TABLE IF NOT EXISTS items (name TEXT PRIMARY KEY)"]
+
+
+class TestOpenSqliteStore:
+    def test_a_database_of_another_version_is_rebuilt(self, tmp_path):
+        db_path = str(tmp_path / "cache" / "store.sqlite")
+        connection = open_sqlite_store(db_path, schema_version=1, schema=SCHEMA, drop_tables=["items"])
+        with connection:
+            connection.execute("INSERT INTO items (name) VALUES ('kept')")
+        connection.close()
+
+        connection = open_sqlite_store(db_path, schema_version=1, schema=SCHEMA, drop_tables=["items"])
+        assert connection.execute("SELECT name FROM items").fetchall() == [("kept",)]
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        connection.close()
+
+        connection = open_sqlite_store(db_path, schema_version=2, schema=SCHEMA, drop_tables=["items"])
+        assert connection.execute("SELECT name FROM items").fetchall() == []
+        assert connection.execute("PRAGMA user_version").fetchone()[0] == 2
+        connection.close()
+
+    def test_migrations_keep_the_data(self, tmp_path):
+        db_path = str(tmp_path / "store.sqlite")
+        migrations = [SCHEMA, ["ALTER TABLE items ADD COLUMN size INTEGER"]]
+        connection = open_sqlite_store(db_path, schema_version=1, migrations=migrations[:1], isolation_level=None)
+        connection.execute("INSERT INTO items (name) VALUES ('kept')")
+        connection.close()
+
+        connection = open_sqlite_store(db_path, schema_version=2, migrations=migrations, isolation_level=None)
+        assert connection.execute("SELECT name, size FROM items").fetchall() == [("kept", None)]
+        connection.close()
+
+        with pytest.raises(StoreSchemaError, match="newer than the 1"):
+            open_sqlite_store(db_path, schema_version=1, migrations=migrations[:1])
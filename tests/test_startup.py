@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+from src.runtime import Runtime
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), "..")
+# Generous for slow CI machines, the import takes about 30ms on a laptop
+CLI_IMPORT_BUDGET_MICROSECONDS = 80_000
+HEAVY_MODULES = ["openai", "httpx", "pydantic", "pydantic_settings", "numpy", "pathspec", "sqlite3"]
+
+
+def import_times(statement: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            times[parts[2].strip()] = int(parts[1])
+
+    return times
+
+
+class TestStartup:
+    def test_cli_import_is_within_budget(self):
+        times = import_times("import cli")
+
+        assert not [module for module in HEAVY_MODULES if module in times]
+        assert times["cli"] < CLI_IMPORT_BUDGET_MICROSECONDS
+
+    def test_importing_src_does_not_configure_logging(self):
+        result = subprocess.run(
+            [sys.executable, "-c", "import logging, src; print(len(logging.getLogger().handlers))"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        assert result.stdout.strip() == "0"
+
+    def test_help_exits_without_settings(self):
+        env = {key: value for key, value in os.environ.items() if key not in ("OPENAI_API_KEY", "REPO_PATH")}
+        result = subprocess.run(
+            [sys.executable, "cli.py", "--help"], cwd=REPO_ROOT, capture_output=True, text=True, env=env
+        )
+
+        assert result.returncode == 0
+        assert "--jobs" in result.stdout
+
+
+class TestRuntime:
+    def test_parts_are_built_once(self):
+        runtime = Runtime()
+
+        assert runtime.repository_reader_service is runtime.repository_reader_service
+        assert Runtime().repository_reader_service is not runtime.repository_reader_service
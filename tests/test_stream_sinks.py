@@ -0,0 +1,102 @@
+import io
+
+from openai import OpenAI
+
+from benchmarks.fake_openai_server import FakeOpenAiServer
+from src.lib.llm_client.llm_client import LlMClient
+from src.lib.llm_client.openai_llm_client import OpenAiLlMClient
+from src.lib.llm_client.stream_events import StreamFailed, StreamFinished, StreamStarted, TextDelta
+from src.lib.llm_client.stream_sinks import BufferedCollector, MultiplexedProgressView, TtyRenderer
+from src.types.schema import LlmMessage
+
+from conftest import FakeClock
+
+
+class ChunkedLlMClient(LlMClient):
+    def _send_message_implementation_specific_logic(self, message: LlmMessage, **kwargs) -> LlmMessage:
+        return LlmMessage(role="assistant", content="".join(self._stream_message_implementation_specific_logic(message)))
+
+    def _stream_message_implementation_specific_logic(self, message: LlmMessage, **kwargs):
+        yield from ["Hello", " ", "world"]
+
+
+class CountingOutput(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        self.writes += 1
+        return super().write(text)
+
+
+class TestSendMessageStream:
+    def test_events_are_yielded_and_sent_to_the_sink(self):
+        collector = BufferedCollector()
+        client = ChunkedLlMClient(stream_sink=collector)
+        client.stream_label = "job-1"
+
+        events = list(client.send_message_stream("hi"))
+
+        assert isinstance(events[0], StreamStarted) and events[0].label == "job-1"
+        assert [event.text for event in events if isinstance(event, TextDelta)] == ["Hello", " ", "world"]
+        assert isinstance(events[-1], StreamFinished) and events[-1].text == "Hello world"
+        assert collector.events == events
+        assert collector.text(events[0].stream_id) == "Hello world"
+        assert len(client._memory) == 2
+
+    def test_aborted_stream_reports_a_failure(self):
+        collector = BufferedCollector()
+        stream = ChunkedLlMClient(stream_sink=collector).stream_message("hi")
+        next(stream)
+        stream.close()
+
+        assert isinstance(collector.events[-1], StreamFailed)
+        assert collector.events[-1].error == "aborted"
+
+    def test_openai_client_writes_nothing_to_the_console(self, capsys):
+        collector = BufferedCollector()
+
+        with FakeOpenAiServer(responder=lambda request: "a" * 100, chunk_size=10) as server:
+            client = OpenAiLlMClient(
+                openai_client=OpenAI(base_url=server.base_url, api_key="test", max_retries=0),
+                model="fake-model",
+                stream_sink=collector,
+            )
+            client.send_message("Hello!")
+
+        assert capsys.readouterr().out == ""
+        assert len([event for event in collector.events if isinstance(event, TextDelta)]) == 10
+        assert collector.events[-1].text == "a" * 100
+
+
+class TestRenderers:
+    def test_tty_renderer_is_rate_limited(self):
+        output, clock = CountingOutput(), FakeClock()
+        renderer = TtyRenderer(output=output, min_interval_seconds=1.0, clock=clock)
+
+        renderer.handle(StreamStarted(stream_id=1, label="main", model="m"))
+        for idx in range(1000):
+            clock.now = idx * 0.01
+            renderer.handle(TextDelta(stream_id=1, label="main", text="x"))
+        renderer.handle(StreamFinished(stream_id=1, label="main", text="x" * 1000))
+
+        # Every render is a write and a flush, the deltas are rendered once per second of the clock
+        assert output.writes < 30
+        assert output.getvalue().endswith("\n")
+        assert "done 1000 chars" in output.getvalue()
+
+    def test_progress_view_writes_finished_calls_when_not_a_terminal(self):
+        output = io.StringIO()
+        view = MultiplexedProgressView(output=output, clock=FakeClock())
+
+        for label in ["worker_0", "worker_1"]:
+            view.handle(StreamStarted(stream_id=1, label=label, model="m"))
+            view.handle(TextDelta(stream_id=1, label=label, text="abc"))
+        view.handle(StreamFinished(stream_id=1, label="worker_1", text="abc"))
+        view.handle(StreamFailed(stream_id=1, label="worker_0", error="RateLimitError"))
+
+        assert output.getvalue().splitlines() == [
+            "worker_1: done 3 chars 0.0s",
+            "worker_0: failed (RateLimitError) 3 chars 0.0s",
+        ]
@@ -0,0 +1,93 @@
+import pytest
+
+from src.lib.llm_client.llm_client import LlMClient
+from src.lib.streaming_json import StreamingJsonArrayParser
+from src.types.schema import LlmMessage
+from src.utils.exceptions import UnrecoverableJsonStreamError
+
+
+def feed_in_chunks(parser, text, chunk_size):
+    items = []
+    for start in range(0, len(text), chunk_size):
+        items.append((start, parser.feed(text[start:start + chunk_size])))
+    return items
+
+
+class StreamingMockLlMClient(LlMClient):
+    def __init__(self, replies):
+        super().__init__()
+        self.replies = list(replies)
+        self.num_requests = 0
+        self.num_closed_streams = 0
+
+    def _send_message_implementation_specific_logic(self, message: LlmMessage, **kwargs) -> LlmMessage:
+        raise NotImplementedError
+
+    def _stream_message_implementation_specific_logic(self, message: LlmMessage, **kwargs):
+        reply = self.replies[self.num_requests]
+        self.num_requests += 1
+        try:
+            for start in range(0, len(reply), 3):
+                yield reply[start:start + 3]
+        except GeneratorExit:
+            self.num_closed_streams += 1
+            raise
+
+
+class TestStreamingJsonArrayParser:
+    def test_items_are_returned_as_soon_as_they_close(self):
+        parser = StreamingJsonArrayParser()
+        text = '```json\n[{"a": "x]}\\"", "b": [1, {"c": 2}]}, {"a": 2}]\n```'
+
+        fed = [(start, items) for start, items in feed_in_chunks(parser, text, 4) if items]
+        parser.close()
+
+        assert [items for _, items in fed] == [[{"a": 'x]}"', "b": [1, {"c": 2}]}], [{"a": 2}]]
+        assert fed[0][0] < text.index('{"a": 2}')
+        assert parser.done
+
+    def test_scalar_items(self):
+        parser = StreamingJsonArrayParser()
+
+        items = parser.feed('["/a.py", 12, true, null, "b"]')
+        parser.close()
+
+        assert items == ["/a.py", 12, True, None, "b"]
+
+    def test_prose_before_the_array_fails_fast(self):
+        parser = StreamingJsonArrayParser()
+
+        assert parser.feed("``") == []
+        with pytest.raises(UnrecoverableJsonStreamError):
+            parser.feed("` Sure! Here is")
+
+    def test_unclosed_array_fails_on_close(self):
+        parser = StreamingJsonArrayParser()
+        parser.feed('[{"a": 1}')
+
+        with pytest.raises(UnrecoverableJsonStreamError):
+            parser.close()
+
+
+class TestSendMessageExpectingJsonArrayStream:
+    def test_items_are_streamed_and_memory_is_updated(self):
+        client = StreamingMockLlMClient(replies=['[{"a": 1}, {"b": 2}]'])
+
+        assert list(client.send_message_expecting_json_array_stream("json please")) == [{"a": 1}, {"b": 2}]
+        assert len(client._memory) == 2
+
+    def test_bad_prefix_aborts_the_stream_and_retries(self):
+        client = StreamingMockLlMClient(replies=["Sure! Here is the code: [...]", '[{"a": 1}]'])
+
+        assert list(client.send_message_expecting_json_array_stream("json please")) == [{"a": 1}]
+        assert client.num_requests == 2
+        assert client.num_closed_streams == 1
+        assert len(client._memory) == 2
+
+    def test_no_retry_after_items_were_yielded(self):
+        client = StreamingMockLlMClient(replies=['[{"a": 1}, oops', '[{"a": 1}]'])
+
+        with pytest.raises(UnrecoverableJsonStreamError):
+            list(client.send_message_expecting_json_array_stream("json please"))
+
+        assert client.num_requests == 1
@@ -0,0 +1,111 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.lib.llm_client.structured_output import response_format_for, validate_response
+from src.lib.streaming_json import StreamingJsonArrayParser
+from src.types.schema import CodedFilesResponse, CodeReviewResponse, LlmMessage
+from src.utils.exceptions import UnrecoverableJsonStreamError
+from src.utils.json_repair import repair_json
+
+from conftest import MockLlMClient
+
+
+class TestRepairJson:
+    def test_repairs_surrounding_text_trailing_commas_and_raw_new_lines(self):
+        text = 'Here you go:\n[{"content": "line 1\nline 2", "action": "CREATE",},]\nThanks!'
+
+        assert json.loads(repair_json(text)) == [{"content": "line 1\nline 2", "action": "CREATE"}]
+
+    def test_truncated_response_is_not_completed(self):
+        text = '[{"content": "def f():\n'
+
+        assert repair_json(text) == text
+
+
+class TestResponseFormat:
+    def test_schema_is_strict(self):
+        schema = response_format_for(CodedFilesResponse)["json_schema"]["schema"]
+        file_schema = schema["$defs"]["CodedFileResponse"]
+
+        assert schema["additionalProperties"] is False
+        assert schema["required"] == ["files"]
+        assert file_schema["additionalProperties"] is False
+        assert file_schema["required"] == ["file_path", "content", "action", "patch"]
+        assert "title" not in schema
+
+    def test_validate_response_accepts_bare_list(self):
+        issues = [{"explanation": "e", "suggestion": "s"}]
+
+        assert validate_response(CodeReviewResponse, issues) == validate_response(CodeReviewResponse, {"issues": issues})
+
+    def test_issues_with_the_former_fix_suggestion_field_are_accepted(self):
+        response = validate_response(CodeReviewResponse, [{"explanation": "e", "fix_suggestion": "s"}])
+
+        assert response.issues[0].model_dump()["suggestion"] == "s"
+        schema = response_format_for(CodeReviewResponse)["json_schema"]["schema"]
+        assert schema["$defs"]["CodeReviewIssue"]["required"] == [
+            "explanation",
+            "suggestion",
+            "line_start",
+            "line_end",
+            "severity",
+        ]
+
+
+class TestSendMessageExpectingJsonResponseWithModel:
+    def test_structured_output_sends_response_format(self):
+        client = MockLlMClient(structured_output=True)
+        client._send_message_implementation_specific_logic = MagicMock(
+            return_value=LlmMessage(role="assistant", content='{"issues": []}')
+        )
+
+        response = client.send_message_expecting_json_response("review", response_model=CodeReviewResponse)
+
+        assert response == CodeReviewResponse(issues=[])
+        assert client._send_message_implementation_specific_logic.call_args.kwargs["response_format"] == (
+            response_format_for(CodeReviewResponse)
+        )
+
+    def test_local_repair_avoids_a_resend(self):
+        client = MockLlMClient()
+        client._send_message_implementation_specific_logic = MagicMock(
+            return_value=LlmMessage(role="assistant", content='Sure! [{"explanation": "e", "suggestion": "s",}]')
+        )
+
+        response = client.send_message_expecting_json_response("review", response_model=CodeReviewResponse)
+
+        assert len(response.issues) == 1
+        assert client._send_message_implementation_specific_logic.call_count == 1
+        assert (client.json_response_stats.repaired, client.json_response_stats.retries) == (1, 0)
+
+    def test_invalid_model_is_retried(self):
+        client = MockLlMClient()
+        client._send_message_implementation_specific_logic = MagicMock(
+            side_effect=[
+                LlmMessage(role="assistant", content='[{"unexpected": "e"}]'),
+                LlmMessage(role="assistant", content="[]"),
+            ]
+        )
+
+        assert client.send_message_expecting_json_response("review", response_model=CodeReviewResponse).issues == []
+        assert client.json_response_stats.retries == 1
+        assert client.json_response_stats.retry_rate == 0.5
+
+
+class TestStreamingJsonArrayParserWithArrayKey:
+    def test_wrapped_array(self):
+        parser = StreamingJsonArrayParser(array_key="files")
+        text = '{ "files" : [{"a": 1}, {"b": 2}] }'
+
+        items = [item for start in range(0, len(text), 3) for item in parser.feed(text[start:start + 3])]
+        parser.close()
+
+        assert items == [{"a": 1}, {"b": 2}]
+
+    def test_other_key_fails(self):
+        parser = StreamingJsonArrayParser(array_key="files")
+
+        with pytest.raises(UnrecoverableJsonStreamError):
+            parser.feed('{"other": [')